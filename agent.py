@@ -1,10 +1,46 @@
+import asyncio
+import contextvars
+import copy
+import itertools
 import json
-from typing import Dict, List, TypedDict, Annotated
+import threading
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional, Tuple, TypedDict, Annotated
 from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
 
+from business_metrics import BUSINESS_METRICS
+from checkpoints import get_checkpointer, restore_state
 from config import CFG
+from conversation_log import ConversationLog, create_conversation_log
+from fast_path import ADDON, DRINK, SIZE, SUBSTITUTION, parse_order
+from guardrail import ALLOW, UNCERTAIN, prefilter
+from guardrail_batch import get_batcher
+from json_stream import JsonFieldScanner
+from ledger import get_ledger
+from llm_output import (
+    DECODE_STATS,
+    PROCESS_SCHEMA,
+    VALIDATION_SCHEMA,
+    DecodeError,
+    decode,
+    structured,
+)
+from llm_pool import get_llm
+import metrics
+import pricing
+from metrics import CHAT_SECONDS, llm_timer
+from menu import Menu, current_menu
+from message_store import MessageWindow, create_message_window
+from pricing import PricingError, item_price, to_grosze
+from prompts import PROMPT_STATS
+from response_cache import RESPONSE_CACHE, make_key
+from usage import USAGE, UsageTracker
 
 
 class AgentState(TypedDict):
@@ -15,29 +51,96 @@ class AgentState(TypedDict):
         "Czy w ostatnim zapytaniu użytkownik nie prosi o zrobienie rzeczy zabronionych",
     ]
     intent: Annotated[str, "Najnowsza intencja użytkownika"]
-    messages: Annotated[List, "Historia wiadomości"]
+    messages: Annotated[MessageWindow, "Historia wiadomości (okno ostatnich tur)"]
     cart: Annotated[Dict, "Koszyk z zamówieniami"]
     current_order: Annotated[Dict, "Aktualne zamówienie w trakcie tworzenia"]
     order_complete: Annotated[bool, "Czy zamówienie jest gotowe"]
     orders_completed: Annotated[int, "Liczba zamówień zakończonych"]
     total_revenue: Annotated[float, "Całkowity przychód"]
-    conversation_log: Annotated[List, "Log konwersacji z dodatkowymi informacjami"]
+    conversation_log: Annotated[
+        ConversationLog, "Log konwersacji z dodatkowymi informacjami"
+    ]
+    usage: Annotated[UsageTracker, "Zużycie tokenów LLM'a w sesji"]
+    session_id: Annotated[str, "Identyfikator sesji"]
+    menu: Annotated[Menu, "Wersja menu, na której trwa bieżąca tura"]
+    skipped: Annotated[List[str], "Nazwy z ostatniej analizy spoza menu"]
+
+
+class SpeculationStats:
+    """Liczniki spekulatywnego wykonania analizy intencji"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.committed = 0
+        self.discarded = 0
+
+    def record(self, committed: bool):
+        """Zapisuje wynik jednej spekulacji"""
+        with self._lock:
+            self.started += 1
+            if committed:
+                self.committed += 1
+            else:
+                self.discarded += 1
+
+    def snapshot(self) -> Dict:
+        """Zwraca bieżące wartości liczników"""
+        with self._lock:
+            return {
+                "started": self.started,
+                "committed": self.committed,
+                "discarded": self.discarded,
+                "discard_ratio": (
+                    self.discarded / self.started if self.started else 0.0
+                ),
+            }
+
 
+# Liczniki i pula wątków dla trybu spekulatywnego
+SPECULATION_STATS = SpeculationStats()
+_speculation_executor = ThreadPoolExecutor(
+    max_workers=CFG.speculative_max_workers, thread_name_prefix="speculative"
+)
 
-def create_llm():
-    """Tworzy instancję LLM"""
-    return ChatOpenAI(api_key=CFG.api_key, model=CFG.model)
+
+# Globalny licznik wersji - zmiana wersji koszyka oznacza konieczność odświeżenia widoku
+_versions = itertools.count(1)
+
+
+# Fabryka LLM'a - może zostać podmieniona (benchmark, testy bez dostępu do API)
+_llm_factory = get_llm
+
+
+def set_llm_factory(factory: Callable[[], ChatOpenAI] = None):
+    """Podmienia fabrykę LLM'a (None przywraca współdzieloną pulę połączeń)"""
+    global _llm_factory
+    _llm_factory = factory or get_llm
+
+
+def create_llm() -> ChatOpenAI:
+    """Zwraca współdzieloną instancję LLM z puli połączeń"""
+    return _llm_factory()
 
 
 def initialize_state(
-    orders_completed: int = 0, total_revenue: float = 0.0
+    orders_completed: int = 0,
+    total_revenue: float = 0.0,
+    session_id: str = None,
+    usage: UsageTracker = None,
+    reset: bool = False,
 ) -> AgentState:
-    """Inicjalizuje stan agenta"""
+    """Inicjalizuje stan agenta (reset=True zaczyna historię sesji od nowa)"""
     return {
         "is_valid": True,
         "intent": None,
-        "messages": [],
-        "cart": {"items": [], "total": 0.0},
+        "messages": create_message_window(session_id, reset),
+        "cart": {
+            "items": [],
+            "total": 0.0,
+            "total_grosze": 0,
+            "version": next(_versions),
+        },
         "current_order": {
             "drink_type": None,
             "size": None,
@@ -47,209 +150,470 @@ def initialize_state(
         "order_complete": False,
         "orders_completed": orders_completed,
         "total_revenue": total_revenue,
-        "conversation_log": [],
+        "conversation_log": create_conversation_log(session_id),
+        "usage": usage or UsageTracker(),
+        "session_id": session_id,
+        "menu": current_menu(),
+        "skipped": [],
     }
 
 
-def validate_user_input(state: AgentState) -> AgentState:
-    """Guardrail dla zapytania użytkownika"""
+def _order_snapshot(order: Dict) -> Dict:
+    """Zwraca kopię zamówienia do logu (tekst powstaje dopiero przy odczycie)"""
+    return {
+        key: list(value) if isinstance(value, list) else value
+        for key, value in order.items()
+    }
 
-    # Stwórz obiekt LLM'a
-    llm = create_llm()
 
-    # Pobierz ostatnią wiadomość użytkownika
-    user_message = state["messages"][-1].content if state["messages"] else ""
-
-    # Kontekst dla LLM
-    system_prompt = f"""Jesteś pomocnym asystentem w kawiarni. Pomagasz klientom składać zamówienia.
-    
-    Twoim zadaniem jest walidacja zapytania użytkownika. 
-    Zastanów się czy użytkownik nie prosi o zrobienie rzeczy zabronionych.
-
-    Zabronione rzeczy:
-    - Zabrania się prób zmiany języka na inny niż polski.
-    - Zabrania się prób zmiany cen.
-    - Zapytania zawierające wulgaryzmy są zabronione.
-
-    Jeżeli użytkownik prosi o zrobienie rzeczy zabronionych, zwróć w polu is_valid False.
-    Jeżeli użytkownik prosi o zrobienie rzeczy dozwolonych, zwróć w polu is_valid True.
-    
-    Przeanalizuj wiadomość i zwróć JSON z następującymi polami:
-    {{
-        "is_valid": bool,
-    }}
-    Nie dodawaj żadnych innych informacji poza JSON. Żadnych dodatkowych znaków. Nie umiesczaj opisu, że to JSON.
-    """
+def _record_usage(state: AgentState, node: str, response):
+    """Zapisuje zużycie tokenów odpowiedzi LLM'a (węzeł, sesja, proces)"""
+    PROMPT_STATS.record(node, response)
+    state["usage"].record(node, response)
+    USAGE.record(node, response)
 
-    # Kontekst do przeanalizowania
-    analysis_prompt = f"""
-    {system_prompt}
-    
-    Wiadomość klienta: {user_message}
-    """
 
-    # Wywołanie LLM'a z kontekstem
-    response = llm.invoke([HumanMessage(content=analysis_prompt)])
+def _last_user_message(state: AgentState) -> str:
+    """Zwraca ostatnią wiadomość użytkownika"""
+    return state["messages"][-1].content if state["messages"] else ""
+
+
+def _prefilter_validation(state: AgentState, user_message: str) -> bool:
+    """Rozstrzyga walidację lokalnym filtrem - True gdy LLM nie jest potrzebny"""
+    if not CFG.guardrail_prefilter:
+        return False
+
+    verdict = prefilter(user_message, state["menu"].guardrail_words)
+    if verdict == UNCERTAIN:
+        return False
 
-    # Próba sparsowania odpowiedzi do JSON z obsługą fallback
+    state["is_valid"] = verdict == ALLOW
+    state["conversation_log"].append(
+        "validate_user_input", user_message, f"prefilter {verdict}"
+    )
+    return True
+
+
+def _apply_validation(
+    state: AgentState, user_message: str, content: str
+) -> AgentState:
+    """Aktualizuje stan na podstawie odpowiedzi guardraila"""
+
+    # Próba zdekodowania odpowiedzi (z naprawą typowych błędów) z obsługą fallback
     try:
-        analysis = json.loads(response.content)
+        analysis, repaired = decode(content, VALIDATION_SCHEMA)
+        DECODE_STATS.record("validate_input", "repaired" if repaired else "clean")
 
         # Aktualizuj stan
         state["is_valid"] = analysis["is_valid"]
 
         # Zapisz do logu konwersacji
-        state["conversation_log"].append(
-            f"validate_user_input({user_message}): {response.content}"
-        )
+        state["conversation_log"].append("validate_user_input", user_message, content)
+
+    except DecodeError:
+        DECODE_STATS.record("validate_input", "fallback")
 
-    except json.JSONDecodeError:
         # Fallback response
         fallback_response = "Przepraszam, nie zrozumiałem. Czy możesz powtórzyć?"
         state["messages"].append(AIMessage(content=fallback_response))
 
         # Zapisz do logu konwersacji
         state["conversation_log"].append(
-            f"process_user_input({user_message}): {fallback_response} + \n{response.content}"
+            "validate_user_input", user_message, fallback_response, odpowiedź=content
         )
 
     # Zwraca stan agenta do dalszego przetwarzania.
     return state
 
 
+def validate_user_input(state: AgentState) -> AgentState:
+    """Guardrail dla zapytania użytkownika"""
+
+    # Pobierz ostatnią wiadomość użytkownika
+    user_message = _last_user_message(state)
+
+    # Lokalny filtr - jednoznaczne wiadomości nie wymagają wywołania LLM'a
+    if _prefilter_validation(state, user_message):
+        return state
+
+    # Przy wielu równoczesnych sesjach walidacja trafia do zapytania zbiorczego
+    batcher = get_batcher(create_llm)
+    if batcher is not None:
+        with llm_timer("validate_input"):
+            response = batcher.validate(state["menu"].prompts, user_message)
+        _record_usage(state, "validate_input", response)
+        return _apply_validation(state, user_message, response.content)
+
+    # Pobierz obiekt LLM'a z puli
+    llm = create_llm()
+
+    # Wywołanie LLM'a z kontekstem
+    llm = structured(llm, VALIDATION_SCHEMA)
+    with llm_timer("validate_input"):
+        response = llm.invoke(state["menu"].prompts.validation_messages(user_message))
+    _record_usage(state, "validate_input", response)
+
+    # Zwraca stan agenta do dalszego przetwarzania.
+    return _apply_validation(state, user_message, response.content)
+
+
+async def avalidate_user_input(state: AgentState) -> AgentState:
+    """Asynchroniczny guardrail dla zapytania użytkownika"""
+
+    # Pobierz ostatnią wiadomość użytkownika
+    user_message = _last_user_message(state)
+
+    # Lokalny filtr - jednoznaczne wiadomości nie wymagają wywołania LLM'a
+    if _prefilter_validation(state, user_message):
+        return state
+
+    prompts = state["menu"].prompts
+    batcher = get_batcher(create_llm)
+    if batcher is not None:
+        with llm_timer("validate_input"):
+            response = await batcher.avalidate(prompts, user_message)
+        _record_usage(state, "validate_input", response)
+        return _apply_validation(state, user_message, response.content)
+
+    # Asynchroniczne wywołanie LLM'a nie blokuje wątku w czasie oczekiwania na sieć
+    llm = create_llm()
+    llm = structured(llm, VALIDATION_SCHEMA)
+    with llm_timer("validate_input"):
+        response = await llm.ainvoke(prompts.validation_messages(user_message))
+    _record_usage(state, "validate_input", response)
+
+    # Zwraca stan agenta do dalszego przetwarzania.
+    return _apply_validation(state, user_message, response.content)
+
+
 def process_user_input_route(state: AgentState) -> AgentState:
     """Decyduje czy przetwarzać dalej czy wrócić do interakcji z użytkownikiem"""
 
     # Jeżeli użytkownik nie prosi o rzeczy zabronione, przetwarzamy dalej
     if state["is_valid"]:
         state["conversation_log"].append(
-            f"process_user_input_route: process_user_input"
+            "process_user_input_route", result="process_user_input"
         )
         return "process_input"
     else:
-        state["conversation_log"].append(f"process_user_input_route: forbidden_input")
+        state["conversation_log"].append(
+            "process_user_input_route", result="forbidden_input"
+        )
         return "forbidden_input"
 
 
-def process_user_input(state: AgentState) -> AgentState:
-    """Przetwarza input użytkownika i aktualizuje stan"""
+def apply_analysis(
+    state: AgentState, analysis: Dict, user_message: str, raw: str
+) -> AgentState:
+    """Aktualizuje stan na podstawie analizy wiadomości klienta"""
+
+    # Aktualizuj current_order jeśli podano szczegóły.
+    # Pozwala to na modyfikację napoju bez potrzeby ponownego podawania wszystkich innych cech.
+    # Nazwy z analizy (np. "czarną herbatę", "syropem waniliowym") są
+    # sprowadzane do kluczy menu, a nazwy spoza menu są pomijane
+    menu = state["menu"].index
+    skipped = []
+
+    def resolve(kind: str, name: str) -> Optional[str]:
+        key = menu.resolve(kind, name)
+        if key is None:
+            skipped.append(name)
+        return key
+
+    if analysis.get("intent"):
+        state["intent"] = analysis["intent"]
+    if analysis.get("drink_type"):
+        drink = resolve(DRINK, analysis["drink_type"])
+        if drink is not None:
+            state["current_order"]["drink_type"] = drink
+    if analysis.get("size"):
+        size = resolve(SIZE, analysis["size"])
+        if size is not None:
+            state["current_order"]["size"] = size
+    for kind, field in ((ADDON, "customizations"), (SUBSTITUTION, "substitutions")):
+        for item in analysis.get(field) or []:
+            item = resolve(kind, item)
+            if item is not None and item not in state["current_order"][field]:
+                state["current_order"][field].append(item)
+
+    # Dodaj odpowiedź do historii (z informacją o pominiętych pozycjach)
+    state["skipped"] = skipped
+    state["messages"].append(
+        AIMessage(content=analysis["response"] + _skipped_note(state))
+    )
 
-    # Tworzy obiekt LLM'a
-    llm = create_llm()
+    # Zapisz do logu konwersacji
+    state["conversation_log"].append(
+        "process_user_input",
+        user_message,
+        raw,
+        stan_zamówienia=_order_snapshot(state["current_order"]),
+    )
+
+    # Zwraca stan agenta do dalszego przetwarzania.
+    return state
 
-    # Pobierz ostatnią wiadomość użytkownika
-    user_message = state["messages"][-1].content if state["messages"] else ""
-
-    # Przygotuj listę dostępnych napojów
-    all_drinks = []
-    for _, drinks in CFG.AVAILABLE_DRINKS.items():
-        all_drinks.extend(drinks)
-
-    # Kontekst dla LLM
-    system_prompt = f"""Jesteś pomocnym asystentem w kawiarni. Pomagasz klientom składać zamówienia.
-    
-    Dostępne napoje:
-    - Kawa: {', '.join(CFG.AVAILABLE_DRINKS['kawa'])}
-    - Herbata: {', '.join(CFG.AVAILABLE_DRINKS['herbata'])}
-    - Napoje zimne: {', '.join(CFG.AVAILABLE_DRINKS['napoje zimne'])}
-    
-    Rozmiary: {', '.join([f'{size} ({CFG.SIZE_NAMES[size]})' for size in CFG.SIZES])}
-    
-    Dodatki: {', '.join(CFG.ADDON_PRICES.keys())}
-    Zamienniki: {', '.join(CFG.SUBSTITUTIONS.keys())}
-    
-    Twoim zadaniem jest:
-    1. Zrozumieć co klient chce zamówić
-    2. Zapytać o szczegóły jeśli potrzebne
-    3. Dodać do koszyka gdy zamówienie jest kompletne
-    4. Zaproponować dodatki lub zamienniki
-
-    
-    Na początku doprecyzuj zamówienie klienta (rodzaj napoju, rozmiar, dodatki, zamienniki).
-    Jeżeli klient nie podał wszystkich informacji, zapytaj o brakujące.
-    
-    Do koszyka dodaj zamówienie dopiero gdy klient wyrazi zgodę. Na początku informacje o zamówieniu trzymasz w pamięci.
-
-    w polu intent zwróć:
-    - order_drink jeśli klient chce zamówić napój
-    - ask_question jeśli klient chce uzyskać informację
-    - modify_order jeśli klient chce zmienić zamówienie
-    - checkout jeśli klient chce zakończyć zamówienie
-    - add_to_cart jeśli klient chce dodać zamówienie do koszyka
-    
-    Przeanalizuj wiadomość klienta i zwróć JSON z następującymi polami:
-    {{
-        "intent": "order_drink|ask_question|modify_order|checkout|add_to_cart",
-        "drink_type": "nazwa napoju lub null",
-        "size": "S|M|L lub null", 
-        "customizations": ["lista dodatków"],
-        "substitutions": ["lista zamienników"],
-        "response": "odpowiedź dla klienta"
-    }}
-    Nie dodawaj żadnych innych informacji poza JSON. Żadnych dodatkowych znaków.
-    """
 
-    # Analizuj input użytkownika
-    analysis_prompt = f"""
-    {system_prompt}
+def _process_locally(state: AgentState, user_message: str) -> Tuple[bool, str]:
+    """Obsługuje wiadomość bez LLM'a (szybka ścieżka, cache).
 
-    Obecne zamówienie: {state['current_order']}
-    
-    Wiadomość klienta: {user_message}
+    Zwraca parę (czy obsłużono, klucz cache dla odpowiedzi LLM'a).
     """
 
-    # Wywołanie LLM'a z kontekstem
-    response = llm.invoke([HumanMessage(content=analysis_prompt)])
+    # Szybka ścieżka - proste frazy z menu nie wymagają wywołania LLM'a
+    if CFG.fast_path_parser:
+        analysis = parse_order(
+            user_message, state["current_order"], state["menu"].matcher
+        )
+        if analysis is not None:
+            raw = f"fast_path {json.dumps(analysis, ensure_ascii=False)}"
+            apply_analysis(state, analysis, user_message, raw)
+            return True, None
+
+    # Cache - powtarzalne wiadomości dla tego samego zamówienia nie wymagają LLM'a
+    cache_key = None
+    if CFG.response_cache:
+        cache_key = make_key(
+            user_message, state["current_order"], state["menu"].digest
+        )
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            raw = f"cache {cached}"
+            apply_analysis(state, json.loads(cached), user_message, raw)
+            return True, None
+
+    return False, cache_key
+
+
+def _apply_process_response(
+    state: AgentState, user_message: str, content: str, cache_key: str
+) -> AgentState:
+    """Aktualizuje stan na podstawie odpowiedzi analizy intencji"""
 
-    # Próba sparsowania odpowiedzi do JSON i obsługi intencji
+    # Próba zdekodowania odpowiedzi (z naprawą typowych błędów) i obsługi intencji
     try:
-        # Parsowanie odpowiedzi do JSON
-        analysis = json.loads(response.content)
-
-        # Aktualizuj current_order jeśli podano szczegóły.
-        # Pozwala to na modyfikację napoju bez potrzeby ponownego podawania wszystkich innych cech.
-        if analysis.get("intent"):
-            state["intent"] = analysis["intent"]
-        if analysis.get("drink_type"):
-            state["current_order"]["drink_type"] = analysis["drink_type"]
-        if analysis.get("size"):
-            state["current_order"]["size"] = analysis["size"]
-        if analysis.get("customizations"):
-            for item in analysis["customizations"]:
-                if item not in state["current_order"]["customizations"]:
-                    state["current_order"]["customizations"].append(item)
-        if analysis.get("substitutions"):
-            for item in analysis["substitutions"]:
-                if item not in state["current_order"]["substitutions"]:
-                    state["current_order"]["substitutions"].append(item)
-
-        # Dodaj odpowiedź do historii
-        state["messages"].append(AIMessage(content=analysis["response"]))
+        analysis, repaired = decode(content, PROCESS_SCHEMA)
+        DECODE_STATS.record("process_input", "repaired" if repaired else "clean")
 
-        # Zapisz do logu konwersacji
-        state["conversation_log"].append(
-            f"""process_user_input({user_message}): {response.content}\n\n Stan zamówienia: Napój: {state['current_order']['drink_type']},  Rozmiar: {state['current_order']['size']} Dostępne dodatki: {state['current_order']['customizations']} Dostępne zamienniki: {state['current_order']['substitutions']}\n\n"""
-        )
+        # Zapamiętaj poprawną odpowiedź dla kolejnych takich samych wiadomości
+        if cache_key is not None:
+            RESPONSE_CACHE.put(cache_key, json.dumps(analysis, ensure_ascii=False))
+
+        # Aktualizuj stan na podstawie analizy
+        apply_analysis(state, analysis, user_message, content)
+
+    except DecodeError:
+        DECODE_STATS.record("process_input", "fallback")
 
-    except json.JSONDecodeError:
         # W przypadku błędu parsowania odpowiedzi, zwracamy fallback.
         fallback_response = "Przepraszam, nie zrozumiałem. Czy możesz powtórzyć?"
         state["messages"].append(AIMessage(content=fallback_response))
 
         # Zapisz do logu konwersacji
         state["conversation_log"].append(
-            f"process_user_input({user_message}): {fallback_response} + \n{response.content}"
+            "process_user_input", user_message, fallback_response, odpowiedź=content
         )
 
     # Zwraca stan agenta do dalszego przetwarzania.
     return state
 
 
+def _stream_callback(config: RunnableConfig) -> Optional[Callable[[str], None]]:
+    """Zwraca funkcję odbierającą fragmenty odpowiedzi (tryb strumieniowy)"""
+    if not CFG.stream_responses or not config:
+        return None
+    return config.get("configurable", {}).get("stream_callback")
+
+
+def _stream_response(llm: ChatOpenAI, messages: List, callback: Callable):
+    """Odbiera odpowiedź LLM'a token po tokenie i przekazuje treść pola response"""
+    scanner = JsonFieldScanner("response")
+    response = None
+    for chunk in llm.stream(messages):
+        response = chunk if response is None else response + chunk
+        delta = scanner.feed(chunk.content)
+        if delta:
+            callback(delta)
+    return response
+
+
+async def _astream_response(llm: ChatOpenAI, messages: List, callback: Callable):
+    """Asynchroniczna wersja _stream_response"""
+    scanner = JsonFieldScanner("response")
+    response = None
+    async for chunk in llm.astream(messages):
+        response = chunk if response is None else response + chunk
+        delta = scanner.feed(chunk.content)
+        if delta:
+            callback(delta)
+    return response
+
+
+def process_user_input(state: AgentState, config: RunnableConfig = None) -> AgentState:
+    """Przetwarza input użytkownika i aktualizuje stan"""
+
+    # Pobierz ostatnią wiadomość użytkownika
+    user_message = _last_user_message(state)
+
+    # Wiadomości obsłużone lokalnie nie wymagają wywołania LLM'a
+    handled, cache_key = _process_locally(state, user_message)
+    if handled:
+        return state
+
+    # Pobierz obiekt LLM'a z puli
+    llm = structured(create_llm(), PROCESS_SCHEMA)
+
+    # Wywołanie LLM'a z kontekstem
+    messages = state["menu"].prompts.process_messages(
+        state["current_order"], user_message
+    )
+    callback = _stream_callback(config)
+    with llm_timer("process_input"):
+        if callback is None:
+            response = llm.invoke(messages)
+        else:
+            # Tryb strumieniowy - klient widzi odpowiedź w trakcie generowania,
+            # a pozostałe pola trafiają do stanu po domknięciu obiektu JSON
+            response = _stream_response(llm, messages, callback)
+    _record_usage(state, "process_input", response)
+
+    # Zwraca stan agenta do dalszego przetwarzania.
+    return _apply_process_response(
+        state, user_message, response.content, cache_key
+    )
+
+
+async def aprocess_user_input(
+    state: AgentState, config: RunnableConfig = None
+) -> AgentState:
+    """Asynchronicznie przetwarza input użytkownika i aktualizuje stan"""
+
+    # Pobierz ostatnią wiadomość użytkownika
+    user_message = _last_user_message(state)
+
+    # Wiadomości obsłużone lokalnie nie wymagają wywołania LLM'a
+    handled, cache_key = _process_locally(state, user_message)
+    if handled:
+        return state
+
+    # Asynchroniczne wywołanie LLM'a nie blokuje wątku w czasie oczekiwania na sieć
+    llm = structured(create_llm(), PROCESS_SCHEMA)
+    messages = state["menu"].prompts.process_messages(
+        state["current_order"], user_message
+    )
+    callback = _stream_callback(config)
+    with llm_timer("process_input"):
+        if callback is None:
+            response = await llm.ainvoke(messages)
+        else:
+            response = await _astream_response(llm, messages, callback)
+    _record_usage(state, "process_input", response)
+
+    # Zwraca stan agenta do dalszego przetwarzania.
+    return _apply_process_response(
+        state, user_message, response.content, cache_key
+    )
+
+
+def _fork_state(state: AgentState) -> AgentState:
+    """Tworzy kopię mutowanych pól stanu dla spekulatywnej analizy intencji"""
+    speculative_state = dict(state)
+    speculative_state["messages"] = state["messages"].fork()
+    speculative_state["conversation_log"] = state["conversation_log"].fork()
+    speculative_state["current_order"] = copy.deepcopy(state["current_order"])
+    return speculative_state
+
+
+def _commit_speculation(
+    state: AgentState,
+    speculative_state: AgentState,
+    base_messages: int,
+    base_log: int,
+) -> AgentState:
+    """Zatwierdza wynik analizy intencji tylko dla dozwolonego zapytania"""
+    committed = bool(state["is_valid"])
+    SPECULATION_STATS.record(committed)
+    if committed:
+        state["intent"] = speculative_state["intent"]
+        state["current_order"] = speculative_state["current_order"]
+        state["messages"].extend(speculative_state["messages"].since(base_messages))
+        state["conversation_log"].extend(
+            speculative_state["conversation_log"].since(base_log)
+        )
+        state["conversation_log"].append("speculative_user_input", result="committed")
+    else:
+        state["conversation_log"].append("speculative_user_input", result="discarded")
+
+    # Zwraca stan agenta do dalszego przetwarzania.
+    return state
+
+
+def speculative_user_input(state: AgentState) -> AgentState:
+    """Uruchamia równolegle guardrail i analizę intencji"""
+
+    # Analiza intencji pracuje na kopii mutowanych pól stanu,
+    # dzięki czemu jej wynik można odrzucić bez śladu.
+    speculative_state = _fork_state(state)
+    base_messages = state["messages"].mark()
+    base_log = state["conversation_log"].mark()
+
+    # Start obu wywołań LLM'a w tym samym czasie. Kopia kontekstu przenosi
+    # do wątku licznik czasu LLM'a węzła (metryki czasu lokalnego)
+    future = _speculation_executor.submit(
+        contextvars.copy_context().run, process_user_input, speculative_state
+    )
+    state = validate_user_input(state)
+    speculative_state = future.result()
+
+    return _commit_speculation(state, speculative_state, base_messages, base_log)
+
+
+async def aspeculative_user_input(state: AgentState) -> AgentState:
+    """Asynchronicznie uruchamia równolegle guardrail i analizę intencji"""
+
+    speculative_state = _fork_state(state)
+    base_messages = state["messages"].mark()
+    base_log = state["conversation_log"].mark()
+
+    # Oba wywołania LLM'a działają współbieżnie w jednej pętli zdarzeń
+    state, speculative_state = await asyncio.gather(
+        avalidate_user_input(state), aprocess_user_input(speculative_state)
+    )
+
+    return _commit_speculation(state, speculative_state, base_messages, base_log)
+
+
+def speculative_route(state: AgentState) -> str:
+    """Łączy decyzje guardraila i analizy intencji dla trybu spekulatywnego"""
+    if process_user_input_route(state) == "forbidden_input":
+        return "forbidden_input"
+    return add_to_cart_route(state)
+
+
+def _skipped_note(state: AgentState) -> str:
+    """Informacja dla klienta o pozycjach z ostatniej wiadomości spoza menu"""
+    if not state.get("skipped"):
+        return ""
+    return f"\n\nNie mamy w menu: {', '.join(state['skipped'])} - pominąłem."
+
+
+def _drop_unpriced(order: Dict, error: PricingError):
+    """Usuwa z zamówienia wartość, której nie dało się wycenić"""
+    if error.field == pricing.DRINK:
+        order["drink_type"] = None
+    elif error.field == pricing.SIZE:
+        order["size"] = None
+    elif error.value in order["customizations"]:
+        order["customizations"].remove(error.value)
+
+
 def add_to_cart(state: AgentState) -> AgentState:
     """Dodaje aktualne zamówienie do koszyka"""
 
     # Zapisz do logu konwersacji
-    state["conversation_log"].append(f"add_to_cart({state['current_order']})")
+    state["conversation_log"].append(
+        "add_to_cart", _order_snapshot(state["current_order"])
+    )
 
     # Sprawdź czy napój i rozmiar są poprawne
     if state["current_order"]["drink_type"] and state["current_order"]["size"]:
@@ -257,24 +621,37 @@ def add_to_cart(state: AgentState) -> AgentState:
         # Pobierz dane z aktualnego zamówienia
         drink = state["current_order"]["drink_type"]
         size = state["current_order"]["size"]
-        price = CFG.DRINK_PRICES.get(drink, {}).get(size, 10)
-
-        # Dodaj koszty dodatków
-        for custom in state["current_order"]["customizations"]:
-            price += CFG.ADDON_PRICES.get(custom, 0)
+        customizations = state["current_order"]["customizations"]
+
+        # Cena z cennika skompilowanego z menu (dokładnie, w groszach)
+        try:
+            price_grosze = state["menu"].prices.price(drink, size, customizations)
+        except PricingError as error:
+            # Pozycja spoza menu nie może blokować kolejnych prób dodania
+            _drop_unpriced(state["current_order"], error)
+            message = (
+                f"Przepraszam, nie mamy tego w menu ({error}). "
+                "Wybierz coś z menu."
+            )
+            state["conversation_log"].append("add_to_cart", result=message)
+            state["messages"].append(AIMessage(content=message))
+            return state
+        price = item_price(price_grosze)
 
         # Utwórz element koszyka
         cart_item = {
             "drink": drink,
             "size": size,
-            "customizations": state["current_order"]["customizations"].copy(),
+            "customizations": customizations.copy(),
             "substitutions": state["current_order"]["substitutions"].copy(),
             "price": price,
         }
 
         # Dodaj element do koszyka
         state["cart"]["items"].append(cart_item)
-        state["cart"]["total"] += price
+        state["cart"]["total_grosze"] += price_grosze
+        state["cart"]["total"] = state["cart"]["total_grosze"] / 100
+        state["cart"]["version"] = next(_versions)
 
         # Resetuj current_order
         state["current_order"] = {
@@ -287,13 +664,16 @@ def add_to_cart(state: AgentState) -> AgentState:
 
         # Zapisz do logu konwersacji
         state["conversation_log"].append(
-            f"Koszyk: {len(state['cart']['items'])} przedmiotów, {state['cart']['total']} zł"
+            "koszyk",
+            przedmioty=len(state["cart"]["items"]),
+            suma=state["cart"]["total"],
         )
 
         # Dodaj potwierdzenie do historii rozmowy
         state["messages"].append(
             AIMessage(
-                content=f"Dodałem {drink} {size} do koszyka. Cena: {price} zł. Co jeszcze chciałbyś zamówić?"
+                content=f"Dodałem {state['menu'].display_name(drink)} {size} do koszyka. Cena: {price} zł. Co jeszcze chciałbyś zamówić?"
+                + _skipped_note(state)
             )
         )
 
@@ -301,36 +681,87 @@ def add_to_cart(state: AgentState) -> AgentState:
     return state
 
 
-def checkout(state: AgentState) -> AgentState:
-    """Finalizuje zamówienie"""
+def _order_summary(state: AgentState) -> str:
+    """Zwraca podsumowanie pozycji koszyka"""
+    items_summary = []
+    # Dla każdego elementu w koszyku tworzymy podsumowanie
+    for item in state["cart"]["items"]:
+        customizations = (
+            ", ".join(item["customizations"])
+            if item["customizations"]
+            else "bez dodatków"
+        )
+        substitutions = (
+            ", ".join(item["substitutions"])
+            if item["substitutions"]
+            else "standardowe"
+        )
+        items_summary.append(
+            f"- {state['menu'].display_name(item['drink'])} {item['size']} ({customizations}, {substitutions}) - {item['price']} zł"
+        )
+    return "\n".join(items_summary)
+
+
+def _record_order(state: AgentState) -> Optional[Future]:
+    """Dopisuje zamówienie do księgi i zwraca przyszły wynik zapisu na dysk"""
+    ledger = get_ledger()
+    if ledger is None:
+        return None
+    # Trwały zapis zamówienia (fsync współdzielony z innymi zamówieniami)
+    return ledger.append(
+        state["session_id"],
+        copy.deepcopy(state["cart"]["items"]),
+        state["cart"]["total_grosze"] / 100,
+        state["cart"]["total_grosze"],
+    )
+
+
+def _checkout_empty_cart(state: AgentState) -> AgentState:
+    """Odpowiedź na checkout z pustym koszykiem"""
+    empty_cart_message = "Koszyk jest pusty. Czy chciałbyś coś zamówić?"
+    state["messages"].append(AIMessage(content=empty_cart_message))
+
+    # Zapisz do logu konwersacji
+    state["conversation_log"].append(
+        "checkout",
+        result=empty_cart_message,
+        przedmioty=len(state["cart"]["items"]),
+        suma=state["cart"]["total"],
+        stan_zamówienia=_order_snapshot(state["current_order"]),
+    )
+    return state
+
+
+def _checkout_failed(state: AgentState, error: BaseException) -> AgentState:
+    """Zamówienie nie zostało zapisane - koszyk zostaje do ponownej próby"""
+    failed_message = (
+        "Przepraszam, nie udało się zapisać zamówienia. "
+        "Koszyk jest zachowany - spróbuj sfinalizować zamówienie za chwilę."
+    )
+    state["messages"].append(AIMessage(content=failed_message))
+    state["conversation_log"].append(
+        "checkout",
+        result=failed_message,
+        błąd=repr(error),
+        przedmioty=len(state["cart"]["items"]),
+        suma=state["cart"]["total"],
+    )
+    return state
 
-    # Sprawdź czy koszyk nie jest pusty
-    if state["cart"]["items"]:
-        # Tworzy podsumowanie zamówienia
-        items_summary = []
-        # Dla każdego elementu w koszyku tworzymy podsumowanie
-        for item in state["cart"]["items"]:
-            customizations = (
-                ", ".join(item["customizations"])
-                if item["customizations"]
-                else "bez dodatków"
-            )
-            substitutions = (
-                ", ".join(item["substitutions"])
-                if item["substitutions"]
-                else "standardowe"
-            )
-            items_summary.append(
-                f"- {item['drink']} {item['size']} ({customizations}, {substitutions}) - {item['price']} zł"
-            )
-        summary = "\n".join(items_summary)
-        total = state["cart"]["total"]
 
-        state["orders_completed"] += 1
-        state["total_revenue"] += total
+def _complete_checkout(state: AgentState, synced: bool = True) -> AgentState:
+    """Kończy zapisane zamówienie: liczniki, podsumowanie i pusty koszyk"""
+    summary = _order_summary(state)
+    total_grosze = state["cart"]["total_grosze"]
+    total = total_grosze / 100
 
-        # Tworzy odpowiedź do użytkownika
-        final_message = f"""
+    state["orders_completed"] += 1
+    revenue_grosze = to_grosze(state["total_revenue"]) + total_grosze
+    state["total_revenue"] = revenue_grosze / 100
+    BUSINESS_METRICS.record_order(total_grosze, len(state["cart"]["items"]))
+
+    # Tworzy odpowiedź do użytkownika
+    final_message = f"""
         🎉 Dziękuję za zamówienie! Oto podsumowanie:
         
         {summary}
@@ -340,38 +771,76 @@ def checkout(state: AgentState) -> AgentState:
         Zamówienie zostanie przygotowane za kilka minut. Miłego dnia! ☕
         """
 
-        # Dodaje odpowiedź do historii rozmowy
-        state["messages"].append(AIMessage(content=final_message))
+    # Dodaje odpowiedź do historii rozmowy
+    state["messages"].append(AIMessage(content=final_message))
+
+    # Zerowanie koszyka
+    state["cart"]["items"] = []
+    state["cart"]["total"] = 0.0
+    state["cart"]["total_grosze"] = 0
+    state["cart"]["version"] = next(_versions)
+
+    # Resetowanie current_order
+    state["current_order"] = {
+        "drink_type": None,
+        "size": None,
+        "customizations": [],
+        "substitutions": [],
+    }
 
-        # Zerowanie koszyka
-        state["cart"]["items"] = []
-        state["cart"]["total"] = 0.0
+    # Zapisz do logu konwersacji
+    extra = {} if synced else {"zapis": "niepotwierdzony (timeout)"}
+    state["conversation_log"].append(
+        "checkout",
+        result=final_message,
+        przedmioty=len(state["cart"]["items"]),
+        suma=state["cart"]["total"],
+        stan_zamówienia=_order_snapshot(state["current_order"]),
+        **extra,
+    )
+    return state
 
-        # Resetowanie current_order
-        state["current_order"] = {
-            "drink_type": None,
-            "size": None,
-            "customizations": [],
-            "substitutions": [],
-        }
 
-        # Zapisz do logu konwersacji
-        cart_state = f"Koszyk: {len(state['cart']['items'])} przedmiotów, {state['cart']['total']} zł"
-        state["conversation_log"].append(
-            f"checkout: {final_message} + \n{cart_state} + \n{state['current_order'].copy()}"
-        )
-    else:
-        empty_cart_message = "Koszyk jest pusty. Czy chciałbyś coś zamówić?"
-        state["messages"].append(AIMessage(content=empty_cart_message))
+def checkout(state: AgentState) -> AgentState:
+    """Finalizuje zamówienie"""
 
-        # Zapisz do logu konwersacji
-        cart_state = f"Koszyk: {len(state['cart']['items'])} przedmiotów, {state['cart']['total']} zł"
-        state["conversation_log"].append(
-            f"checkout: {empty_cart_message} + \n{cart_state} + \n{state['current_order'].copy()}"
-        )
+    # Sprawdź czy koszyk nie jest pusty
+    if not state["cart"]["items"]:
+        return _checkout_empty_cart(state)
 
-    # Zwraca stan agenta do dalszego przetwarzania.
-    return state
+    committed = _record_order(state)
+    if committed is None or not CFG.ledger_wait_for_sync:
+        return _complete_checkout(state)
+    try:
+        committed.result(timeout=CFG.ledger_sync_timeout)
+    except FutureTimeoutError:
+        # Rekord czeka w kolejce zapisu - ponowienie zdublowałoby zamówienie
+        return _complete_checkout(state, synced=False)
+    except Exception as error:
+        return _checkout_failed(state, error)
+    return _complete_checkout(state)
+
+
+async def acheckout(state: AgentState) -> AgentState:
+    """Asynchroniczna wersja checkout - fsync nie blokuje pętli zdarzeń"""
+
+    # Sprawdź czy koszyk nie jest pusty
+    if not state["cart"]["items"]:
+        return _checkout_empty_cart(state)
+
+    committed = _record_order(state)
+    if committed is None or not CFG.ledger_wait_for_sync:
+        return _complete_checkout(state)
+    try:
+        # shield - przekroczenie czasu nie anuluje zapisu zamówienia
+        await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(committed)), CFG.ledger_sync_timeout
+        )
+    except asyncio.TimeoutError:
+        return _complete_checkout(state, synced=False)
+    except Exception as error:
+        return _checkout_failed(state, error)
+    return _complete_checkout(state)
 
 
 def add_to_cart_route(state: AgentState) -> str:
@@ -380,77 +849,243 @@ def add_to_cart_route(state: AgentState) -> str:
     # Decyduje czy dodać do koszyka, podsumować zamówienie czy kontynuować rozmowę
     if state["intent"] == "add_to_cart":
         state["conversation_log"].append(
-            f"add_to_cart_route({state['intent']}): add_to_cart"
+            "add_to_cart_route", state["intent"], "add_to_cart"
         )
         return "add_to_cart"
     elif state["intent"] == "checkout":
         state["conversation_log"].append(
-            f"add_to_cart_route({state['intent']}): checkout"
+            "add_to_cart_route", state["intent"], "checkout"
         )
         return "checkout"
     else:
         state["conversation_log"].append(
-            f"add_to_cart_route({state['intent']}): continue"
+            "add_to_cart_route", state["intent"], "continue"
         )
         return "continue"
 
 
-def create_agent_graph():
+def _unwrapped(name: str, func):
+    """Zwraca węzeł bez instrumentacji"""
+    return func
+
+
+def create_agent_graph(speculative: bool = None):
     """Tworzy graf agenta LangGraph"""
 
+    if speculative is None:
+        speculative = CFG.speculative_execution
+
+    # Pomiary czasu węzłów i decyzji routingu tylko przy włączonych metrykach
+    if metrics.is_enabled():
+        node, anode = metrics.timed_node, metrics.atimed_node
+        route = metrics.counted_route
+    else:
+        node = anode = route = _unwrapped
+
     # Tworzenie grafu
     workflow = StateGraph(AgentState)
 
     # Dodanie węzłów
-    workflow.add_node("validate_input", validate_user_input)
-    workflow.add_node("process_input", process_user_input)
-    workflow.add_node("add_to_cart", add_to_cart)
-    workflow.add_node("checkout", checkout)
+    # Węzły z LLM'em mają wersje synchroniczne (invoke) i asynchroniczne (ainvoke)
+    if speculative:
+        workflow.add_node(
+            "speculative_input",
+            RunnableLambda(
+                node("speculative_input", speculative_user_input),
+                afunc=anode("speculative_input", aspeculative_user_input),
+            ),
+        )
+    else:
+        workflow.add_node(
+            "validate_input",
+            RunnableLambda(
+                node("validate_input", validate_user_input),
+                afunc=anode("validate_input", avalidate_user_input),
+            ),
+        )
+        workflow.add_node(
+            "process_input",
+            RunnableLambda(
+                node("process_input", process_user_input),
+                afunc=anode("process_input", aprocess_user_input),
+            ),
+        )
+    workflow.add_node("add_to_cart", node("add_to_cart", add_to_cart))
+    workflow.add_node(
+        "checkout",
+        RunnableLambda(
+            node("checkout", checkout), afunc=anode("checkout", acheckout)
+        ),
+    )
 
     # Dodanie krawędzi
-    workflow.add_edge(START, "validate_input")
+    workflow.add_edge(START, "speculative_input" if speculative else "validate_input")
     workflow.add_edge("add_to_cart", END)
     workflow.add_edge("checkout", END)
 
     # Dodanie warunkowych krawędzi
-    workflow.add_conditional_edges(
-        "validate_input",
-        process_user_input_route,
-        {"process_input": "process_input", "forbidden_input": END},
-    )
-    workflow.add_conditional_edges(
-        "process_input",
-        add_to_cart_route,
-        {"add_to_cart": "add_to_cart", "checkout": "checkout", "continue": END},
-    )
+    if speculative:
+        workflow.add_conditional_edges(
+            "speculative_input",
+            route("speculative_route", speculative_route),
+            {
+                "add_to_cart": "add_to_cart",
+                "checkout": "checkout",
+                "continue": END,
+                "forbidden_input": END,
+            },
+        )
+    else:
+        workflow.add_conditional_edges(
+            "validate_input",
+            route("process_user_input_route", process_user_input_route),
+            {"process_input": "process_input", "forbidden_input": END},
+        )
+        workflow.add_conditional_edges(
+            "process_input",
+            route("add_to_cart_route", add_to_cart_route),
+            {"add_to_cart": "add_to_cart", "checkout": "checkout", "continue": END},
+        )
 
     # Zwraca skompilowany graf
     return workflow.compile()
 
 
+# Skompilowane grafy współdzielone przez wszystkie sesje
+_graphs = {}
+
+
+def get_agent_graph(speculative: bool = None):
+    """Zwraca współdzielony, skompilowany graf agenta"""
+    if speculative is None:
+        speculative = CFG.speculative_execution
+    if speculative not in _graphs:
+        _graphs[speculative] = create_agent_graph(speculative)
+    return _graphs[speculative]
+
+
+def _is_checkout_message(message: str) -> bool:
+    """Sprawdza czy wiadomość jest prośbą o finalizację zamówienia"""
+    return "checkout" in message.lower() or "finalizuj" in message.lower()
+
+
 class Agent:
     """Klasa agenta"""
 
     # Inicjalizacja grafu i stanu agenta
-    def __init__(self):
-        self.graph = create_agent_graph()
-        self.state = initialize_state()
+    def __init__(self, session_id: str = None, checkpointer=None):
+        self.session_id = session_id
+        self.graph = get_agent_graph()
+        self.checkpointer = checkpointer or get_checkpointer()
+        self.state = initialize_state(session_id=session_id)
+
+        # Wznowienie sesji zapisanej przed restartem procesu
+        if self.checkpointer is not None and session_id is not None:
+            blob = self.checkpointer.load(session_id)
+            if blob is not None:
+                chunks = self.checkpointer.load_archive(session_id)
+                restore_state(self.state, blob, chunks)
 
     # Główna metoda do obsługi czatu
     def chat(self, message: str) -> str:
         """Główna metoda do obsługi czatu"""
 
         # Dodaj wiadomość użytkownika
-        self.state["messages"].append(HumanMessage(content=message))
+        usage_mark = self._begin_turn(message)
 
         # Sprawdź czy to checkout
-        if "checkout" in message.lower() or "finalizuj" in message.lower():
-            self.state = checkout(self.state)
-        else:
-            # Uruchom graf
-            self.state = self.graph.invoke(self.state)
+        with CHAT_SECONDS.time("sync"):
+            if _is_checkout_message(message):
+                self.state = checkout(self.state)
+            else:
+                # Uruchom graf
+                self.state = self.graph.invoke(self.state)
+
+        # Zwróć ostatnią odpowiedź
+        self._end_turn(usage_mark)
+        return self._last_response()
+
+    async def achat(self, message: str) -> str:
+        """Asynchroniczna wersja metody chat"""
+
+        # Dodaj wiadomość użytkownika
+        usage_mark = self._begin_turn(message)
+
+        # Sprawdź czy to checkout
+        with CHAT_SECONDS.time("async"):
+            if _is_checkout_message(message):
+                self.state = await acheckout(self.state)
+            else:
+                # Uruchom graf bez blokowania pętli zdarzeń
+                self.state = await self.graph.ainvoke(self.state)
 
         # Zwróć ostatnią odpowiedź
+        self._end_turn(usage_mark)
+        return self._last_response()
+
+    async def astream_chat(self, message: str) -> AsyncIterator[str]:
+        """Asynchronicznie obsługuje wiadomość zwracając narastającą odpowiedź.
+
+        Kolejne wartości to dotychczas wygenerowany tekst odpowiedzi,
+        a ostatnia wartość to pełna, ostateczna odpowiedź agenta.
+        """
+
+        # Dodaj wiadomość użytkownika
+        usage_mark = self._begin_turn(message)
+
+        # Checkout nie korzysta z LLM'a - nie ma czego strumieniować
+        if _is_checkout_message(message):
+            with CHAT_SECONDS.time("stream"):
+                self.state = await acheckout(self.state)
+            self._end_turn(usage_mark)
+            yield self._last_response()
+            return
+
+        start = time.perf_counter()
+
+        # Fragmenty odpowiedzi trafiają do kolejki z węzła process_input
+        queue = asyncio.Queue()
+        config = {"configurable": {"stream_callback": queue.put_nowait}}
+        run = asyncio.ensure_future(self.graph.ainvoke(self.state, config=config))
+
+        partial = ""
+        while not run.done() or not queue.empty():
+            next_delta = asyncio.ensure_future(queue.get())
+            await asyncio.wait({run, next_delta}, return_when=asyncio.FIRST_COMPLETED)
+            if next_delta.done():
+                partial += next_delta.result()
+                yield partial
+            else:
+                next_delta.cancel()
+
+        # Zwróć ostateczną odpowiedź
+        self.state = run.result()
+        CHAT_SECONDS.observe(time.perf_counter() - start, "stream")
+        self._end_turn(usage_mark)
+        yield self._last_response()
+
+    def _begin_turn(self, message: str) -> Tuple:
+        """Rozpoczyna turę: zapisuje wiadomość i przypina bieżącą wersję menu.
+
+        Przeładowanie menu w trakcie tury nie zmienia cen ani promptów tej tury.
+        """
+        self.state["messages"].append(HumanMessage(content=message))
+        self.state["menu"] = current_menu()
+        return self.state["usage"].mark()
+
+    def _end_turn(self, usage_mark: Tuple):
+        """Zapisuje zużycie tokenów zakończonej tury"""
+        self.state["usage"].end_turn(usage_mark)
+        USAGE.count_turn()
+        self._checkpoint()
+
+    def _checkpoint(self):
+        """Odkłada stan sesji do zapisu (zapis na dysk odbywa się w tle)"""
+        if self.checkpointer is not None and self.session_id is not None:
+            self.checkpointer.save(self.session_id, self.state)
+
+    def _last_response(self) -> str:
+        """Zwraca ostatnią odpowiedź agenta"""
         if self.state["messages"]:
             return self.state["messages"][-1].content
         return "Przepraszam, wystąpił błąd."
@@ -463,11 +1098,55 @@ class Agent:
             "item_count": len(self.state["cart"]["items"]),
         }
 
+    def get_transcript(self) -> List[Dict]:
+        """Zwraca pełną historię rozmowy (razem z zarchiwizowanymi turami)"""
+        return self.state["messages"].export()
+
+    def get_cart_version(self) -> int:
+        """Zwraca wersję koszyka (zmienia się przy każdej modyfikacji)"""
+        return self.state["cart"]["version"]
+
+    def get_log_version(self) -> Tuple[int, int]:
+        """Zwraca wersję logu: (epoka, numer ostatniego zdarzenia)"""
+        log = self.state["conversation_log"]
+        return log.epoch, log.mark()
+
+    def get_new_log_entries(self, since: int) -> List[str]:
+        """Zwraca sformatowane zdarzenia logu dodane po danym numerze"""
+        return self.state["conversation_log"].format_entries(since)
+
+    def get_usage(self) -> Dict:
+        """Zwraca zużycie tokenów i koszt sesji względem zamówień i przychodu"""
+        return self.state["usage"].snapshot(
+            self.state["orders_completed"], self.state["total_revenue"]
+        )
+
+    def get_metrics(self) -> Dict:
+        """Zwraca metryki biznesowe i bieżący stan zamówienia"""
+        usage = self.get_usage()
+        return {
+            "orders_completed": self.state["orders_completed"],
+            "total_revenue": self.state["total_revenue"],
+            "tokens": usage["totals"]["tokens"],
+            "cost_usd": round(usage["totals"]["cost_usd"], 6),
+            "menu_version": self.state["menu"].number,
+            "intent": self.state["intent"],
+            "current_order": self.state["current_order"],
+        }
+
     def reset(self):
         """Resetuje stan agenta z zachowaniem metryk"""
         orders_completed = self.state["orders_completed"]
         total_revenue = self.state["total_revenue"]
-        self.state = initialize_state(orders_completed, total_revenue)
+        self.state["conversation_log"].flush()
+        self.state = initialize_state(
+            orders_completed,
+            total_revenue,
+            session_id=self.session_id,
+            usage=self.state["usage"],
+            reset=True,
+        )
+        self._checkpoint()
 
     def get_conversation_log(self) -> str:
         """Zwraca pełny log konwersacji i metryki w formacie JSON"""
@@ -477,8 +1156,10 @@ class Agent:
             "metrics": {
                 "orders_completed": self.state["orders_completed"],
                 "total_revenue": self.state["total_revenue"],
+                "usage": self.get_usage(),
+                "process": BUSINESS_METRICS.totals(),
             },
-            "conversation_log": self.state["conversation_log"],
+            "conversation_log": self.state["conversation_log"].format_entries(),
             "cart_summary": self.get_cart_summary(),
             "current_state": {
                 "intent": self.state["intent"],
@@ -492,4 +1173,4 @@ class Agent:
 
     def clear_conversation_log(self):
         """Czyści log konwersacji"""
-        self.state["conversation_log"] = []
+        self.state["conversation_log"].clear()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Benchmark grafu agenta Kawiarni AI z deterministycznym, fałszywym LLM'em
+
+Mierzy koszt samego grafu (routing, kopiowanie stanu, logowanie, budowanie
+promptów) bez wywołań API. Wynik jest zapisywany w formacie JSON, a porównanie
+z poprzednim wynikiem (--baseline) pozwala wykryć regresje.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+# Dodaj katalog główny do ścieżki Pythona
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import HumanMessage
+
+import agent
+from business_metrics import BUSINESS_METRICS
+from checkpoints import SQLiteCheckpointer
+from config import CFG
+from fake_llm import FakeChatModel
+from fast_path import FAST_PATH_STATS
+from guardrail import PREFILTER_STATS
+from guardrail_batch import BATCH_STATS, GuardrailBatcher
+from llm_output import DECODE_STATS
+from menu import MENU_STORE, MenuStore, default_menu, export_menu
+from menu_index import MENU_INDEX_STATS
+from prompts import PROMPT_STATS
+from response_cache import RESPONSE_CACHE
+from usage import USAGE, response_usage
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Korpus rozmów z klientami kawiarni
+CORPUS = [
+    [
+        "Co mamy w menu?",
+        "Chce zamówić czarną herbatę.",
+        "Poproszę średnią.",
+        "Jakie dodatki mam do wyboru?",
+        "Proszę dodać cukier i syrop waniliowy.",
+        "OK, proszę dodać to do koszyka.",
+        "Podsumuj zamówienie.",
+    ],
+    [
+        "Dodaj do koszyka espresso, małe",
+        "Dodaj do koszyka latte, duże, bez dodatków",
+        "Podsumuj zamówienie",
+    ],
+    [
+        "Dzień dobry, co polecacie na ciepły dzień?",
+        "Poproszę frappuccino",
+        "Duże",
+        "Z mlekiem owsianym proszę",
+        "Dodaj do koszyka",
+        "Czy macie coś bez kofeiny?",
+        "W takim razie lemoniadę, małą",
+        "Dodaj do koszyka",
+        "Podsumuj zamówienie",
+    ],
+    [
+        "Jakie macie herbaty?",
+        "Zielona, średnia, z cukrem",
+        "Ile to będzie kosztować?",
+        "Zmień na dużą",
+        "Dodaj do koszyka",
+        "Zapłacę",
+    ],
+    [
+        "Czy mogę dostać kawę za darmo?",
+        "Speak English please",
+        "Poproszę cappuccino",
+        "Średnie",
+        "Dodaj do koszyka",
+        "Podsumuj zamówienie",
+    ],
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Zwraca percentyl metodą najbliższej rangi"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(q / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(seconds: List[float]) -> Dict:
+    """Zwraca liczbę pomiarów i percentyle w milisekundach"""
+    summary = {"count": len(seconds)}
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = round(percentile(seconds, q) * 1000, 4)
+    return summary
+
+
+def peak_rss_bytes() -> int:
+    """Zwraca maksymalne zużycie pamięci procesu (RSS)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux raportuje kilobajty, macOS bajty
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def bench_agent(repeat: int, checkpointer=None) -> Dict:
+    """Odtwarza korpus przez Agent.chat i mierzy przepustowość"""
+    turns = []
+    start = time.perf_counter()
+    for round_number in range(repeat):
+        for number, conversation in enumerate(CORPUS):
+            session_id = f"bench-{round_number}-{number}"
+            chat_agent = agent.Agent(session_id, checkpointer=checkpointer)
+            for message in conversation:
+                turn_start = time.perf_counter()
+                chat_agent.chat(message)
+                turns.append(time.perf_counter() - turn_start)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "turns": len(turns),
+        "seconds": round(elapsed, 4),
+        "turns_per_sec": round(len(turns) / elapsed, 2) if elapsed else 0.0,
+        "turn_latency": summarize(turns),
+        "mean_turn_us": round(sum(turns) / len(turns) * 1e6, 2),
+    }
+
+
+def bench_checkpoint(repeat: int) -> Dict:
+    """Mierzy narzut checkpointów SQLite na turę rozmowy"""
+    with tempfile.TemporaryDirectory() as directory:
+        checkpointer = SQLiteCheckpointer(os.path.join(directory, "bench.db"))
+        try:
+            without = bench_agent(repeat)
+            with_checkpoints = bench_agent(repeat, checkpointer)
+            checkpointer.flush()
+
+            # Wznowienie sesji z bazy (leniwie, przy pierwszym użyciu agenta)
+            resume_start = time.perf_counter()
+            agent.Agent("bench-0-0", checkpointer=checkpointer)
+            resume_seconds = time.perf_counter() - resume_start
+        finally:
+            checkpointer.close()
+
+    overhead = with_checkpoints["mean_turn_us"] - without["mean_turn_us"]
+    return {
+        "turns_per_sec": with_checkpoints["turns_per_sec"],
+        "turns_per_sec_without": without["turns_per_sec"],
+        "overhead_per_turn_us": round(overhead, 2),
+        "resume_ms": round(resume_seconds * 1e3, 4),
+        **checkpointer.snapshot(),
+    }
+
+
+def bench_menu_reload(reloads: int = 20) -> Dict:
+    """Mierzy czas przeładowania menu po zmianie pliku (budowa i podmiana)"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "menu.json")
+        data = default_menu()
+        export_menu(path, data)
+        store = MenuStore(path)
+        store.current()
+
+        seconds = []
+        for number in range(reloads):
+            # Zmiana ceny i znacznika czasu pliku wymusza nową wersję menu
+            data.DRINK_PRICES["espresso"]["S"] = 8 + number % 2
+            export_menu(path, data)
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + number + 1))
+            start = time.perf_counter()
+            store.reload()
+            seconds.append(time.perf_counter() - start)
+
+        # Sprawdzenie pliku bez zmian (koszt pętli obserwującej plik)
+        start = time.perf_counter()
+        store.reload()
+        check_seconds = time.perf_counter() - start
+
+    return {
+        **summarize(seconds),
+        "reloads": store.reloads,
+        "unchanged_check_us": round(check_seconds * 1e6, 2),
+    }
+
+
+def bench_guardrail_batch(args, sessions: int = 32) -> Dict:
+    """Porównuje walidację równoczesnych sesji osobnymi i zbiorczymi zapytaniami"""
+    messages = [message for conversation in CORPUS for message in conversation]
+    messages = [messages[number % len(messages)] for number in range(sessions)]
+    prompts = MENU_STORE.current().prompts
+
+    def factory():
+        return FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+
+    # Każda sesja osobno - jedno zapytanie na walidację
+    start = time.perf_counter()
+    singles = [factory().invoke(prompts.validation_messages(m)) for m in messages]
+    single_seconds = time.perf_counter() - start
+
+    # Wszystkie sesje naraz przez kolejkę zbiorczej walidacji
+    before = BATCH_STATS.snapshot()
+    batcher = GuardrailBatcher(factory)
+    start = time.perf_counter()
+    futures = [batcher.submit(prompts, message) for message in messages]
+    batched = [future.result() for future in futures]
+    batch_seconds = time.perf_counter() - start
+    batcher.close()
+    after = BATCH_STATS.snapshot()
+
+    def tokens(responses):
+        return sum(response_usage(response)["input_tokens"] for response in responses)
+
+    def verdicts(responses):
+        return [json.loads(response.content)["is_valid"] for response in responses]
+
+    single_tokens, batch_tokens = tokens(singles), tokens(batched)
+    return {
+        "sessions": sessions,
+        "requests": after["requests"] - before["requests"],
+        "requests_without_batching": len(singles),
+        "batches": after["batches"] - before["batches"],
+        "prompt_tokens": batch_tokens,
+        "prompt_tokens_without_batching": single_tokens,
+        "prompt_token_reduction": round(1 - batch_tokens / single_tokens, 4),
+        "seconds": round(batch_seconds, 4),
+        "seconds_without_batching": round(single_seconds, 4),
+        "verdicts_match": verdicts(batched) == verdicts(singles),
+    }
+
+
+def bench_nodes(repeat: int) -> Dict:
+    """Odtwarza korpus przez graf i mierzy czas każdego węzła"""
+    graph = agent.create_agent_graph()
+    nodes = {}
+    for _ in range(repeat):
+        for conversation in CORPUS:
+            state = agent.initialize_state()
+            for message in conversation:
+                state["messages"].append(HumanMessage(content=message))
+                if agent._is_checkout_message(message):
+                    node_start = time.perf_counter()
+                    state = agent.checkout(state)
+                    nodes.setdefault("checkout", []).append(
+                        time.perf_counter() - node_start
+                    )
+                    continue
+
+                # Czas węzła to odstęp między kolejnymi aktualizacjami stanu
+                previous = time.perf_counter()
+                for mode, chunk in graph.stream(
+                    state, stream_mode=["updates", "values"]
+                ):
+                    if mode == "values":
+                        state = chunk
+                        continue
+                    now = time.perf_counter()
+                    for node in chunk:
+                        nodes.setdefault(node, []).append(now - previous)
+                    previous = now
+
+    return {node: summarize(seconds) for node, seconds in sorted(nodes.items())}
+
+
+def bench_memory() -> Dict:
+    """Mierzy alokacje pamięci na turę rozmowy (osobny przebieg z tracemalloc)"""
+    allocated = []
+    blocks = []
+    tracemalloc.start()
+    try:
+        for conversation in CORPUS:
+            chat_agent = agent.Agent()
+            for message in conversation:
+                blocks_before = sys.getallocatedblocks()
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                chat_agent.chat(message)
+                _, peak = tracemalloc.get_traced_memory()
+                allocated.append(peak - current)
+                blocks.append(sys.getallocatedblocks() - blocks_before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "alloc_bytes_per_turn": round(sum(allocated) / len(allocated)),
+        "net_blocks_per_turn": round(sum(blocks) / len(blocks), 2),
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def run_benchmark(args) -> Dict:
+    """Uruchamia wszystkie pomiary z podmienionym LLM'em"""
+    CFG.fast_path_parser = not args.no_fast_path
+    CFG.response_cache = not args.no_cache
+    CFG.guardrail_prefilter = not args.no_prefilter
+    CFG.speculative_execution = args.speculative
+
+    agent.set_llm_factory(
+        lambda: FakeChatModel(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    )
+    try:
+        # Rozgrzewka - kompilacja grafu, promptów i parsera szybkiej ścieżki
+        bench_agent(1)
+        RESPONSE_CACHE.clear()
+
+        result = {
+            "config": {
+                "repeat": args.repeat,
+                "latency": args.latency,
+                "jitter": args.jitter,
+                "fast_path_parser": CFG.fast_path_parser,
+                "response_cache": CFG.response_cache,
+                "guardrail_prefilter": CFG.guardrail_prefilter,
+                "speculative_execution": CFG.speculative_execution,
+                "python": sys.version.split()[0],
+            },
+            "agent": bench_agent(args.repeat),
+        }
+        RESPONSE_CACHE.clear()
+        result["nodes"] = bench_nodes(args.repeat)
+        RESPONSE_CACHE.clear()
+        result["memory"] = bench_memory()
+        RESPONSE_CACHE.clear()
+        result["checkpoint"] = bench_checkpoint(args.repeat)
+        result["menu_reload"] = bench_menu_reload()
+        result["guardrail_batch"] = bench_guardrail_batch(args)
+        business = BUSINESS_METRICS.totals()
+        result["stats"] = {
+            "prompts": PROMPT_STATS.snapshot(),
+            "decode": DECODE_STATS.snapshot(),
+            "fast_path": FAST_PATH_STATS.snapshot(),
+            "menu_index": MENU_INDEX_STATS.snapshot(),
+            "menu": MENU_STORE.snapshot(),
+            "prefilter": PREFILTER_STATS.snapshot(),
+            "guardrail_batch": BATCH_STATS.snapshot(),
+            "response_cache": RESPONSE_CACHE.snapshot(),
+            "usage": USAGE.snapshot(
+                business["orders_completed"], business["total_revenue"]
+            ),
+            "business": business,
+        }
+        return result
+    finally:
+        agent.set_llm_factory(None)
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Porównuje wynik z poprzednim i zwraca listę regresji"""
+    regressions = []
+
+    current = result["agent"]["turns_per_sec"]
+    previous = baseline["agent"]["turns_per_sec"]
+    if current < previous * (1 - tolerance):
+        regressions.append(f"turns_per_sec: {previous} -> {current}")
+
+    for node, stats in result["nodes"].items():
+        previous = baseline["nodes"].get(node, {}).get("p95_ms")
+        if previous and stats["p95_ms"] > previous * (1 + tolerance):
+            regressions.append(f"{node} p95_ms: {previous} -> {stats['p95_ms']}")
+
+    current = result["memory"]["alloc_bytes_per_turn"]
+    previous = baseline["memory"]["alloc_bytes_per_turn"]
+    if current > previous * (1 + tolerance):
+        regressions.append(f"alloc_bytes_per_turn: {previous} -> {current}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark grafu agenta")
+    parser.add_argument("--repeat", type=int, default=20, help="powtórzenia korpusu")
+    parser.add_argument("--latency", type=float, default=0.0, help="opóźnienie [s]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="rozrzut [s]")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-fast-path", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--no-prefilter", action="store_true")
+    parser.add_argument("--speculative", action="store_true")
+    parser.add_argument("--output", help="plik wynikowy JSON (domyślnie stdout)")
+    parser.add_argument("--baseline", help="poprzedni wynik JSON do porównania")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="dopuszczalne pogorszenie"
+    )
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    report = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(report + "\n")
+    else:
+        print(report)
+
+    print(
+        f"☕ {result['agent']['turns']} tur, "
+        f"{result['agent']['turns_per_sec']} tur/s, "
+        f"p95 {result['agent']['turn_latency']['p95_ms']} ms",
+        file=sys.stderr,
+    )
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            regressions = compare(result, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regresja: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ Brak regresji", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
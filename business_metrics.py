@@ -0,0 +1,241 @@
+import glob
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from config import CFG
+from pricing import to_grosze
+
+
+# Długość przedziałów zestawień [s]
+MINUTE = 60
+HOUR = 3600
+
+
+class _Shard:
+    """Liczniki jednego wątku - zapis bez blokady, sumowane przy odczycie.
+
+    Przychód jest liczony w groszach (liczby całkowite, bez błędów zaokrągleń).
+    """
+
+    __slots__ = ("orders", "revenue_grosze", "items", "minutes", "hours")
+
+    def __init__(self):
+        self.orders = 0
+        self.revenue_grosze = 0
+        self.items = 0
+        # początek przedziału -> [zamówienia, przychód w groszach, pozycje]
+        self.minutes = {}
+        self.hours = {}
+
+
+def _add_to_bucket(
+    buckets: Dict, start: int, revenue_grosze: int, items: int, keep: int, width: int
+):
+    """Dodaje zamówienie do przedziału i usuwa przedziały starsze niż keep"""
+    bucket = buckets.get(start)
+    if bucket is None:
+        bucket = buckets[start] = [0, 0, 0]
+        # Przycinanie tylko przy otwarciu nowego przedziału
+        cutoff = start - keep * width
+        for old in [key for key in buckets if key <= cutoff]:
+            del buckets[old]
+    bucket[0] += 1
+    bucket[1] += revenue_grosze
+    bucket[2] += items
+
+
+def _merge_buckets(target: Dict, source: Dict):
+    """Sumuje przedziały zestawień"""
+    for start, (orders, revenue_grosze, items) in source.items():
+        bucket = target.setdefault(int(start), [0, 0, 0])
+        bucket[0] += orders
+        bucket[1] += revenue_grosze
+        bucket[2] += items
+
+
+def _bucket_list(buckets: Dict) -> List[Dict]:
+    """Zwraca przedziały w kolejności czasu (przychód w złotych)"""
+    return [
+        {
+            "start": start,
+            "orders": orders,
+            "revenue": revenue_grosze / 100,
+            "items": items,
+        }
+        for start, (orders, revenue_grosze, items) in sorted(buckets.items())
+    ]
+
+
+def _totals(orders: int, revenue_grosze: int, items: int) -> Dict:
+    """Sumy zamówień z przychodem przeliczonym na złote"""
+    return {
+        "orders_completed": orders,
+        "total_revenue": revenue_grosze / 100,
+        "items_sold": items,
+        "avg_order_value": revenue_grosze / orders / 100 if orders else 0.0,
+    }
+
+
+class BusinessMetrics:
+    """Metryki biznesowe całego procesu (zamówienia, przychód, zestawienia w czasie).
+
+    Każdy wątek zapisuje do własnych liczników, więc checkout nie czeka
+    na blokadę. Odczyt sumuje liczniki wszystkich wątków.
+    """
+
+    def __init__(self, minute_buckets: int = None, hour_buckets: int = None):
+        if minute_buckets is None:
+            minute_buckets = CFG.business_minute_buckets
+        self.minute_buckets = minute_buckets
+        self.hour_buckets = (
+            hour_buckets if hour_buckets is not None else CFG.business_hour_buckets
+        )
+        self.started = time.time()
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshotter = None
+
+    def _shard(self) -> _Shard:
+        """Zwraca liczniki bieżącego wątku (tworzy je przy pierwszym użyciu)"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def record_order(self, total_grosze: int, items: int = 1, timestamp: float = None):
+        """Zapisuje zakończone zamówienie (kwota w groszach)"""
+        shard = self._shard()
+        now = timestamp if timestamp is not None else time.time()
+        shard.orders += 1
+        shard.revenue_grosze += total_grosze
+        shard.items += items
+        _add_to_bucket(
+            shard.minutes,
+            int(now // MINUTE) * MINUTE,
+            total_grosze,
+            items,
+            self.minute_buckets,
+            MINUTE,
+        )
+        _add_to_bucket(
+            shard.hours,
+            int(now // HOUR) * HOUR,
+            total_grosze,
+            items,
+            self.hour_buckets,
+            HOUR,
+        )
+
+    def totals(self) -> Dict:
+        """Zwraca sumy wszystkich wątków"""
+        with self._lock:
+            shards = list(self._shards)
+        return _totals(
+            sum(shard.orders for shard in shards),
+            sum(shard.revenue_grosze for shard in shards),
+            sum(shard.items for shard in shards),
+        )
+
+    def snapshot(self) -> Dict:
+        """Zwraca sumy i zestawienia minutowe oraz godzinowe"""
+        with self._lock:
+            shards = list(self._shards)
+        minutes, hours = {}, {}
+        for shard in shards:
+            # Kopia słownika jest atomowa - wątek właściciela może dalej zapisywać
+            _merge_buckets(minutes, shard.minutes.copy())
+            _merge_buckets(hours, shard.hours.copy())
+        return {
+            **self.totals(),
+            "pid": os.getpid(),
+            "started": self.started,
+            "timestamp": time.time(),
+            "per_minute": _bucket_list(minutes),
+            "per_hour": _bucket_list(hours),
+        }
+
+    def clear(self):
+        """Zeruje liczniki"""
+        with self._lock:
+            self._shards = []
+        self._local = threading.local()
+        self.started = time.time()
+
+    def write_snapshot(self, directory: str = None) -> str:
+        """Zapisuje migawkę metryk procesu do pliku JSON (atomowo)"""
+        directory = directory or CFG.business_metrics_dir
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as snapshot:
+            json.dump(self.snapshot(), snapshot, ensure_ascii=False)
+        os.replace(temporary, path)
+        return path
+
+    def _snapshot_loop(self, directory: str, interval: float):
+        """Pętla wątku zapisującego migawki"""
+        while not self._stop.wait(interval):
+            self.write_snapshot(directory)
+
+    def start_snapshots(self, directory: str = None, interval: float = None):
+        """Uruchamia okresowy zapis migawek w wątku w tle"""
+        directory = directory or CFG.business_metrics_dir
+        interval = interval if interval is not None else CFG.business_snapshot_interval
+        if self._snapshotter is None:
+            self._stop.clear()
+            self._snapshotter = threading.Thread(
+                target=self._snapshot_loop,
+                args=(directory, interval),
+                name="business-metrics",
+                daemon=True,
+            )
+            self._snapshotter.start()
+
+    def stop_snapshots(self):
+        """Zatrzymuje zapis migawek i zapisuje ostatnią"""
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+            self._snapshotter = None
+            self.write_snapshot()
+
+
+def merge_snapshots(directory: str = None) -> Dict:
+    """Łączy migawki wszystkich procesów zapisane w katalogu"""
+    directory = directory or CFG.business_metrics_dir
+    orders, revenue_grosze, items = 0, 0, 0
+    minutes, hours = {}, {}
+    processes = []
+    for path in sorted(glob.glob(os.path.join(directory, "metrics-*.json"))):
+        with open(path, encoding="utf-8") as snapshot:
+            data = json.load(snapshot)
+        processes.append(data["pid"])
+        orders += data["orders_completed"]
+        revenue_grosze += to_grosze(data["total_revenue"])
+        items += data["items_sold"]
+        for bucket in data["per_minute"]:
+            _merge_buckets(minutes, {bucket["start"]: _bucket_values(bucket)})
+        for bucket in data["per_hour"]:
+            _merge_buckets(hours, {bucket["start"]: _bucket_values(bucket)})
+    return {
+        "processes": processes,
+        **_totals(orders, revenue_grosze, items),
+        "per_minute": _bucket_list(minutes),
+        "per_hour": _bucket_list(hours),
+    }
+
+
+def _bucket_values(bucket: Dict) -> List:
+    """Wartości przedziału z migawki (przychód z powrotem w groszach)"""
+    return [bucket["orders"], to_grosze(bucket["revenue"]), bucket["items"]]
+
+
+# Metryki biznesowe całego procesu (wszystkie sesje)
+BUSINESS_METRICS = BusinessMetrics()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from agent import set_llm_factory
+from config import CFG
+from llm_pool import get_llm
+
+
+# Tryby pracy kasety
+RECORD = "record"  # zawsze wywołuje LLM'a i nagrywa odpowiedzi
+REPLAY = "replay"  # odtwarza nagrania, brakujące odpowiedzi nagrywa z LLM'a
+STRICT = "strict"  # odtwarza nagrania, brak nagrania jest błędem
+
+MODES = (RECORD, REPLAY, STRICT)
+
+
+class CassetteMissError(LookupError):
+    """Brak nagrania dla zapytania w trybie strict"""
+
+
+def request_key(model: str, messages: List, params: Dict) -> str:
+    """Zwraca skrót zapytania (model, wiadomości, parametry wywołania)"""
+    payload = {
+        "model": model,
+        "messages": [[message.type, message.content] for message in messages],
+        "params": params,
+    }
+    dumped = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(dumped.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Plik JSON z nagranymi odpowiedziami LLM'a.
+
+    recorded_with opisuje, skąd pochodzą nagrania (model, adres API i odcisk
+    serwera) - nagrania z mock_openai_server.py to odpowiedzi fałszywego modelu.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.interactions = {}
+        self.recorded_with = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as cassette:
+                data = json.load(cassette)
+            self.interactions = data["interactions"]
+            self.recorded_with = data["recorded_with"]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Zwraca nagranie dla skrótu zapytania"""
+        with self._lock:
+            interaction = self.interactions.get(key)
+            if interaction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return interaction
+
+    def put(self, key: str, request: Dict, message: AIMessage):
+        """Nagrywa odpowiedź i zapisuje kasetę na dysk"""
+        with self._lock:
+            self.interactions[key] = {
+                "request": request,
+                "content": message.content,
+                "usage_metadata": message.usage_metadata,
+            }
+            self.recorded_with = {
+                "model": request["model"],
+                "base_url": CFG.base_url,
+                "system_fingerprint": message.response_metadata.get(
+                    "system_fingerprint"
+                ),
+            }
+            self.recorded += 1
+            self._save()
+
+    def _save(self):
+        """Zapisuje kasetę atomowo (plik tymczasowy i podmiana)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as cassette:
+            json.dump(
+                {
+                    "version": 1,
+                    "recorded_with": self.recorded_with,
+                    "interactions": self.interactions,
+                },
+                cassette,
+                ensure_ascii=False,
+                indent=1,
+                sort_keys=True,
+            )
+        os.replace(temporary, self.path)
+
+    def snapshot(self) -> Dict:
+        """Zwraca liczniki odtworzeń i nagrań"""
+        with self._lock:
+            return {
+                "interactions": len(self.interactions),
+                "recorded_with": self.recorded_with,
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+            }
+
+
+class CassetteChatModel(BaseChatModel):
+    """Model nagrywający i odtwarzający odpowiedzi innego modelu.
+
+    Model docelowy jest tworzony dopiero gdy trzeba wywołać LLM'a,
+    więc odtwarzanie nie wymaga klucza API ani dostępu do sieci.
+    """
+
+    mode: str = REPLAY
+    model_name: str = ""
+
+    _cassette: Cassette = PrivateAttr()
+    _factory: Callable = PrivateAttr()
+
+    def __init__(self, cassette: Cassette, factory: Callable, **kwargs):
+        super().__init__(**kwargs)
+        if self.mode not in MODES:
+            raise ValueError(f"Nieznany tryb kasety: {self.mode}")
+        self._cassette = cassette
+        self._factory = factory
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _lookup(self, messages: List, stop, kwargs: Dict):
+        """Zwraca (skrót, opis zapytania, nagranie lub None)"""
+        params = {name: value for name, value in kwargs.items() if value is not None}
+        if stop:
+            params["stop"] = stop
+        key = request_key(self.model_name, messages, params)
+        request = {
+            "model": self.model_name,
+            "messages": [[message.type, message.content] for message in messages],
+            "params": params,
+        }
+        if self.mode == RECORD:
+            return key, request, None
+
+        interaction = self._cassette.get(key)
+        if interaction is None and self.mode == STRICT:
+            prompt = messages[-1].content if messages else ""
+            raise CassetteMissError(f"Brak nagrania dla zapytania: {prompt[:200]!r}")
+        return key, request, interaction
+
+    @staticmethod
+    def _result(message: AIMessage) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    @staticmethod
+    def _replayed(interaction: Dict) -> AIMessage:
+        return AIMessage(
+            content=interaction["content"],
+            usage_metadata=interaction.get("usage_metadata"),
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        key, request, interaction = self._lookup(messages, stop, kwargs)
+        if interaction is not None:
+            return self._result(self._replayed(interaction))
+
+        message = self._factory().invoke(messages, stop=stop, **kwargs)
+        self._cassette.put(key, request, message)
+        return self._result(message)
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        key, request, interaction = self._lookup(messages, stop, kwargs)
+        if interaction is not None:
+            return self._result(self._replayed(interaction))
+
+        message = await self._factory().ainvoke(messages, stop=stop, **kwargs)
+        self._cassette.put(key, request, message)
+        return self._result(message)
+
+
+_cassettes: Dict[str, Cassette] = {}
+
+
+def use_cassette(mode: str = None, path: str = None) -> Optional[Cassette]:
+    """Podmienia fabrykę LLM'a agenta na kasetę (pusty tryb - bez kasety)"""
+    mode = mode if mode is not None else CFG.llm_cassette_mode
+    path = path or CFG.llm_cassette_path
+    if not mode:
+        set_llm_factory(None)
+        return None
+
+    cassette = _cassettes.get(path)
+    if cassette is None:
+        cassette = _cassettes[path] = Cassette(path)
+    model = CassetteChatModel(cassette, get_llm, mode=mode, model_name=CFG.model)
+    set_llm_factory(lambda: model)
+    return cassette
@@ -0,0 +1,307 @@
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from config import CFG
+
+
+# Pola stanu zapisywane bez zmian (proste typy JSON)
+_PLAIN_FIELDS = (
+    "is_valid",
+    "intent",
+    "current_order",
+    "order_complete",
+    "orders_completed",
+    "total_revenue",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    session_id TEXT PRIMARY KEY,
+    updated REAL NOT NULL,
+    state BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoint_archive (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    chunk BLOB NOT NULL,
+    PRIMARY KEY (session_id, seq)
+)
+"""
+
+
+def encode_state(state: Dict) -> bytes:
+    """Serializuje stan sesji do zwartej postaci (JSON skompresowany zlib).
+
+    Zapisywane jest tylko okno ostatnich tur - archiwum trafia do checkpointu
+    przyrostowo (archive_chunks), więc koszt nie rośnie z długością rozmowy.
+    """
+    data = {field: state[field] for field in _PLAIN_FIELDS}
+    data["cart"] = {
+        "items": state["cart"]["items"],
+        "total": state["cart"]["total"],
+        "total_grosze": state["cart"]["total_grosze"],
+    }
+    data["window"] = state["messages"].export_window()
+    data["usage"] = state["usage"].export()
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(payload.encode("utf-8"))
+
+
+def archive_chunks(state: Dict) -> List[bytes]:
+    """Zwraca fragmenty archiwum wiadomości dodane od poprzedniego checkpointu"""
+    return state["messages"].new_archive_chunks()
+
+
+def restore_state(state: Dict, blob: bytes, chunks: List[bytes] = ()) -> Dict:
+    """Uzupełnia świeżo zainicjalizowany stan danymi z checkpointu"""
+    data = json.loads(zlib.decompress(blob))
+    for field in _PLAIN_FIELDS:
+        state[field] = data[field]
+    state["cart"]["items"] = data["cart"]["items"]
+    state["cart"]["total"] = data["cart"]["total"]
+    state["cart"]["total_grosze"] = data["cart"]["total_grosze"]
+    state["messages"].restore_window(data["window"], chunks)
+    state["usage"].restore(data["usage"])
+    state["conversation_log"].append("restore_checkpoint", result="wznowiono sesję")
+    return state
+
+
+class SQLiteCheckpointer:
+    """Checkpointy sesji w SQLite (WAL) zapisywane partiami przez wątek w tle.
+
+    save() tylko serializuje stan i odkłada go do bufora - tura rozmowy
+    nie czeka na zapis na dysk. Kolejne zapisy tej samej sesji przed
+    zrzutem bufora są łączone (zapisywany jest tylko najnowszy stan).
+    """
+
+    def __init__(self, path: str, flush_interval: float = None):
+        self.path = path
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else CFG.checkpoint_flush_interval
+        )
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._connection.commit()
+        self._db_lock = threading.Lock()
+
+        # session_id -> (czas, stan) oczekujące na zapis
+        self._pending = {}
+        # session_id -> {numer: fragment archiwum} oczekujące na zapis
+        self._pending_chunks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        self.saves = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.chunks_written = 0
+        self.bytes_written = 0
+        self.encode_seconds = 0.0
+        self.write_seconds = 0.0
+        self.failures = 0
+        self.last_error = None
+
+        self._writer = threading.Thread(
+            target=self._write_loop, name="checkpoint-writer", daemon=True
+        )
+        self._writer.start()
+
+    def save(self, session_id: str, state: Dict):
+        """Odkłada stan sesji do zapisu w tle"""
+        start = time.perf_counter()
+        blob = encode_state(state)
+        first = state["messages"].checkpointed_chunks
+        chunks = archive_chunks(state)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if session_id in self._pending:
+                self.coalesced += 1
+            self._pending[session_id] = (time.time(), blob)
+            if chunks:
+                pending = self._pending_chunks.setdefault(session_id, {})
+                pending.update(enumerate(chunks, first))
+            self.saves += 1
+            self.encode_seconds += elapsed
+        self._wake.set()
+
+    def load(self, session_id: str) -> Optional[bytes]:
+        """Zwraca zapisany stan sesji (również jeszcze niezapisany na dysk)"""
+        with self._lock:
+            pending = self._pending.get(session_id)
+        if pending is not None:
+            return pending[1]
+        with self._db_lock:
+            row = self._connection.execute(
+                "SELECT state FROM checkpoints WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load_archive(self, session_id: str) -> List[bytes]:
+        """Zwraca zapisane fragmenty archiwum wiadomości sesji (po kolei)"""
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT seq, chunk FROM checkpoint_archive WHERE session_id = ?",
+                (session_id,),
+            ).fetchall()
+        chunks = dict(rows)
+        with self._lock:
+            chunks.update(self._pending_chunks.get(session_id, {}))
+        # Tylko ciągły początek - starsze fragmenty sprzed resetu są nadpisywane
+        ordered = []
+        while len(ordered) in chunks:
+            ordered.append(chunks[len(ordered)])
+        return ordered
+
+    def delete(self, session_id: str):
+        """Usuwa checkpoint sesji"""
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._pending_chunks.pop(session_id, None)
+        with self._db_lock:
+            self._connection.execute(
+                "DELETE FROM checkpoints WHERE session_id = ?", (session_id,)
+            )
+            self._connection.execute(
+                "DELETE FROM checkpoint_archive WHERE session_id = ?", (session_id,)
+            )
+            self._connection.commit()
+
+    def flush(self):
+        """Zapisuje bufor na dysk w jednej transakcji"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            chunk_batch, self._pending_chunks = self._pending_chunks, {}
+        if not batch and not chunk_batch:
+            return
+
+        start = time.perf_counter()
+        rows = [
+            (session_id, updated, blob)
+            for session_id, (updated, blob) in batch.items()
+        ]
+        chunk_rows = [
+            (session_id, seq, chunk)
+            for session_id, chunks in chunk_batch.items()
+            for seq, chunk in chunks.items()
+        ]
+        try:
+            with self._db_lock:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO checkpoint_archive "
+                    "(session_id, seq, chunk) VALUES (?, ?, ?)",
+                    chunk_rows,
+                )
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO checkpoints (session_id, updated, state) "
+                    "VALUES (?, ?, ?)",
+                    rows,
+                )
+                self._connection.commit()
+        except sqlite3.Error:
+            self._requeue(batch, chunk_batch)
+            raise
+
+        with self._lock:
+            self.last_error = None
+            self.batches += 1
+            self.rows_written += len(rows)
+            self.chunks_written += len(chunk_rows)
+            self.bytes_written += sum(len(row[2]) for row in rows)
+            self.write_seconds += time.perf_counter() - start
+
+    def _requeue(self, batch: Dict, chunk_batch: Dict):
+        """Przywraca niezapisaną partię do bufora (nowsze stany wygrywają)"""
+        with self._db_lock:
+            self._connection.rollback()
+        with self._lock:
+            self.failures += 1
+            self._pending = {**batch, **self._pending}
+            for session_id, chunks in chunk_batch.items():
+                newer = self._pending_chunks.get(session_id, {})
+                self._pending_chunks[session_id] = {**chunks, **newer}
+
+    def _write_loop(self):
+        """Pętla wątku zapisującego - zrzuca bufor co flush_interval"""
+        while not self._stop.is_set():
+            self._wake.wait()
+            # Krótkie oczekiwanie zbiera zapisy z wielu tur w jedną transakcję
+            self._stop.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as error:
+                # Partia wraca do bufora - ponowna próba po retry_interval
+                if self.last_error is None:
+                    print(
+                        f"⚠️ Zapis checkpointów nieudany: {error!r}", file=sys.stderr
+                    )
+                self.last_error = repr(error)
+                self._stop.wait(CFG.checkpoint_retry_interval)
+                self._wake.set()
+
+    def close(self):
+        """Zatrzymuje wątek zapisujący, zapisuje bufor i zamyka bazę"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        with self._db_lock:
+            self._connection.close()
+
+    def snapshot(self) -> Dict:
+        """Zwraca statystyki zapisu checkpointów"""
+        with self._lock:
+            return {
+                "saves": self.saves,
+                "coalesced": self.coalesced,
+                "pending": len(self._pending),
+                "batches": self.batches,
+                "rows_written": self.rows_written,
+                "archive_chunks_written": self.chunks_written,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "avg_state_bytes": (
+                    self.bytes_written / self.rows_written if self.rows_written else 0
+                ),
+                "avg_encode_us": (
+                    self.encode_seconds / self.saves * 1e6 if self.saves else 0.0
+                ),
+                "avg_batch_ms": (
+                    self.write_seconds / self.batches * 1e3 if self.batches else 0.0
+                ),
+            }
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> Optional[SQLiteCheckpointer]:
+    """Zwraca współdzielony checkpointer (None gdy checkpointy są wyłączone)"""
+    global _checkpointer
+    if not CFG.checkpoint_db:
+        return None
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            _checkpointer = SQLiteCheckpointer(CFG.checkpoint_db)
+            atexit.register(_checkpointer.close)
+    return _checkpointer
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 from dotenv import load_dotenv
 
@@ -5,6 +7,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 
 
 class CFG:
@@ -13,6 +16,111 @@ class CFG:
     # Konfiguracja OpenAI
     api_key = OPENAI_API_KEY
     model = "gpt-4o-mini"
+    base_url = OPENAI_BASE_URL
+
+    # Współdzielona pula połączeń HTTP (keep-alive) dla klientów LLM
+    llm_timeout = 30.0
+    llm_max_connections = 20
+    llm_max_keepalive_connections = 10
+    llm_keepalive_expiry = 60.0
+
+    # Rozgrzewanie połączeń przed uruchomieniem interfejsu
+    llm_warm_up = True
+    llm_warm_up_connections = 2
+
+    # Cennik tokenów [USD za 1M tokenów] i kurs do przeliczenia kosztu na złote
+    token_prices = {
+        "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    }
+    usd_pln_rate = 4.0
+
+    # Kaseta z odpowiedziami LLM'a: record, replay, strict (pusty - wyłączona)
+    llm_cassette_mode = os.getenv("LLM_CASSETTE", "")
+    llm_cassette_path = os.getenv("LLM_CASSETTE_PATH", "cassettes/tests.json")
+
+    # Spekulatywne, równoległe wykonanie guardraila i analizy intencji
+    speculative_execution = False
+    speculative_max_workers = 8
+
+    # Lokalny filtr guardraila pomijający wywołanie LLM'a dla oczywistych wiadomości
+    guardrail_prefilter = True
+    guardrail_prefilter_max_length = 120
+
+    # Zbiorcza walidacja guardraila - walidacje z wielu sesji zebrane w oknie
+    # [s] (lub do max_size) trafiają do LLM'a jednym numerowanym zapytaniem
+    guardrail_batching = os.getenv("GUARDRAIL_BATCHING", "0") == "1"
+    guardrail_batch_window = 0.005
+    guardrail_batch_max_size = 16
+    guardrail_batch_max_workers = 8
+
+    # Szybka ścieżka parsowania prostych zamówień bez wywołania LLM'a
+    fast_path_parser = True
+
+    # Indeks nazw z menu - sprowadza odmienione nazwy z odpowiedzi LLM'a do kluczy
+    # cennika (maksymalna liczba literówek i rozmiar pamięci wyników)
+    menu_index_max_distance = 2
+    menu_index_cache_size = 4096
+
+    # Menu i cennik w pliku JSON przeładowywanym bez restartu (zmiana mtime).
+    # Bez pliku obowiązuje menu zapisane poniżej w CFG.
+    menu_path = os.getenv(
+        "MENU_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "menu.json"),
+    )
+    menu_check_interval = 2.0
+
+    # Dekodowanie odpowiedzi LLM'a - naprawa typowych błędów JSON przed fallbackiem
+    tolerant_decoding = True
+    # Wymuszenie odpowiedzi zgodnych ze schematem (structured output API OpenAI)
+    structured_output = False
+
+    # Cache odpowiedzi LLM'a dla powtarzalnych wiadomości
+    response_cache = True
+    response_cache_max_entries = 1024
+    response_cache_max_bytes = 4 * 1024 * 1024
+    response_cache_ttl = 600.0
+
+    # Sesje klientów w interfejsie Gradio
+    max_sessions = 500
+    session_idle_timeout = 1800.0
+    session_reap_interval = 60.0
+
+    # Limit równoległych wywołań handlera czatu (None - bez limitu)
+    gui_concurrency_limit = None
+    # Strumieniowanie odpowiedzi asystenta do interfejsu w trakcie generowania
+    stream_responses = True
+
+    # Serwer metryk /metrics (None - pomiary wyłączone)
+    metrics_port = int(os.getenv("METRICS_PORT", "0")) or None
+    metrics_host = "127.0.0.1"
+
+    # Log konwersacji - bufor cykliczny z opcjonalnym zapisem przepełnienia (JSONL)
+    conversation_log_capacity = 200
+    conversation_log_spill_dir = None
+    conversation_log_spill_batch = 32
+
+    # Historia wiadomości - okno ostatnich tur w pamięci, starsze tury w archiwum
+    message_window_turns = 20
+    message_archive_dir = None
+
+    # Checkpointy sesji w SQLite (None - wyłączone), odstęp zapisu partii
+    # i ponowienia zapisu po błędzie [s]
+    checkpoint_db = os.getenv("CHECKPOINT_DB") or None
+    checkpoint_flush_interval = 0.05
+    checkpoint_retry_interval = 1.0
+
+    # Metryki biznesowe procesu - zestawienia minutowe i godzinowe oraz migawki
+    business_minute_buckets = 180
+    business_hour_buckets = 168
+    business_metrics_dir = os.getenv("BUSINESS_METRICS_DIR") or None
+    business_snapshot_interval = 60.0
+
+    # Księga zamówień (None - wyłączona), okno grupowania zapisów [s]
+    # i oczekiwanie checkoutu na zapis zamówienia na dysk (najwyżej timeout [s])
+    ledger_path = os.getenv("LEDGER_PATH") or None
+    ledger_commit_delay = 0.002
+    ledger_wait_for_sync = True
+    ledger_sync_timeout = 5.0
 
     # Cennik napojów
     DRINK_PRICES = {
@@ -47,6 +155,13 @@ class CFG:
         "napoje zimne": ["frappuccino", "smoothie", "lemoniada"],
     }
 
+    # Pełne nazwy napojów w podsumowaniu zamówienia
+    DRINK_NAMES = {
+        "czarna": "czarna herbata",
+        "zielona": "zielona herbata",
+        "owocowa": "herbata owocowa",
+    }
+
     # Rozmiary
     SIZES = ["S", "M", "L"]
     SIZE_NAMES = {"S": "mały", "M": "średni", "L": "duży"}
@@ -60,20 +175,43 @@ class CFG:
     }
 
 
-def get_menu():
-    """Pokaż dostępne napoje"""
+# Pola CFG opisujące menu (klucze pliku menu to ich nazwy małymi literami)
+MENU_FIELDS = (
+    "DRINK_PRICES",
+    "ADDON_PRICES",
+    "AVAILABLE_DRINKS",
+    "DRINK_NAMES",
+    "SIZES",
+    "SIZE_NAMES",
+    "SUBSTITUTIONS",
+)
+
+
+def menu_version(menu=None) -> str:
+    """Zwraca skrót wersji menu (domyślnie menu z CFG)"""
+    menu = menu or CFG
+    data = {field.lower(): getattr(menu, field) for field in MENU_FIELDS}
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:12]
+
+
+def get_menu(source=None):
+    """Pokaż dostępne napoje (domyślnie z menu w CFG)"""
+    source = source or CFG
     menu = "**Dostępne napoje:**\n"
 
-    for category, drinks in CFG.AVAILABLE_DRINKS.items():
+    for category, drinks in source.AVAILABLE_DRINKS.items():
         if category == "kawa":
             menu += f"- ☕ Kawa: {', '.join(drinks)}\n"
         elif category == "herbata":
             menu += f"- 🍵 Herbata: {', '.join(drinks)}\n"
         elif category == "napoje zimne":
             menu += f"- 🥤 Napoje zimne: {', '.join(drinks)}\n"
+        else:
+            menu += f"- {category.capitalize()}: {', '.join(drinks)}\n"
 
-    menu += f"\n**Rozmiary:** {', '.join([f'{size} ({CFG.SIZE_NAMES[size]})' for size in CFG.SIZES])}\n"
-    menu += f"\n**Dodatki:** {', '.join(CFG.ADDON_PRICES.keys())}\n"
-    menu += f"\n**Zamienniki:** {', '.join(CFG.SUBSTITUTIONS.keys())}"
+    menu += f"\n**Rozmiary:** {', '.join([f'{size} ({source.SIZE_NAMES[size]})' for size in source.SIZES])}\n"
+    menu += f"\n**Dodatki:** {', '.join(source.ADDON_PRICES.keys())}\n"
+    menu += f"\n**Zamienniki:** {', '.join(source.SUBSTITUTIONS.keys())}"
 
     return menu
@@ -0,0 +1,129 @@
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from config import CFG
+
+
+# Epoka zmienia się przy utworzeniu i wyczyszczeniu logu
+_epochs = itertools.count(1)
+
+
+class ConversationLog:
+    """Log konwersacji w buforze cyklicznym.
+
+    Zdarzenia są przechowywane w postaci strukturalnej, a tekst powstaje
+    dopiero przy odczycie (format_entries). Zdarzenia wypchnięte z bufora
+    mogą trafiać do pliku JSONL.
+    """
+
+    def __init__(self, capacity: int = None, spill_path: str = None):
+        self.capacity = capacity or CFG.conversation_log_capacity
+        self.spill_path = spill_path
+        self._events = deque(maxlen=self.capacity)
+        self._spill_buffer = []
+        self._seq = 0
+        self.dropped = 0
+        self.epoch = next(_epochs)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def append(self, step: str, data=None, result=None, **extra):
+        """Dodaje zdarzenie: nazwa_kroku(dane_wejściowe): dane_wyjściowe"""
+        self._push((0, time.time(), step, data, result, extra))
+
+    def _push(self, event: tuple):
+        """Dodaje zdarzenie z kolejnym numerem i obsługuje przepełnienie bufora"""
+        if len(self._events) == self.capacity:
+            self._overflow(self._events[0])
+        self._seq += 1
+        self._events.append((self._seq,) + event[1:])
+
+    def _overflow(self, event: tuple):
+        """Obsługuje zdarzenie usuwane z bufora"""
+        self.dropped += 1
+        if self.spill_path:
+            self._spill_buffer.append(event)
+            if len(self._spill_buffer) >= CFG.conversation_log_spill_batch:
+                self.flush()
+
+    def flush(self):
+        """Zapisuje zdarzenia wypchnięte z bufora do pliku JSONL"""
+        if not self._spill_buffer:
+            return
+        with open(self.spill_path, "a", encoding="utf-8") as sink:
+            for event in self._spill_buffer:
+                record = json.dumps(_event_dict(event), ensure_ascii=False, default=str)
+                sink.write(record + "\n")
+        self._spill_buffer = []
+
+    def mark(self) -> int:
+        """Zwraca numer ostatniego zdarzenia"""
+        return self._seq
+
+    def since(self, mark: int) -> List[tuple]:
+        """Zwraca zdarzenia dodane po danym numerze (jeśli są jeszcze w buforze)"""
+        return [event for event in self._events if event[0] > mark]
+
+    def extend(self, events: List[tuple]):
+        """Dodaje zdarzenia z innego logu (np. ze spekulatywnej analizy)"""
+        for event in events:
+            self._push(event)
+
+    def fork(self) -> "ConversationLog":
+        """Tworzy pusty log kontynuujący numerację zdarzeń"""
+        forked = ConversationLog(self.capacity)
+        forked._seq = self._seq
+        forked.epoch = self.epoch
+        return forked
+
+    def clear(self):
+        """Czyści log"""
+        self._events.clear()
+        self._spill_buffer = []
+        self.epoch = next(_epochs)
+
+    def format_entries(self, since: int = 0) -> List[str]:
+        """Formatuje zdarzenia do postaci tekstowej"""
+        return [format_event(event) for event in self._events if event[0] > since]
+
+
+def _event_dict(event: tuple) -> Dict:
+    """Zamienia zdarzenie na słownik (zapis JSONL)"""
+    seq, timestamp, step, data, result, extra = event
+    return {
+        "seq": seq,
+        "timestamp": timestamp,
+        "step": step,
+        "data": data,
+        "result": result,
+        **extra,
+    }
+
+
+def format_event(event: tuple) -> str:
+    """Formatuje zdarzenie: nazwa_kroku(dane_wejściowe): dane_wyjściowe"""
+    _, _, step, data, result, extra = event
+    text = step
+    if data is not None:
+        text += f"({data})"
+    if result is not None:
+        text += f": {result}"
+    for name, value in extra.items():
+        text += f"\n{name}: {value}"
+    return text
+
+
+def create_conversation_log(session_id: Optional[str] = None) -> ConversationLog:
+    """Tworzy log konwersacji z opcjonalnym zapisem przepełnienia na dysk"""
+    spill_path = None
+    if CFG.conversation_log_spill_dir:
+        os.makedirs(CFG.conversation_log_spill_dir, exist_ok=True)
+        spill_path = os.path.join(
+            CFG.conversation_log_spill_dir, f"{session_id or 'default'}.jsonl"
+        )
+    return ConversationLog(CFG.conversation_log_capacity, spill_path)
@@ -9,7 +9,7 @@ import os
 # Dodaj katalog główny do ścieżki Pythona
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import get_menu, CFG
+from menu import current_menu
 
 
 def demo_config():
@@ -17,21 +17,23 @@ def demo_config():
     print("☕ Kawiarnia AI First - Demo")
     print("=" * 50)
 
+    menu = current_menu().data
+
     print("\n📋 Menu kawiarni:")
-    print(get_menu())
+    print(current_menu().markdown)
 
     print("\n💰 Cennik napojów:")
-    for drink, sizes in CFG.DRINK_PRICES.items():
+    for drink, sizes in menu.DRINK_PRICES.items():
         print(
             f"  {drink.title()}: {', '.join([f'{size} ({price} zł)' for size, price in sizes.items()])}"
         )
 
     print("\n🔧 Dodatki i ceny:")
-    for addon, price in CFG.ADDON_PRICES.items():
+    for addon, price in menu.ADDON_PRICES.items():
         print(f"  {addon}: {price} zł")
 
     print("\n🔄 Dostępne zamienniki:")
-    for substitution, original in CFG.SUBSTITUTIONS.items():
+    for substitution, original in menu.SUBSTITUTIONS.items():
         print(f"  {substitution} → {original}")
 
 
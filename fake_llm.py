@@ -0,0 +1,176 @@
+import ast
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from fast_path import fold
+from guardrail import DENY, classify
+from menu import current_menu
+from prompts import BATCH_VALIDATION_SYSTEM_PROMPT, VALIDATION_SYSTEM_PROMPT
+
+
+# Słowa kluczowe rozpoznawane przez fałszywy model (po usunięciu diakrytyków)
+_ADD_TO_CART_CUES = ("koszyk",)
+_CHECKOUT_CUES = ("podsumuj", "zaplac")
+_QUESTION_CUES = ("menu", "jakie", "jaki", "co ", "?")
+
+# Przybliżenie oceny guardraila: zamaskowane wulgaryzmy, zmiana cen i języka
+_RULE_BREAKING = re.compile(
+    r"\w[*#@$%]+\w"
+    r"|\b(?:zmien|obniz|podnies|ustaw|zmniejsz|zwieksz|obetnij)\w*\s+(?:\w+\s+)?cen"
+    r"|\bniech\s+(?:\w+\s+){0,3}kosztuj"
+    r"|\bza\s+(?:darmo|friko|free)\b"
+    r"|\b(?:policz|sprzedaj|daj)\w*\s+(?:\w+\s+){0,3}za\s+\d+\s*(?:zl|gr)"
+    r"|\b(?:mow|odpowiadaj|odpowiedz|powiedz|pisz|napisz|rozmawiaj|przejdz|przelacz)"
+    r"\w*\s+(?:\w+\s+){0,3}po\s+(?!polsku)\w+sku\b"
+    r"|\bzmien\w*\s+(?:\w+\s+){0,2}jezyk"
+    r"|\b(?:speak|answer|respond|reply|talk|switch|write|parle[sz]?|sprechen)\b"
+)
+
+
+def violates_rules(message: str) -> bool:
+    """Przybliżona ocena zasad guardraila (wulgaryzmy, ceny, język)"""
+    return classify(message) == DENY or bool(_RULE_BREAKING.search(fold(message)))
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministyczny model do benchmarków i testów offline.
+
+    Odpowiada na prompty guardraila i analizy intencji bez dostępu do sieci.
+    Odpowiedzi ze script są zwracane po kolei, a po ich wyczerpaniu model
+    korzysta z reguł (parser szybkiej ścieżki, słowa kluczowe).
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+    chunk_size: int = 8
+    script: Optional[List[str]] = None
+
+    _random: random.Random = PrivateAttr()
+    _position: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context):
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-coffee-shop"
+
+    def _delay(self) -> float:
+        """Zwraca opóźnienie odpowiedzi (stałe z deterministycznym rozrzutem)"""
+        if not self.jitter:
+            return self.latency
+        return max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def _reply(self, messages: List) -> AIMessage:
+        """Buduje odpowiedź dla podanych wiadomości"""
+        if self.script and self._position < len(self.script):
+            content = self.script[self._position]
+            self._position += 1
+        else:
+            content = json.dumps(_rule_based_reply(messages), ensure_ascii=False)
+
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        completion_tokens = len(content) // 4
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _chunks(self, message: AIMessage):
+        """Dzieli odpowiedź na fragmenty jak przy strumieniowaniu tokenów"""
+        content = message.content
+        for start in range(0, len(content), self.chunk_size):
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=content[start : start + self.chunk_size])
+            )
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(content="", usage_metadata=message.usage_metadata)
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._delay())
+        yield from self._chunks(self._reply(messages))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._delay())
+        for chunk in self._chunks(self._reply(messages)):
+            yield chunk
+
+
+def _parse_prompt(text: str) -> tuple:
+    """Wyciąga obecne zamówienie i wiadomość klienta z promptu"""
+    order, _, message = text.partition("Wiadomość klienta: ")
+    order = order.replace("Obecne zamówienie:", "").strip()
+    try:
+        current_order = ast.literal_eval(order) if order else {}
+    except (ValueError, SyntaxError):
+        current_order = {}
+    return current_order, message.strip()
+
+
+def _rule_based_reply(messages: List) -> Dict:
+    """Odpowiedź w formacie oczekiwanym przez węzeł, który wysłał prompt"""
+    if messages[0].content == BATCH_VALIDATION_SYSTEM_PROMPT:
+        _, _, numbered = messages[-1].content.partition("Wiadomości klientów: ")
+        verdicts = [
+            {"id": item["id"], "is_valid": not violates_rules(item["message"])}
+            for item in json.loads(numbered)
+        ]
+        return {"verdicts": verdicts}
+
+    current_order, user_message = _parse_prompt(messages[-1].content)
+
+    if messages[0].content == VALIDATION_SYSTEM_PROMPT:
+        return {"is_valid": not violates_rules(user_message)}
+
+    menu = current_menu()
+    analysis = menu.matcher.parse(user_message, current_order)
+    if analysis is not None:
+        return analysis
+
+    folded = fold(user_message)
+    reply = {
+        "intent": "ask_question",
+        "drink_type": None,
+        "size": None,
+        "customizations": [],
+        "substitutions": [],
+        "response": "Czy mogę w czymś jeszcze pomóc?",
+    }
+    if any(cue in folded for cue in _CHECKOUT_CUES):
+        reply["intent"] = "checkout"
+        reply["response"] = "Podsumowuję zamówienie."
+    elif any(cue in folded for cue in _ADD_TO_CART_CUES) and current_order.get(
+        "size"
+    ):
+        reply["intent"] = "add_to_cart"
+        reply["response"] = "Dodaję zamówienie do koszyka."
+    elif any(cue in folded for cue in _QUESTION_CUES):
+        reply["response"] = (
+            f"{menu.markdown}\nDodatki: {', '.join(menu.data.ADDON_PRICES)}"
+        )
+    return reply
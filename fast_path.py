@@ -0,0 +1,276 @@
+import re
+import threading
+import time
+import unicodedata
+from itertools import product
+from typing import Dict, List, Optional
+
+from config import CFG
+
+
+# Rodzaje fraz rozpoznawanych przez parser
+DRINK = "drink"
+SIZE = "size"
+ADDON = "addon"
+SUBSTITUTION = "substitution"
+CATEGORY = "category"
+FILLER = "filler"
+ADD_TO_CART = "add_to_cart"
+
+# Znacznik końca frazy w drzewie trie
+_END = ""
+
+_TOKEN = re.compile(r"\w+|\?")
+
+# Odmiana rzeczowników z menu, których nie da się wyprowadzić regułą
+_NOUN_FORMS = {
+    "mleko": ["mleko", "mlekiem", "mleka", "mleku"],
+    "śmietanka": ["śmietanka", "śmietanką", "śmietanki", "śmietankę"],
+    "cukier": ["cukier", "cukrem", "cukru"],
+    "syrop": ["syrop", "syropem", "syropu"],
+    "słodzik": ["słodzik", "słodzikiem", "słodzika"],
+    "lemoniada": ["lemoniada", "lemoniadę", "lemoniady"],
+    "kawa": ["kawa", "kawę", "kawy", "kawą", "kawka", "kawkę", "kawki"],
+    "herbata": ["herbata", "herbatę", "herbaty", "herbatą", "herbatka", "herbatkę"],
+}
+
+# Słowa bez znaczenia dla zamówienia
+_FILLERS = [
+    "poproszę", "proszę", "chcę", "chce", "chciałbym", "chciałabym",
+    "zamówić", "zamawiam", "wezmę", "biorę", "daj", "podaj", "dodaj",
+    "dodać", "dorzuć", "z", "ze", "i", "oraz", "na", "a", "jedno", "jedna",
+    "jedną", "jeden", "rozmiar", "rozmiarze", "napój", "to", "mi", "dla",
+    "mnie", "ok", "okej", "tak",
+    "bez dodatków", "bez zamienników",
+]
+
+# Frazy oznaczające chęć dodania do koszyka
+_ADD_TO_CART_PHRASES = ["do koszyka"]
+
+
+def fold(text: str) -> str:
+    """Usuwa znaki diakrytyczne i zamienia na małe litery"""
+    text = text.casefold().replace("ł", "l")
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def adjective_forms(word: str) -> List[str]:
+    """Zwraca formy przymiotnika (mały, średni, waniliowy, czarna, ...)"""
+    if word.endswith("i"):
+        return [word + ending for ending in ("", "a", "e", "ą", "ego", "ej", "m")]
+    if word[-1] in "yae":
+        stem = word[:-1]
+        return [stem + ending for ending in ("y", "a", "e", "ą", "ego", "ej", "ym")]
+    return [word]
+
+
+def _word_forms(word: str) -> List[str]:
+    """Zwraca znane formy pojedynczego słowa"""
+    if word in _NOUN_FORMS:
+        return _NOUN_FORMS[word]
+    if word.endswith(("owy", "owe", "owa", "na", "ny")):
+        return adjective_forms(word)
+    return [word]
+
+
+def phrase_forms(phrase: str) -> List[str]:
+    """Zwraca formy wielowyrazowej frazy (iloczyn form słów)"""
+    return [" ".join(words) for words in product(*map(_word_forms, phrase.split()))]
+
+
+class OrderMatcher:
+    """Dopasowuje frazy z menu przy pomocy drzewa trie zbudowanego z tokenów"""
+
+    def __init__(self, menu=None):
+        menu = menu or CFG
+        self.trie = {}
+        self.size_names = ", ".join(
+            f"{size} ({menu.SIZE_NAMES[size]})" for size in menu.SIZES
+        )
+
+        # Napoje, rozmiary, dodatki i zamienniki z konfiguracji
+        for drink in menu.DRINK_PRICES:
+            for form in phrase_forms(drink):
+                self._insert(form, DRINK, drink)
+        for size, name in menu.SIZE_NAMES.items():
+            self._insert(size, SIZE, size)
+            for form in adjective_forms(name):
+                self._insert(form, SIZE, size)
+        for addon in menu.ADDON_PRICES:
+            for form in phrase_forms(addon):
+                self._insert(form, ADDON, addon)
+        for substitution in menu.SUBSTITUTIONS:
+            for form in phrase_forms(substitution):
+                self._insert(form, SUBSTITUTION, substitution)
+
+        # Kategorie (kawa, herbata) doprecyzowują napój - nie są wypełniaczem
+        self.categories = {
+            category: frozenset(drinks)
+            for category, drinks in menu.AVAILABLE_DRINKS.items()
+        }
+        for category in menu.AVAILABLE_DRINKS:
+            for form in phrase_forms(category):
+                self._insert(form, CATEGORY, category)
+
+        # Słowa pomocnicze i intencje
+        for filler in _FILLERS:
+            self._insert(filler, FILLER, None)
+        for phrase in _ADD_TO_CART_PHRASES:
+            self._insert(phrase, ADD_TO_CART, None)
+
+    def _insert(self, phrase: str, kind: str, value: Optional[str]):
+        """Dodaje frazę do drzewa trie"""
+        node = self.trie
+        for token in fold(phrase).split():
+            node = node.setdefault(token, {})
+        # Pierwsze znaczenie frazy wygrywa (np. nazwa napoju przed wypełniaczem)
+        node.setdefault(_END, (kind, value))
+
+    def match(self, text: str) -> Optional[List]:
+        """Dzieli tekst na frazy z menu - zwraca None jeśli zostało nieznane słowo"""
+        tokens = _TOKEN.findall(fold(text))
+        matches = []
+        position = 0
+
+        while position < len(tokens):
+            # Najdłuższe dopasowanie zaczynające się w bieżącej pozycji
+            node = self.trie
+            found, end = None, position
+            for index in range(position, len(tokens)):
+                node = node.get(tokens[index])
+                if node is None:
+                    break
+                if _END in node:
+                    found, end = node[_END], index + 1
+            if found is None:
+                return None
+            matches.append(found)
+            position = end
+
+        return matches
+
+    def parse(self, text: str, current_order: Dict) -> Optional[Dict]:
+        """Zwraca analizę w formacie odpowiedzi LLM'a lub None dla niejednoznacznych wiadomości"""
+        matches = self.match(text)
+        if not matches:
+            return None
+
+        found = {
+            DRINK: [],
+            SIZE: [],
+            ADDON: [],
+            SUBSTITUTION: [],
+            CATEGORY: [],
+            ADD_TO_CART: [],
+        }
+        for kind, value in matches:
+            if kind != FILLER:
+                found[kind].append(value)
+
+        # Kategoria musi zgadzać się z napojem ("czarna kawa" to nie herbata),
+        # a sama kategoria bez napoju jest niejednoznaczna
+        for category in found[CATEGORY]:
+            if not found[DRINK] or found[DRINK][0] not in self.categories[category]:
+                return None
+
+        # Wiele napojów lub rozmiarów w jednej wiadomości to zadanie dla LLM'a
+        if len(set(found[DRINK])) > 1 or len(set(found[SIZE])) > 1:
+            return None
+        if not any(found.values()):
+            return None
+
+        drink = found[DRINK][0] if found[DRINK] else None
+        size = found[SIZE][0] if found[SIZE] else None
+        order_drink = drink or current_order.get("drink_type")
+        order_size = size or current_order.get("size")
+
+        # Dodatki bez napoju w zamówieniu wymagają doprecyzowania
+        if not order_drink:
+            return None
+
+        customizations = list(
+            dict.fromkeys(current_order.get("customizations", []) + found[ADDON])
+        )
+        substitutions = list(
+            dict.fromkeys(
+                current_order.get("substitutions", []) + found[SUBSTITUTION]
+            )
+        )
+
+        if found[ADD_TO_CART]:
+            # Do koszyka trafia tylko kompletne zamówienie
+            if not order_size:
+                return None
+            intent = "add_to_cart"
+            response = f"Dodaję {order_drink} {order_size} do koszyka."
+        elif not order_size:
+            intent = "order_drink"
+            response = (
+                f"Wybrano: {order_drink}. Jaki rozmiar? Mamy: {self.size_names}."
+            )
+        else:
+            intent = "order_drink" if drink else "modify_order"
+            details = ""
+            if customizations:
+                details += f", dodatki: {', '.join(customizations)}"
+            if substitutions:
+                details += f", zamienniki: {', '.join(substitutions)}"
+            response = (
+                f"Zanotowałem: {order_drink} {order_size}{details}. "
+                "Czy dodać napój do koszyka?"
+            )
+
+        return {
+            "intent": intent,
+            "drink_type": drink,
+            "size": size,
+            "customizations": found[ADDON],
+            "substitutions": found[SUBSTITUTION],
+            "response": response,
+        }
+
+
+class FastPathStats:
+    """Statystyki szybkiej ścieżki parsowania zamówień"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.total_seconds = 0.0
+
+    def record(self, hit: bool, seconds: float):
+        """Zapisuje wynik parsowania i jego czas"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.total_seconds += seconds
+
+    def snapshot(self) -> Dict:
+        """Zwraca bieżące statystyki"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "avg_latency_us": (
+                    self.total_seconds / total * 1e6 if total else 0.0
+                ),
+            }
+
+
+FAST_PATH_STATS = FastPathStats()
+
+
+def parse_order(
+    message: str, current_order: Dict, matcher: OrderMatcher
+) -> Optional[Dict]:
+    """Próbuje sparsować wiadomość matcherem wersji menu i zapisuje statystyki"""
+    start = time.perf_counter()
+    analysis = matcher.parse(message, current_order)
+    FAST_PATH_STATS.record(analysis is not None, time.perf_counter() - start)
+    return analysis
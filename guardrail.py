@@ -0,0 +1,142 @@
+import re
+import threading
+import time
+from typing import Dict
+
+from config import CFG
+from fast_path import adjective_forms, fold, phrase_forms
+
+
+# Werdykty lokalnego filtra
+ALLOW = "allow"
+DENY = "deny"
+UNCERTAIN = "uncertain"
+
+
+# Rdzenie wulgaryzmów (dopasowywane bez znaków diakrytycznych) - jedyna
+# kategoria odrzucana bez pytania LLM'a
+_PROFANITY = re.compile(
+    r"\b(?:w|wy|za|od|roz|s|po|prze|do|na|u|o)?"
+    r"(?:kurw|chuj|huj|pierd[oa]l|jeb|pizd|skurw|kutas|cip[aeyo]|dziwk|fiut|ciul|gown)\w*"
+    r"|\b(?:fuck|motherfuck|shit|bitch|cunt|asshole)\w*"
+)
+
+# Sygnały wymagające oceny przez LLM: ceny, język, próby obejścia instrukcji
+_UNCERTAIN_CUES = re.compile(
+    r"\b(?:cen|koszt|zl\b|zlot|plac|zaplac|znizk|rabat|promocj|tani|drozej|gratis"
+    r"|darmo|friko|ignoruj|zignoruj|instrukcj|prompt|system|zapomnij|udawaj|jezyk"
+    r"|angiel|niemieck|rosyjsk|francus|hiszpan|ukrain|wlosk|czesk|ignore)\w*"
+    r"|\bpo\s+\w+sku\b"
+    # Liczby ("latte po 5", "za dwa") mogą ustalać cenę
+    r"|\d|\b(?:po|za)\s+(?:jed|dw|trz|czter|piec|szesc|siedem|osiem|dziewiec"
+    r"|dziesiec|sto)"
+)
+
+# Słowa zamaskowane znakami (np. k*rwa, ku@wa)
+_MASKED = re.compile(r"\w[*#@$%]+\w")
+
+# Pisma inne niż łacińskie (cyrylica, greka, arabski, CJK itd.)
+_NON_LATIN = re.compile(r"[^\W\d_a-zA-ZÀ-ɏ]")
+
+_WORD = re.compile(r"\w+")
+
+# Polskie słowa typowe dla rozmowy w kawiarni (bez znaków diakrytycznych).
+# Wiadomość jest przepuszczana bez LLM'a tylko gdy składa się wyłącznie
+# z tych słów i słów z menu.
+_POLISH_WORDS = frozenset(
+    """poprosze prosze chce chcialbym chcialabym chcemy zamowic zamawiam zamowie
+    wezme biore wezmiemy dodaj dodac dodajmy dorzuc podaj daj usun anuluj zmien
+    podsumuj podsumowanie zamowienie zamowienia zamowieniu koszyk koszyka koszyku
+    finalizuj zakoncz to ten ta te tego tej tym tez jeszcze juz teraz potem
+    i a oraz albo lub ale bo czy do z ze w we na bez dla od po o u przy
+    co cos jakie jaki jaka jakich jakiej ktory ktora ktore ile mamy macie masz
+    mam jest sa bedzie moge mozna mozesz moze prosze mi mnie nam sie
+    tak nie ok okej dobrze super swietnie dziekuje dzieki witam hej czesc
+    dzien dobry dobra wieczor polecacie polecasz polec polecisz wybor wyboru
+    rozmiar rozmiary rozmiarze rozmiarow mala maly male malej srednia sredni
+    srednie duza duzy duze jedno jedna jeden jednej dwa dwie trzy raz
+    dodatek dodatki dodatkow dodatkami zamiennik zamienniki zamiennikow
+    menu karta karty napoj napoje napojow napoju kawa kawe kawy kawke
+    herbata herbate herbaty herbatke zimne zimny zimna zimnego goraca gorace
+    goracy cieply ciepla cieple takim razie zamiast inny inna inne wynos
+    miejscu tutaj wszystko wszystkie kofeiny""".split()
+)
+
+
+def menu_words(menu=None) -> frozenset:
+    """Zwraca słowa z menu we wszystkich znanych formach (napoje, dodatki, ...)"""
+    menu = menu or CFG
+    forms = [form for drink in menu.DRINK_PRICES for form in phrase_forms(drink)]
+    forms += [form for addon in menu.ADDON_PRICES for form in phrase_forms(addon)]
+    forms += [form for name in menu.SUBSTITUTIONS for form in phrase_forms(name)]
+    sizes = menu.SIZE_NAMES.values()
+    forms += [form for name in sizes for form in adjective_forms(name)]
+    forms += list(menu.AVAILABLE_DRINKS) + list(menu.DRINK_NAMES.values())
+    return frozenset(word for form in forms for word in _WORD.findall(fold(form)))
+
+
+class PrefilterStats:
+    """Statystyki lokalnego filtra guardraila"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.verdicts = {ALLOW: 0, DENY: 0, UNCERTAIN: 0}
+        self.total_seconds = 0.0
+
+    def record(self, verdict: str, seconds: float):
+        """Zapisuje werdykt i czas klasyfikacji"""
+        with self._lock:
+            self.verdicts[verdict] += 1
+            self.total_seconds += seconds
+
+    def snapshot(self) -> Dict:
+        """Zwraca bieżące statystyki"""
+        with self._lock:
+            total = sum(self.verdicts.values())
+            decided = self.verdicts[ALLOW] + self.verdicts[DENY]
+            return {
+                **self.verdicts,
+                "total": total,
+                "hit_rate": decided / total if total else 0.0,
+                "llm_calls_saved": decided,
+                "avg_latency_us": (
+                    self.total_seconds / total * 1e6 if total else 0.0
+                ),
+            }
+
+
+PREFILTER_STATS = PrefilterStats()
+
+
+def classify(message: str, known_words: frozenset = frozenset()) -> str:
+    """Klasyfikuje wiadomość bez użycia LLM'a: allow, deny lub uncertain.
+
+    Filtr jest ostrożny - odrzuca tylko jednoznaczne wulgaryzmy i przepuszcza
+    tylko wiadomości złożone wyłącznie ze znanych polskich słów i słów z menu
+    (known_words - Menu.guardrail_words wersji menu sesji). Wszystko inne
+    (ceny, język, nieznane słowa) ocenia LLM.
+    """
+    text = fold(message)
+
+    if _PROFANITY.search(text):
+        return DENY
+
+    # Długie wiadomości, inne pisma, zamaskowane słowa i podejrzane słowa ocenia LLM
+    if len(message) > CFG.guardrail_prefilter_max_length:
+        return UNCERTAIN
+    if _NON_LATIN.search(message) or _MASKED.search(text):
+        return UNCERTAIN
+    if _UNCERTAIN_CUES.search(text):
+        return UNCERTAIN
+
+    words = _WORD.findall(text)
+    known = all(word in _POLISH_WORDS or word in known_words for word in words)
+    return ALLOW if words and known else UNCERTAIN
+
+
+def prefilter(message: str, known_words: frozenset = frozenset()) -> str:
+    """Klasyfikuje wiadomość i zapisuje statystyki"""
+    start = time.perf_counter()
+    verdict = classify(message, known_words)
+    PREFILTER_STATS.record(verdict, time.perf_counter() - start)
+    return verdict
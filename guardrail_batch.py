@@ -0,0 +1,328 @@
+import asyncio
+import atexit
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+from config import CFG
+from llm_output import (
+    BATCH_VALIDATION_SCHEMA,
+    DECODE_STATS,
+    VALIDATION_SCHEMA,
+    DecodeError,
+    decode,
+    structured,
+)
+from prompts import PromptSet
+
+
+# Powody walidacji wysłanej osobnym zapytaniem
+SINGLE = "single"  # partia z jedną walidacją - bez narzutu promptu zbiorczego
+MISSING = "missing"  # brak lub sprzeczny werdykt w odpowiedzi zbiorczej
+DECODE = "decode"  # odpowiedzi zbiorczej nie da się zdekodować
+ERROR = "error"  # zapytanie zbiorcze zakończyło się błędem
+REASONS = (SINGLE, MISSING, DECODE, ERROR)
+
+
+class BatchStats:
+    """Liczniki zbiorczej walidacji: partie, zaoszczędzone zapytania, fallbacki"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.validations = 0
+        self.batches = 0
+        self.batched = 0
+        self.max_batch_size = 0
+        self.sizes = {}
+        self.prompt_tokens = 0
+        self.wait_seconds = 0.0
+        self.singles = dict.fromkeys(REASONS, 0)
+
+    def record_batch(self, size: int, prompt_tokens: int):
+        """Zapisuje zapytanie zbiorcze z size walidacjami"""
+        with self._lock:
+            self.batches += 1
+            self.batched += size
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.sizes[size] = self.sizes.get(size, 0) + 1
+            self.prompt_tokens += prompt_tokens
+
+    def record_single(self, reason: str):
+        """Zapisuje walidację wysłaną osobnym zapytaniem"""
+        with self._lock:
+            self.singles[reason] += 1
+
+    def record_validation(self, wait_seconds: float):
+        """Zapisuje zakończoną walidację i czas oczekiwania w kolejce"""
+        with self._lock:
+            self.validations += 1
+            self.wait_seconds += wait_seconds
+
+    def snapshot(self) -> Dict:
+        """Zwraca liczniki, średni rozmiar partii i zaoszczędzone zapytania"""
+        with self._lock:
+            requests = self.batches + sum(self.singles.values())
+            return {
+                "validations": self.validations,
+                "requests": requests,
+                "requests_saved": self.validations - requests,
+                "batches": self.batches,
+                "mean_batch_size": (
+                    self.batched / self.batches if self.batches else 0.0
+                ),
+                "max_batch_size": self.max_batch_size,
+                "batch_sizes": dict(sorted(self.sizes.items())),
+                "singles": dict(self.singles),
+                "batch_prompt_tokens": self.prompt_tokens,
+                "prompt_tokens_per_batched_validation": (
+                    self.prompt_tokens / self.batched if self.batched else 0.0
+                ),
+                "avg_wait_ms": (
+                    self.wait_seconds / self.validations * 1e3
+                    if self.validations
+                    else 0.0
+                ),
+            }
+
+
+BATCH_STATS = BatchStats()
+
+
+def _usage(response) -> Dict:
+    """Zwraca zużycie tokenów odpowiedzi jako (wejście, cache, wyjście)"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return {
+        "input_tokens": usage.get("input_tokens", 0) or 0,
+        "cached_tokens": details.get("cache_read", 0) or 0,
+        "output_tokens": usage.get("output_tokens", 0) or 0,
+    }
+
+
+def split_usage(response, parts: int) -> List[Dict]:
+    """Dzieli tokeny zapytania zbiorczego między walidacje (reszta dla pierwszych)"""
+    shares = [{} for _ in range(parts)]
+    for field, total in _usage(response).items():
+        share, rest = divmod(total, parts)
+        for index, usage in enumerate(shares):
+            usage[field] = share + (index < rest)
+    return shares
+
+
+def _message(content: str, *usages: Dict) -> AIMessage:
+    """Odpowiedź walidacji dla jednej sesji z przypisanym zużyciem tokenów"""
+    input_tokens = sum(usage["input_tokens"] for usage in usages)
+    output_tokens = sum(usage["output_tokens"] for usage in usages)
+    cached_tokens = sum(usage["cached_tokens"] for usage in usages)
+    return AIMessage(
+        content=content,
+        usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": cached_tokens},
+        },
+    )
+
+
+def parse_verdicts(content: str, size: int) -> Dict[int, bool]:
+    """Dekoduje odpowiedź zbiorczą do werdyktów {pozycja w partii: is_valid}.
+
+    Pomija nieznane id oraz id z sprzecznymi werdyktami - te walidacje
+    trafiają do LLM'a osobno. Rzuca DecodeError gdy odpowiedź jest nieczytelna.
+    """
+    analysis, repaired = decode(content, BATCH_VALIDATION_SCHEMA)
+    DECODE_STATS.record("validate_batch", "repaired" if repaired else "clean")
+
+    verdicts, conflicts = {}, set()
+    for verdict in analysis["verdicts"]:
+        try:
+            index = int(verdict["id"]) - 1
+        except ValueError:
+            continue
+        if not 0 <= index < size:
+            continue
+        if verdicts.get(index, verdict["is_valid"]) != verdict["is_valid"]:
+            conflicts.add(index)
+        verdicts[index] = verdict["is_valid"]
+    for index in conflicts:
+        del verdicts[index]
+    return verdicts
+
+
+class _Pending:
+    """Walidacja czekająca w kolejce na wysłanie"""
+
+    __slots__ = ("prompts", "message", "future", "queued")
+
+    def __init__(self, prompts: PromptSet, message: str):
+        self.prompts = prompts
+        self.message = message
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+
+class GuardrailBatcher:
+    """Zbiorcza walidacja guardraila dla wielu sesji naraz.
+
+    Walidacje zebrane w oknie window (lub do max_size) wątek w tle wysyła
+    jednym numerowanym zapytaniem, a werdykty trafiają z powrotem do
+    oczekujących tur. Walidacje bez poprawnego werdyktu idą osobno.
+    """
+
+    def __init__(
+        self,
+        llm_factory: Callable,
+        window: float = None,
+        max_size: int = None,
+        max_workers: int = None,
+    ):
+        self.llm_factory = llm_factory
+        self.window = window if window is not None else CFG.guardrail_batch_window
+        self.max_size = max_size or CFG.guardrail_batch_max_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or CFG.guardrail_batch_max_workers,
+            thread_name_prefix="guardrail-batch",
+        )
+
+        self._pending: List[_Pending] = []
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self._dispatcher = threading.Thread(
+            target=self._dispatch_loop, name="guardrail-batcher", daemon=True
+        )
+        self._dispatcher.start()
+
+    def submit(self, prompts: PromptSet, user_message: str) -> Future:
+        """Dodaje walidację do kolejki i zwraca przyszłą odpowiedź LLM'a"""
+        pending = _Pending(prompts, user_message)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Zbiorcza walidacja jest zamknięta")
+            self._pending.append(pending)
+            self._condition.notify()
+        return pending.future
+
+    def validate(self, prompts: PromptSet, user_message: str) -> AIMessage:
+        """Waliduje wiadomość w najbliższej partii (blokuje do werdyktu)"""
+        return self.submit(prompts, user_message).result()
+
+    async def avalidate(self, prompts: PromptSet, user_message: str) -> AIMessage:
+        """Asynchroniczna walidacja - oczekiwanie nie blokuje pętli zdarzeń"""
+        return await asyncio.wrap_future(self.submit(prompts, user_message))
+
+    def _dispatch_loop(self):
+        """Pętla wątku zbierającego walidacje w partie"""
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+
+                # Okno liczone od najstarszej walidacji - żadna nie czeka dłużej
+                deadline = self._pending[0].queued + self.window
+                while len(self._pending) < self.max_size and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[: self.max_size]
+                self._pending = self._pending[self.max_size :]
+
+            # Tury anulowane w czasie oczekiwania (np. zamknięta sesja) są pomijane
+            batch = [
+                item for item in batch if item.future.set_running_or_notify_cancel()
+            ]
+            if batch:
+                self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[_Pending]):
+        """Wysyła partię i rozdziela werdykty (wątek z puli)"""
+        if len(batch) == 1:
+            self._single(batch[0], SINGLE)
+            return
+
+        try:
+            llm = structured(self.llm_factory(), BATCH_VALIDATION_SCHEMA)
+            prompts = batch[0].prompts
+            response = llm.invoke(
+                prompts.batch_validation_messages([item.message for item in batch])
+            )
+        except Exception:
+            for item in batch:
+                self._fallback(item, ERROR)
+            return
+
+        BATCH_STATS.record_batch(len(batch), _usage(response)["input_tokens"])
+        shares = split_usage(response, len(batch))
+        try:
+            verdicts = parse_verdicts(response.content, len(batch))
+            reason = MISSING
+        except DecodeError:
+            DECODE_STATS.record("validate_batch", "fallback")
+            verdicts, reason = {}, DECODE
+
+        for index, item in enumerate(batch):
+            if index in verdicts:
+                content = json.dumps({"is_valid": verdicts[index]})
+                self._resolve(item, _message(content, shares[index]))
+            else:
+                # Koszt zapytania zbiorczego doliczany do osobnej walidacji
+                self._fallback(item, reason, shares[index])
+
+    def _fallback(self, item: _Pending, reason: str, share: Dict = None):
+        """Zleca osobną walidację - równolegle, a po zamknięciu puli w tym wątku"""
+        try:
+            self._executor.submit(self._single, item, reason, share)
+        except RuntimeError:
+            self._single(item, reason, share)
+
+    def _single(self, item: _Pending, reason: str, share: Dict = None):
+        """Waliduje jedną wiadomość osobnym zapytaniem (zwykły prompt guardraila)"""
+        BATCH_STATS.record_single(reason)
+        try:
+            llm = structured(self.llm_factory(), VALIDATION_SCHEMA)
+            response = llm.invoke(item.prompts.validation_messages(item.message))
+        except Exception as error:
+            BATCH_STATS.record_validation(time.perf_counter() - item.queued)
+            item.future.set_exception(error)
+            return
+        if share is not None:
+            response = _message(response.content, _usage(response), share)
+        self._resolve(item, response)
+
+    def _resolve(self, item: _Pending, response: AIMessage):
+        BATCH_STATS.record_validation(time.perf_counter() - item.queued)
+        item.future.set_result(response)
+
+    def close(self):
+        """Wysyła oczekujące walidacje i zatrzymuje wątki"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher(llm_factory: Callable) -> Optional[GuardrailBatcher]:
+    """Zwraca współdzieloną kolejkę walidacji (None gdy jest wyłączona)"""
+    global _batcher
+    if not CFG.guardrail_batching:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = GuardrailBatcher(llm_factory)
+            atexit.register(_batcher.close)
+    return _batcher
@@ -1,80 +1,211 @@
+import asyncio
+import json
+import time
+import weakref
+from collections import deque
+
 import gradio as gr
-from agent import Agent
-from config import get_menu
+from business_metrics import BUSINESS_METRICS
+from config import CFG
+from llm_pool import awarm_up, warm_up
+from menu import MENU_STORE, current_menu
+import metrics
+from metrics import GUI_SECONDS, RENDER_SECONDS
+from sessions import SessionRegistry
+
+
+EMPTY_CART = "🛒 Koszyk jest pusty"
+EMPTY_LOG = "📝 Brak logów"
+
+
+def format_cart(cart):
+    """Tworzy tekst koszyka"""
+    # Jeśli koszyk jest pusty, zwróć odpowiednią odpowiedź
+    if not cart["items"]:
+        return EMPTY_CART
+
+    # Fragmenty tekstu łączone jednorazowo na końcu
+    parts = [f"🛒 Koszyk ({cart['item_count']} przedmiotów)\n\n"]
+
+    # Tworzenie tekstu dla każdego elementu w koszyku
+    for i, item in enumerate(cart["items"], 1):
+        # Tworzenie opisu wybranych dodatków
+        customizations = (
+            ", ".join(item["customizations"])
+            if item["customizations"]
+            else "bez dodatków"
+        )
+        # Tworzenie opisu zamienników
+        substitutions = (
+            ", ".join(item["substitutions"]) if item["substitutions"] else "standardowe"
+        )
+        parts.append(
+            f"{i}. {item['drink'].title()} {item['size']}\n"
+            f"   Dodatki: {customizations}\n"
+            f"   Zamienniki: {substitutions}\n"
+            f"   Cena: {item['price']} zł\n\n"
+        )
+
+    # Dodanie łącznej kwoty do tekstu
+    parts.append(f"💰 Łączna kwota: {cart['total']} zł")
+
+    # Zwróć tekst koszyka
+    return "".join(parts)
+
+
+class PanelRenderer:
+    """Renderuje panele koszyka i logu tylko po zmianie ich wersji"""
+
+    def __init__(self):
+        self.cart_version = None
+        self.menu_number = None
+        self.log_epoch = None
+        self.log_seq = 0
+        self.log_lines = deque(maxlen=CFG.conversation_log_capacity)
+
+    def render_cart(self, agent, force: bool = False):
+        """Zwraca tekst koszyka lub None, jeśli koszyk się nie zmienił"""
+        version = agent.get_cart_version()
+        if version == self.cart_version and not force:
+            return None
+        self.cart_version = version
+        return format_cart(agent.get_cart_summary())
+
+    def render_menu(self, agent, force: bool = False):
+        """Zwraca tekst menu lub None, jeśli wersja menu się nie zmieniła"""
+        menu = agent.state["menu"]
+        if menu.number == self.menu_number and not force:
+            return None
+        self.menu_number = menu.number
+        return menu.markdown
+
+    def render_log(self, agent, force: bool = False):
+        """Zwraca tekst logu lub None, jeśli log się nie zmienił.
+
+        Formatowane są tylko nowe zdarzenia (tryb dopisywania).
+        """
+        epoch, seq = agent.get_log_version()
+        if epoch != self.log_epoch:
+            # Nowy lub wyczyszczony log - zaczynamy od początku
+            self.log_epoch, self.log_seq = epoch, 0
+            self.log_lines.clear()
+        elif seq == self.log_seq and not force:
+            return None
+
+        self.log_lines.extend(agent.get_new_log_entries(self.log_seq))
+        self.log_seq = seq
+        if not self.log_lines:
+            return EMPTY_LOG
+
+        # Nagłówek z metrykami i bieżącym zamówieniem oraz ogon logu
+        header = json.dumps(agent.get_metrics(), ensure_ascii=False)
+        return header + "\n\n" + "\n\n".join(self.log_lines)
+
+
+def _skip_if_none(value):
+    """Zwraca gr.skip() dla paneli, które nie wymagają odświeżenia"""
+    return gr.skip() if value is None else value
 
 
 class CoffeeShopGUI:
     """Klasa interfejsu graficznego kawiarni"""
 
     def __init__(self):
-        self.agent = Agent()
-
-    def chat(self, message, history):
+        self.sessions = SessionRegistry()
+        # Stan renderowania paneli znika razem z agentem usuniętym z rejestru
+        self.renderers = weakref.WeakKeyDictionary()
+        # Tury jednej sesji wykonywane po kolei (np. dwa szybkie wysłania)
+        self.turn_locks = weakref.WeakKeyDictionary()
+        self.async_pool_warmed = False
+
+    def get_renderer(self, agent) -> PanelRenderer:
+        """Zwraca renderer paneli dla agenta sesji"""
+        renderer = self.renderers.get(agent)
+        if renderer is None:
+            renderer = self.renderers[agent] = PanelRenderer()
+        return renderer
+
+    def get_turn_lock(self, agent) -> asyncio.Lock:
+        """Zwraca blokadę tur agenta sesji"""
+        lock = self.turn_locks.get(agent)
+        if lock is None:
+            lock = self.turn_locks[agent] = asyncio.Lock()
+        return lock
+
+    async def warm_up_async_pool(self):
+        """Rozgrzewa pulę połączeń asynchronicznych na pętli serwera (raz)"""
+        if self.async_pool_warmed or not CFG.llm_warm_up:
+            return
+        self.async_pool_warmed = True
+        opened = await awarm_up()
+        print(
+            f"🔌 Rozgrzane połączenia asynchroniczne: "
+            f"{opened}/{CFG.llm_warm_up_connections}"
+        )
+
+    def get_agent(self, request: gr.Request = None):
+        """Zwraca agenta przypisanego do sesji przeglądarki"""
+        session_id = request.session_hash if request is not None else "default"
+        return self.sessions.get(session_id)
+
+    def close_session(self, request: gr.Request):
+        """Usuwa sesję po zamknięciu karty przeglądarki"""
+        self.sessions.remove(request.session_hash)
+
+    async def chat(self, message, history, request: gr.Request = None):
         """Funkcja obsługująca czat z agentem"""
         if not message.strip():
-            return "", history
-
-        # Pobierz odpowiedź od agenta
-        response = self.agent.chat(message)
-
-        # Dodaj wiadomość użytkownika i odpowiedź do historii w formacie messages
-        history.append({"role": "user", "content": message})
-        history.append({"role": "assistant", "content": response})
-
-        # Aktualizacja koszyka
-        cart_info = self.get_cart_info()
-
-        # Pobierz historię rozmowy
-        conversation_log = self.agent.get_conversation_log()
-
-        # Log jest już w formacie JSON, więc możemy go użyć bezpośrednio
-        log_text = conversation_log
-
-        # Zwróć odpowiedź, historię rozmowy, informacje o koszyku i log działania aplikacji
-        return "", history, cart_info, log_text
-
-    def get_cart_info(self):
-        """Zwraca informacje o koszyku"""
-        # Pobierz informacje o koszyku
-        cart = self.agent.get_cart_summary()
-
-        # Jeśli koszyk jest pusty, zwróć odpowiednią odpowiedź
-        if not cart["items"]:
-            return "🛒 Koszyk jest pusty"
-
-        # Tworzenie tekstu koszyka
-        cart_text = f"🛒 Koszyk ({cart['item_count']} przedmiotów)\n\n"
-
-        # Tworzenie tekstu dla każdego elementu w koszyku
-        for i, item in enumerate(cart["items"], 1):
-            # Tworzenie opisu wybranych dodatków
-            customizations = (
-                ", ".join(item["customizations"])
-                if item["customizations"]
-                else "bez dodatków"
-            )
-            # Tworzenie opisu zamienników
-            substitutions = (
-                ", ".join(item["substitutions"])
-                if item["substitutions"]
-                else "standardowe"
+            yield "", history, gr.skip(), gr.skip(), gr.skip()
+            return
+
+        start = time.perf_counter()
+        agent = self.get_agent(request)
+
+        # Kolejna wiadomość tej samej sesji czeka na zakończenie poprzedniej tury
+        async with self.get_turn_lock(agent):
+            # Dodaj wiadomość użytkownika i odpowiedź do historii (format messages)
+            history.append({"role": "user", "content": message})
+            if CFG.stream_responses:
+                # Odpowiedź pojawia się w czacie w trakcie generowania
+                history.append({"role": "assistant", "content": ""})
+                async for response in agent.astream_chat(message):
+                    history[-1]["content"] = response
+                    yield "", history, gr.skip(), gr.skip(), gr.skip()
+            else:
+                # Pobierz odpowiedź od agenta sesji bez blokowania wątku
+                response = await agent.achat(message)
+                history.append({"role": "assistant", "content": response})
+
+            # Panele są odświeżane tylko po zmianie wersji koszyka i logu
+            renderer = self.get_renderer(agent)
+            with RENDER_SECONDS.time("cart"):
+                cart_info = _skip_if_none(renderer.render_cart(agent))
+            with RENDER_SECONDS.time("log"):
+                log_text = _skip_if_none(renderer.render_log(agent))
+            with RENDER_SECONDS.time("menu"):
+                menu_text = _skip_if_none(renderer.render_menu(agent))
+            GUI_SECONDS.observe(time.perf_counter() - start, "chat")
+
+            # Zwróć odpowiedź, historię rozmowy, koszyk i log działania aplikacji
+            yield "", history, cart_info, log_text, menu_text
+
+    async def reset_agent(self, request: gr.Request = None):
+        """Resetuje stan agenta"""
+        agent = self.get_agent(request)
+        # Reset w trakcie tury zostałby nadpisany stanem kończącej się tury
+        async with self.get_turn_lock(agent):
+            agent.reset()
+            renderer = self.get_renderer(agent)
+            return renderer.render_cart(agent, force=True), renderer.render_log(
+                agent, force=True
             )
-            # Tworzenie tekstu dla każdego elementu w koszyku
-            cart_text += f"{i}. {item['drink'].title()} {item['size']}\n"
-            cart_text += f"   Dodatki: {customizations}\n"
-            cart_text += f"   Zamienniki: {substitutions}\n"
-            cart_text += f"   Cena: {item['price']} zł\n\n"
 
-        # Dodanie łącznej kwoty do tekstu
-        cart_text += f"💰 Łączna kwota: {cart['total']} zł"
-
-        # Zwróć tekst koszyka
-        return cart_text
-
-    def reset_agent(self):
-        """Resetuje stan agenta"""
-        self.agent.reset()
-        return "🛒 Koszyk jest pusty", self.agent.get_conversation_log()
+    async def clear_log(self, request: gr.Request = None):
+        """Czyści log agenta sesji"""
+        agent = self.get_agent(request)
+        async with self.get_turn_lock(agent):
+            agent.clear_conversation_log()
+            return self.get_renderer(agent).render_log(agent, force=True)
 
     def create_interface(self):
         """Tworzy interfejs Gradio"""
@@ -89,8 +220,8 @@ class CoffeeShopGUI:
                 """Aplikacja wykorzystuje LLM, nie podawaj danych wrażliwych."""
             )
 
-            # Dodanie menu
-            gr.Markdown(get_menu())
+            # Dodanie menu (po przeładowaniu menu odświeżane przy kolejnej turze)
+            menu_display = gr.Markdown(lambda: current_menu().markdown)
 
             # Dodanie czatu i koszyka
             with gr.Row():
@@ -116,7 +247,7 @@ class CoffeeShopGUI:
                     # Koszyk
                     cart_display = gr.Textbox(
                         label="🛒 Twój koszyk",
-                        value="🛒 Koszyk jest pusty",
+                        value=EMPTY_CART,
                         lines=20,
                         interactive=False,
                         container=True,
@@ -138,7 +269,7 @@ class CoffeeShopGUI:
                 with gr.Column(scale=2):
                     conversation_log_display = gr.Textbox(
                         label="📝 Log działania aplikacji",
-                        value="📝 Brak logów",
+                        value=EMPTY_LOG,
                         lines=15,
                         interactive=False,
                         container=True,
@@ -150,39 +281,76 @@ class CoffeeShopGUI:
                 reset_btn = gr.Button("🔄 Resetuj agenta", variant="secondary")
                 clear_log_btn = gr.Button("🧹 Wyczyść logi", variant="secondary")
 
-            # Obsługa przycisku wysyłania wiadomości
+            # Obsługa przycisku wysyłania wiadomości.
+            # Asynchroniczny handler pozwala obsłużyć wiele rozmów w jednej pętli zdarzeń.
             msg.submit(
                 self.chat,
                 [msg, chatbot],
-                [msg, chatbot, cart_display, conversation_log_display],
+                [msg, chatbot, cart_display, conversation_log_display, menu_display],
+                concurrency_limit=CFG.gui_concurrency_limit,
+                api_name="chat",
             )
             send_btn.click(
                 self.chat,
                 [msg, chatbot],
-                [msg, chatbot, cart_display, conversation_log_display],
+                [msg, chatbot, cart_display, conversation_log_display, menu_display],
+                concurrency_limit=CFG.gui_concurrency_limit,
             )
 
             # Obsługa przycisków kontrolnych
             reset_btn.click(
                 self.reset_agent, outputs=[cart_display, conversation_log_display]
             )
-            clear_log_btn.click(
-                lambda: self.agent.clear_conversation_log()
-                or self.agent.get_conversation_log(),
-                outputs=[conversation_log_display],
-            )
+            clear_log_btn.click(self.clear_log, outputs=[conversation_log_display])
+
+            # Zwolnienie sesji po zamknięciu karty przeglądarki
+            gui.unload(self.close_session)
+
+            # Pula asynchroniczna rozgrzewana na pętli serwera przy pierwszej wizycie
+            gui.load(self.warm_up_async_pool)
 
         return gui
 
 
+def _session_samples(sessions: SessionRegistry):
+    """Zwraca statystyki rejestru sesji jako metryki"""
+    stats = sessions.stats()
+    return [
+        ("coffee_sessions_live", {}, stats["live_sessions"]),
+        ("coffee_sessions_created_total", {}, stats["created"]),
+        ("coffee_sessions_evicted_total", {}, stats["evicted"]),
+        ("coffee_sessions_expired_total", {}, stats["expired"]),
+    ]
+
+
 def main():
     """Główna funkcja aplikacji"""
     gui_handler = CoffeeShopGUI()
+    gui_handler.sessions.start_reaper()
     interface = gui_handler.create_interface()
 
     print("🚀 Uruchamianie aplikacji Kawiarnia AI...")
     print("📝 Pamiętaj, aby utworzyć plik .env z kluczem OPENAI_API_KEY")
 
+    # Przeładowanie menu po zmianie pliku bez restartu serwera
+    MENU_STORE.start_watching()
+    print(f"📋 Menu: {MENU_STORE.snapshot()['source'] or 'CFG'}")
+
+    # Okresowe migawki metryk biznesowych (łączone z innymi procesami)
+    if CFG.business_metrics_dir:
+        BUSINESS_METRICS.start_snapshots()
+
+    # Metryki w formacie Prometheusa obok serwera Gradio
+    if CFG.metrics_port:
+        metrics.register_collector(lambda: _session_samples(gui_handler.sessions))
+        metrics.start_server()
+        print(f"📈 Metryki: http://{CFG.metrics_host}:{CFG.metrics_port}/metrics")
+
+    # Otwarcie połączeń do API zanim interfejs zacznie przyjmować ruch
+    if CFG.llm_warm_up:
+        opened = warm_up()
+        print(f"🔌 Rozgrzane połączenia z API: {opened}/{CFG.llm_warm_up_connections}")
+
     interface.launch(
         share=False,
         debug=True,
@@ -0,0 +1,126 @@
+from typing import Optional
+
+
+# Proste sekwencje ucieczki w napisach JSON
+_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+class JsonFieldScanner:
+    """Przyrostowo wyciąga wartość tekstowego pola z obiektu JSON.
+
+    Dane są podawane fragmentami (np. tokenami z LLM'a), a feed() zwraca
+    zdekodowany fragment wartości pola, który pojawił się w danym kawałku.
+    Obsługiwane są tylko pola najwyższego poziomu obiektu.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ""
+        self.done = False
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = None
+        self._string = []
+        self._capturing = False
+        self._last_key = None
+        self._after_colon = False
+
+    def feed(self, chunk: str) -> str:
+        """Przetwarza fragment tekstu i zwraca nową część wartości pola"""
+        emitted = []
+        for char in chunk:
+            piece = self._step(char)
+            if piece:
+                emitted.append(piece)
+        text = "".join(emitted)
+        self.value += text
+        return text
+
+    def _step(self, char: str) -> Optional[str]:
+        """Przetwarza jeden znak"""
+        if self._in_string:
+            return self._string_char(char)
+
+        if char == '"':
+            self._in_string = True
+            self._string = []
+            # Wartość szukanego pola na najwyższym poziomie obiektu
+            self._capturing = (
+                self._depth == 1
+                and self._after_colon
+                and self._last_key == self.field
+                and not self.done
+            )
+        elif char in "{[":
+            self._depth += 1
+            self._after_colon = False
+        elif char in "}]":
+            self._depth -= 1
+        elif char == ":":
+            self._after_colon = True
+        elif char == ",":
+            self._after_colon = False
+            self._last_key = None
+        return None
+
+    def _string_char(self, char: str) -> Optional[str]:
+        """Przetwarza znak wewnątrz napisu"""
+        if self._escape is not None:
+            self._escape += char
+            decoded = self._decode_escape()
+            if decoded is None:
+                return None
+            self._escape = None
+            return self._emit(decoded)
+
+        if char == "\\":
+            self._escape = ""
+            return None
+
+        if char == '"':
+            self._in_string = False
+            if self._capturing:
+                self._capturing = False
+                self.done = True
+            elif self._depth == 1 and not self._after_colon:
+                self._last_key = "".join(self._string)
+            return None
+
+        return self._emit(char)
+
+    def _decode_escape(self) -> Optional[str]:
+        """Dekoduje sekwencję ucieczki (None - sekwencja jeszcze niekompletna)"""
+        kind = self._escape[0]
+        if kind != "u":
+            return _ESCAPES.get(kind, kind)
+        if len(self._escape) < 5:
+            return None
+        try:
+            code = int(self._escape[1:5], 16)
+            # Para surogatów (np. emoji) zapisana jako dwie sekwencje \uXXXX
+            if 0xD800 <= code < 0xDC00:
+                if len(self._escape) < 11:
+                    return None
+                low = int(self._escape[7:11], 16)
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00))
+            return chr(code)
+        except ValueError:
+            return self._escape
+
+    def _emit(self, text: str) -> Optional[str]:
+        """Dodaje tekst do bieżącego napisu i zwraca go dla szukanego pola"""
+        if self._capturing:
+            return text
+        if self._depth == 1 and not self._after_colon:
+            self._string.append(text)
+        return None
@@ -0,0 +1,308 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from config import CFG
+from menu import current_menu
+from pricing import PricingError
+
+
+def encode_record(record: Dict) -> bytes:
+    """Zwraca linię księgi: suma kontrolna CRC32 i rekord JSON"""
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    data = payload.encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(data), data)
+
+
+def decode_record(line: bytes) -> Optional[Dict]:
+    """Zwraca rekord z linii księgi lub None dla linii uszkodzonej"""
+    if len(line) < 10 or line[8:9] != b" " or not line.endswith(b"\n"):
+        return None
+    data = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(data):
+            return None
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class OrderLedger:
+    """Księga zamówień tylko do dopisywania z grupowym zatwierdzaniem.
+
+    Rekordy trafiają do bufora, a wątek w tle zapisuje je partiami.
+    Jedno fsync zatwierdza wszystkie rekordy zebrane w czasie commit_delay.
+    Błąd zapisu trafia do wszystkich rekordów partii, a wątek działa dalej.
+    """
+
+    def __init__(self, path: str, commit_delay: float = None):
+        self.path = path
+        self.commit_delay = (
+            commit_delay if commit_delay is not None else CFG.ledger_commit_delay
+        )
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Bez bufora - dane nieudanego zapisu nie trafią do pliku z kolejną partią
+        self._file = open(path, "ab", buffering=0)
+
+        # Urwany ostatni rekord (awaria w trakcie zapisu) nie może skleić się
+        # z kolejnym - nowe rekordy zaczynają się od nowej linii
+        if self._file.tell():
+            with open(path, "rb") as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b"\n":
+                    self._file.write(b"\n")
+
+        # Rekordy oczekujące na zapis: (linia, przyszłe zatwierdzenie)
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        # Po nieudanym zapisie, którego nie dało się cofnąć, w pliku może
+        # zostać urwana linia
+        self._torn = False
+
+        self.records = 0
+        self.commits = 0
+        self.failures = 0
+        self.sync_seconds = 0.0
+
+        self._writer = threading.Thread(
+            target=self._write_loop, name="ledger-writer", daemon=True
+        )
+        self._writer.start()
+
+    def append(
+        self,
+        session_id: str,
+        items: List[Dict],
+        total: float,
+        total_grosze: int = None,
+    ) -> Future:
+        """Dopisuje zamówienie i zwraca przyszły wynik zapisu na dysk.
+
+        Wynik jest ustawiany po fsync, a przy błędzie zapisu przyszłość
+        zawiera wyjątek (np. OSError).
+        """
+        record = {
+            "order_id": uuid.uuid4().hex,
+            "timestamp": time.time(),
+            "session_id": session_id,
+            "items": items,
+            "total": total,
+            "total_grosze": (
+                total_grosze if total_grosze is not None else round(total * 100)
+            ),
+        }
+        committed = Future()
+        line = encode_record(record)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Księga zamówień jest zamknięta")
+            self._pending.append((line, committed))
+            self._condition.notify()
+        return committed
+
+    def _write_loop(self):
+        """Pętla wątku zapisującego - grupuje rekordy w jedno fsync"""
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending and self._closed:
+                    return
+
+            # Krótkie oczekiwanie zbiera kolejne zamówienia do tego samego fsync
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            with self._condition:
+                batch, self._pending = self._pending, []
+
+            # Zamówienia anulowane w czasie oczekiwania nie są zapisywane
+            batch = [
+                (line, committed)
+                for line, committed in batch
+                if committed.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            try:
+                self._commit(batch)
+            except Exception as error:
+                self.failures += 1
+                for _, committed in batch:
+                    committed.set_exception(error)
+            else:
+                for _, committed in batch:
+                    committed.set_result(None)
+
+    def _commit(self, batch: List):
+        """Zapisuje partię rekordów i czeka na fsync.
+
+        Przy błędzie plik jest przycinany do stanu sprzed partii - zamówienie
+        zgłoszone jako niezapisane nie może pojawić się w księdze.
+        """
+        start = time.perf_counter()
+        data = b"".join(line for line, _ in batch)
+        if self._torn:
+            # Nowa linia oddziela rekordy od urwanego zapisu
+            data = b"\n" + data
+        offset = self._file.tell()
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._file.write(view) :]
+            os.fsync(self._file.fileno())
+        except Exception:
+            try:
+                os.ftruncate(self._file.fileno(), offset)
+                self._file.seek(offset)
+            except OSError:
+                self._torn = True
+            raise
+        self._torn = False
+        self.sync_seconds += time.perf_counter() - start
+        self.records += len(batch)
+        self.commits += 1
+
+    def close(self):
+        """Zatwierdza oczekujące rekordy i zamyka plik"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._writer.join()
+        self._file.close()
+
+    def snapshot(self) -> Dict:
+        """Zwraca statystyki zapisu"""
+        return {
+            "records": self.records,
+            "commits": self.commits,
+            "failures": self.failures,
+            "records_per_commit": self.records / self.commits if self.commits else 0,
+            "avg_commit_ms": (
+                self.sync_seconds / self.commits * 1e3 if self.commits else 0.0
+            ),
+        }
+
+
+def _total_grosze(record: Dict) -> int:
+    # Starsze rekordy mają tylko kwotę w złotych
+    total_grosze = record.get("total_grosze")
+    return total_grosze if total_grosze is not None else round(record["total"] * 100)
+
+
+def scan(path: str, buffer_size: int = 1 << 20) -> Dict:
+    """Odczytuje księgę sekwencyjnie i odtwarza przychód oraz sprzedaż napojów"""
+    orders = 0
+    revenue_grosze = 0
+    per_drink = {}
+    corrupted = 0
+    last_timestamp = None
+
+    if os.path.exists(path):
+        with open(path, "rb", buffering=buffer_size) as ledger:
+            for line in ledger:
+                record = decode_record(line)
+                if record is None:
+                    # Uszkodzona linia (np. urwany zapis przy awarii)
+                    corrupted += 1
+                    continue
+                orders += 1
+                revenue_grosze += _total_grosze(record)
+                last_timestamp = record["timestamp"]
+                for item in record["items"]:
+                    sales = per_drink.setdefault(
+                        item["drink"], {"count": 0, "revenue": 0}
+                    )
+                    sales["count"] += 1
+                    sales["revenue"] += round(item["price"] * 100)
+
+    for sales in per_drink.values():
+        sales["revenue"] /= 100
+    return {
+        "orders_completed": orders,
+        "total_revenue": revenue_grosze / 100,
+        "per_drink": per_drink,
+        "corrupted": corrupted,
+        "last_timestamp": last_timestamp,
+    }
+
+
+def reprice(path: str, buffer_size: int = 1 << 20) -> Dict:
+    """Wycenia wszystkie zamówienia z księgi według aktualnego cennika.
+
+    Zwraca sumę zapisaną w księdze, sumę po ponownej wycenie oraz zamówienia,
+    których kwota się różni lub których nie da się wycenić (pozycje spoza menu).
+    """
+    records = []
+    if os.path.exists(path):
+        with open(path, "rb", buffering=buffer_size) as ledger:
+            records = [record for record in map(decode_record, ledger) if record]
+
+    table = current_menu().prices
+    recorded_grosze = sum(_total_grosze(record) for record in records)
+    try:
+        # Cała księga wyceniana jednym przebiegiem po skompilowanym cenniku
+        totals = table.price_carts(record["items"] for record in records)
+    except PricingError:
+        # Wycena zamówienie po zamówieniu, aby wskazać te spoza menu
+        totals = []
+        for record in records:
+            try:
+                totals.append(table.price_cart(record["items"]))
+            except PricingError:
+                totals.append(None)
+
+    changed, unpriced = [], []
+    for record, total_grosze in zip(records, totals):
+        if total_grosze is None:
+            unpriced.append(record["order_id"])
+        elif total_grosze != _total_grosze(record):
+            changed.append(record["order_id"])
+    return {
+        "menu_version": table.version,
+        "orders": len(records),
+        "recorded_revenue": recorded_grosze / 100,
+        "repriced_revenue": sum(total for total in totals if total) / 100,
+        "changed": changed,
+        "unpriced": unpriced,
+    }
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> Optional[OrderLedger]:
+    """Zwraca współdzieloną księgę zamówień (None gdy jest wyłączona)"""
+    global _ledger
+    if not CFG.ledger_path:
+        return None
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = OrderLedger(CFG.ledger_path)
+            atexit.register(_ledger.close)
+    return _ledger
+
+
+if __name__ == "__main__":
+    # Uzgodnienie przychodu: python ledger.py [--reprice] [ścieżka księgi]
+    arguments = sys.argv[1:]
+    report = scan
+    if arguments and arguments[0] == "--reprice":
+        report = reprice
+        arguments = arguments[1:]
+    path = arguments[0] if arguments else CFG.ledger_path
+    if not path:
+        sys.exit("Podaj ścieżkę księgi zamówień lub ustaw LEDGER_PATH")
+    print(json.dumps(report(path), indent=2, ensure_ascii=False))
@@ -0,0 +1,274 @@
+import json
+import re
+import threading
+from typing import Dict, Tuple
+
+from config import CFG
+
+
+# Schematy odpowiedzi węzłów (JSON Schema zgodny z trybem strict API OpenAI)
+VALIDATION_SCHEMA = {
+    "name": "validation",
+    "schema": {
+        "type": "object",
+        "properties": {"is_valid": {"type": "boolean"}},
+        "required": ["is_valid"],
+        "additionalProperties": False,
+    },
+}
+
+BATCH_VALIDATION_SCHEMA = {
+    "name": "batch_validation",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "verdicts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "string"},
+                        "is_valid": {"type": "boolean"},
+                    },
+                    "required": ["id", "is_valid"],
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["verdicts"],
+        "additionalProperties": False,
+    },
+}
+
+PROCESS_SCHEMA = {
+    "name": "order_analysis",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "intent": {
+                "type": "string",
+                "enum": [
+                    "order_drink",
+                    "ask_question",
+                    "modify_order",
+                    "checkout",
+                    "add_to_cart",
+                ],
+            },
+            "drink_type": {"type": ["string", "null"]},
+            # Dowolny napis ("duże", "M") - rozmiar sprowadza do menu indeks nazw
+            "size": {"type": ["string", "null"]},
+            "customizations": {"type": "array", "items": {"type": "string"}},
+            "substitutions": {"type": "array", "items": {"type": "string"}},
+            "response": {"type": "string"},
+        },
+        "required": [
+            "intent",
+            "drink_type",
+            "size",
+            "customizations",
+            "substitutions",
+            "response",
+        ],
+        "additionalProperties": False,
+    },
+}
+
+# Blok kodu markdown: ```json ... ```
+_FENCE = re.compile(r"```[a-zA-Z]*\s*(.*?)\s*```", re.DOTALL)
+
+# Literały Pythona zamieniane na odpowiedniki JSON (poza napisami)
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+# Wartości spoza enum zastępowane zamiast odrzucania całej odpowiedzi
+_ENUM_FALLBACKS = {"order_analysis.intent": "ask_question"}
+
+_TRUE_WORDS = {"true", "tak", "yes", "1"}
+_FALSE_WORDS = {"false", "nie", "no", "0"}
+
+
+class DecodeError(ValueError):
+    """Odpowiedzi LLM'a nie da się zdekodować ani naprawić"""
+
+
+def strip_fences(text: str) -> str:
+    """Usuwa blok kodu markdown i tekst otaczający obiekt JSON"""
+    text = text.strip().lstrip("﻿")
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+
+    # Tekst przed i po obiekcie (np. "Oto odpowiedź: {...}")
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start : end + 1]
+    return text
+
+
+def repair_json(text: str) -> str:
+    """Naprawia typowe błędy: literały Pythona, apostrofy, przecinki na końcu"""
+    out = []
+    i, length = 0, len(text)
+    while i < length:
+        char = text[i]
+
+        # Napisy w cudzysłowach lub apostrofach przepisywane jako napisy JSON
+        if char in "\"'":
+            quote, i = char, i + 1
+            chars = []
+            while i < length and text[i] != quote:
+                if text[i] == "\\" and i + 1 < length:
+                    escaped = text[i + 1]
+                    chars.append(escaped if escaped == "'" else "\\" + escaped)
+                    i += 2
+                    continue
+                chars.append('\\"' if text[i] == '"' else text[i])
+                i += 1
+            out.append('"' + "".join(chars) + '"')
+            i += 1
+            continue
+
+        if char.isalpha():
+            start = i
+            while i < length and (text[i].isalnum() or text[i] == "_"):
+                i += 1
+            word = text[start:i]
+            out.append(_PYTHON_LITERALS.get(word, word))
+            continue
+
+        # Przecinek przed zamknięciem obiektu lub listy
+        if char == ",":
+            rest = text[i + 1 :].lstrip()
+            if rest[:1] in ("}", "]"):
+                i += 1
+                continue
+
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _coerce(value, schema: Dict, path: str):
+    """Sprawdza i normalizuje wartość zgodnie ze schematem"""
+    types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+
+    if isinstance(value, str) and "null" in types:
+        if value.strip().lower() in ("", "null", "none"):
+            value = None
+    if value is None:
+        if "null" in types:
+            return None
+        if "array" in types:
+            return []
+        raise DecodeError(f"{path}: brak wartości")
+
+    if "object" in types:
+        if not isinstance(value, dict):
+            raise DecodeError(f"{path}: oczekiwano obiektu")
+        # Brakujące pola dopuszczające null lub listę są uzupełniane
+        return {
+            name: _coerce(value.get(name), field, f"{path}.{name}")
+            for name, field in schema["properties"].items()
+        }
+
+    if "array" in types:
+        if isinstance(value, str):
+            value = [value] if value.strip() else []
+        if not isinstance(value, list):
+            raise DecodeError(f"{path}: oczekiwano listy")
+        return [_coerce(item, schema["items"], f"{path}[]") for item in value]
+
+    if "boolean" in types:
+        if isinstance(value, bool):
+            return value
+        word = str(value).strip().lower()
+        if word in _TRUE_WORDS:
+            return True
+        if word in _FALSE_WORDS:
+            return False
+        raise DecodeError(f"{path}: oczekiwano wartości logicznej")
+
+    if "string" in types:
+        if isinstance(value, (dict, list, bool)):
+            raise DecodeError(f"{path}: oczekiwano napisu")
+        value = str(value).strip()
+        enum = schema.get("enum")
+        if enum is not None:
+            # Porównanie bez rozróżniania wielkości liter (np. "m" -> "M")
+            allowed = {item.lower(): item for item in enum if item is not None}
+            if value.lower() in allowed:
+                value = allowed[value.lower()]
+            elif path in _ENUM_FALLBACKS:
+                value = _ENUM_FALLBACKS[path]
+            else:
+                raise DecodeError(f"{path}: niedozwolona wartość {value!r}")
+        return value
+
+    raise DecodeError(f"{path}: nieobsługiwany typ {types}")
+
+
+def validate(data, schema: Dict) -> Dict:
+    """Sprawdza zdekodowany obiekt względem schematu węzła"""
+    return _coerce(data, schema["schema"], schema["name"])
+
+
+def decode(content: str, schema: Dict) -> Tuple[Dict, bool]:
+    """Dekoduje odpowiedź LLM'a do obiektu zgodnego ze schematem.
+
+    Zwraca parę (obiekt, czy odpowiedź wymagała naprawy).
+    Rzuca DecodeError gdy odpowiedzi nie da się naprawić.
+    """
+    try:
+        return validate(json.loads(content), schema), False
+    except (json.JSONDecodeError, DecodeError):
+        if not CFG.tolerant_decoding:
+            raise DecodeError("niepoprawna odpowiedź") from None
+
+    text = strip_fences(content)
+    for candidate in (text, repair_json(text)):
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        return validate(data, schema), True
+    raise DecodeError("nie udało się naprawić odpowiedzi")
+
+
+def structured(llm, schema: Dict):
+    """Prosi model o odpowiedź zgodną ze schematem (structured output)"""
+    if not CFG.structured_output:
+        return llm
+    response_format = {"type": "json_schema", "json_schema": {**schema, "strict": True}}
+    return llm.bind(response_format=response_format)
+
+
+class DecodeStats:
+    """Liczniki dekodowania odpowiedzi LLM'a per węzeł"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes = {}
+
+    def record(self, node: str, outcome: str):
+        """Zapisuje wynik dekodowania: clean, repaired lub fallback"""
+        with self._lock:
+            stats = self.nodes.setdefault(
+                node, {"calls": 0, "clean": 0, "repaired": 0, "fallback": 0}
+            )
+            stats["calls"] += 1
+            stats[outcome] += 1
+
+    def snapshot(self) -> Dict:
+        """Zwraca liczniki oraz odsetek naprawionych i zmarnowanych tur"""
+        with self._lock:
+            return {
+                node: {
+                    **stats,
+                    "repair_rate": stats["repaired"] / stats["calls"],
+                    "fallback_rate": stats["fallback"] / stats["calls"],
+                }
+                for node, stats in self.nodes.items()
+            }
+
+
+DECODE_STATS = DecodeStats()
@@ -0,0 +1,139 @@
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from config import CFG
+
+
+# Rejestr klientów LLM współdzielonych w całym procesie
+_lock = threading.Lock()
+_clients: Dict[Tuple, ChatOpenAI] = {}
+_http_client = None
+_http_async_client = None
+
+
+def _limits() -> httpx.Limits:
+    """Zwraca limity puli połączeń"""
+    return httpx.Limits(
+        max_connections=CFG.llm_max_connections,
+        max_keepalive_connections=CFG.llm_max_keepalive_connections,
+        keepalive_expiry=CFG.llm_keepalive_expiry,
+    )
+
+
+def _get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Zwraca współdzielonych klientów HTTP z pulą połączeń keep-alive"""
+    global _http_client, _http_async_client
+
+    if _http_client is None:
+        _http_client = httpx.Client(limits=_limits(), timeout=CFG.llm_timeout)
+    if _http_async_client is None:
+        _http_async_client = httpx.AsyncClient(
+            limits=_limits(), timeout=CFG.llm_timeout
+        )
+    return _http_client, _http_async_client
+
+
+def get_llm(model: str = None, **settings) -> ChatOpenAI:
+    """Zwraca klienta LLM z rejestru (tworzy go przy pierwszym użyciu)"""
+    model = model or CFG.model
+    key = (model, CFG.base_url, tuple(sorted(settings.items())))
+
+    # Szybka ścieżka bez blokady - klient już istnieje
+    llm = _clients.get(key)
+    if llm is not None:
+        return llm
+
+    with _lock:
+        llm = _clients.get(key)
+        if llm is None:
+            http_client, http_async_client = _get_http_clients()
+            llm = ChatOpenAI(
+                api_key=CFG.api_key,
+                model=model,
+                base_url=CFG.base_url,
+                http_client=http_client,
+                http_async_client=http_async_client,
+                # Zużycie tokenów także dla odpowiedzi strumieniowanych
+                stream_usage=True,
+                **settings,
+            )
+            _clients[key] = llm
+    return llm
+
+
+def _models_request() -> Tuple[str, Dict]:
+    """Lekkie zapytanie bez zużycia tokenów - otwiera połączenie TLS w puli"""
+    url = f"{CFG.base_url.rstrip('/')}/models"
+    return url, {"Authorization": f"Bearer {CFG.api_key}"}
+
+
+def warm_up(connections: int = None) -> int:
+    """Otwiera połączenia do API zanim pojawi się pierwszy klient.
+
+    Zwraca liczbę udanych połączeń.
+    """
+    connections = connections or CFG.llm_warm_up_connections
+
+    # Upewnij się, że domyślny klient istnieje w rejestrze
+    get_llm()
+    with _lock:
+        http_client, _ = _get_http_clients()
+    url, headers = _models_request()
+
+    def _ping(_):
+        try:
+            http_client.get(url, headers=headers)
+            return True
+        except httpx.HTTPError:
+            return False
+
+    # Równoległe zapytania otwierają kilka połączeń jednocześnie
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        return sum(executor.map(_ping, range(connections)))
+
+
+async def awarm_up(connections: int = None) -> int:
+    """Otwiera połączenia puli klienta asynchronicznego.
+
+    Połączenia należą do pętli zdarzeń, na której powstały - funkcję trzeba
+    wywołać na pętli, która obsługuje zapytania (np. pętli serwera Gradio).
+    Zwraca liczbę udanych połączeń.
+    """
+    connections = connections or CFG.llm_warm_up_connections
+
+    get_llm()
+    with _lock:
+        _, http_async_client = _get_http_clients()
+    url, headers = _models_request()
+
+    async def _ping():
+        try:
+            await http_async_client.get(url, headers=headers)
+            return True
+        except httpx.HTTPError:
+            return False
+
+    results = await asyncio.gather(*(_ping() for _ in range(connections)))
+    return sum(results)
+
+
+def close_all():
+    """Zamyka wszystkie połączenia i czyści rejestr"""
+    global _http_client, _http_async_client
+
+    with _lock:
+        _clients.clear()
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+        # Klient asynchroniczny jest zamykany razem z pętlą zdarzeń
+        _http_async_client = None
+
+
+atexit.register(close_all)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Test obciążeniowy: równocześni klienci prowadzą rozmowy z korpusu benchmarku
+przez HTTP API Gradio, a poziom współbieżności rośnie aż do nasycenia.
+
+Całość działa bez dostępu do sieci - z lokalnym serwerem zgodnym z API OpenAI:
+
+    python loadtest.py --launch --concurrency 1,4,16,32 --duration 30
+
+albo przeciwko działającej już aplikacji:
+
+    python mock_openai_server.py --port 8001 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python main.py &
+    python loadtest.py --url http://127.0.0.1:7860
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+# Dodaj katalog główny do ścieżki Pythona
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from gradio_client import Client
+
+from benchmark import CORPUS, summarize
+from mock_openai_server import start_mock_server
+
+
+class LevelResult:
+    """Wyniki jednego poziomu współbieżności (zapis z wielu wątków klientów)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.conversations = 0
+        self.errors = 0
+        self.last_error = None
+
+    def turn(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def conversation(self):
+        with self._lock:
+            self.conversations += 1
+
+    def error(self, error: Exception):
+        with self._lock:
+            self.errors += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+
+
+def customer(url: str, number: int, deadline: float, result: LevelResult):
+    """Klient kawiarni - kolejne rozmowy z korpusu, każda w nowej sesji"""
+    conversation_index = number
+    while time.monotonic() < deadline:
+        conversation = CORPUS[conversation_index % len(CORPUS)]
+        conversation_index += 1
+        try:
+            # Nowy klient Gradio to nowa sesja (jak nowa karta przeglądarki)
+            client = Client(url, verbose=False)
+            history = []
+            for message in conversation:
+                start = time.perf_counter()
+                outputs = client.predict(message, history, api_name="/chat")
+                result.turn(time.perf_counter() - start)
+                history = outputs[1]
+                if time.monotonic() >= deadline:
+                    break
+            else:
+                result.conversation()
+        except Exception as error:
+            result.error(error)
+
+
+def run_level(url: str, concurrency: int, duration: float) -> Dict:
+    """Uruchamia concurrency klientów na duration sekund"""
+    result = LevelResult()
+    start = time.perf_counter()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=customer, args=(url, number, deadline, result), daemon=True
+        )
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    turns = len(result.latencies)
+    attempts = turns + result.errors
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "turns": turns,
+        "conversations": result.conversations,
+        "turns_per_sec": round(turns / elapsed, 3),
+        "errors": result.errors,
+        "error_rate": round(result.errors / attempts, 4) if attempts else 0.0,
+        "last_error": result.last_error,
+        "turn_latency": summarize(result.latencies) if turns else {"count": 0},
+    }
+
+
+def find_saturation(levels: List[Dict], args) -> Dict:
+    """Wyznacza poziom nasycenia i ostatni poziom przed nim (pojemność).
+
+    Nasycenie to pierwszy poziom, na którym przepustowość przestaje rosnąć,
+    p95 czasu tury przekracza limit albo odsetek błędów przekracza próg.
+    """
+    best, saturated, reasons = None, None, []
+    for level in levels:
+        reasons = []
+        if level["error_rate"] > args.max_error_rate:
+            reasons.append("error_rate")
+        p95 = level["turn_latency"].get("p95_ms", 0.0)
+        if args.slo_ms and p95 > args.slo_ms:
+            reasons.append("p95_latency")
+        if best is not None and level["turns_per_sec"] < best["turns_per_sec"] * (
+            1 + args.min_gain
+        ):
+            reasons.append("throughput")
+        if reasons:
+            saturated = level
+            break
+        best = level
+    return {
+        "saturated": saturated is not None,
+        "saturation_concurrency": saturated["concurrency"] if saturated else None,
+        "reasons": reasons,
+        "capacity_concurrency": best["concurrency"] if best else None,
+        "capacity_turns_per_sec": best["turns_per_sec"] if best else 0.0,
+    }
+
+
+def wait_for_server(url: str, timeout: float):
+    """Czeka, aż serwer Gradio zacznie odpowiadać"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=2.0)
+            return
+        except httpx.HTTPError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+
+
+def launch_app(args) -> subprocess.Popen:
+    """Uruchamia serwer mock API OpenAI i aplikację (main.py) wskazującą na niego"""
+    mock = start_mock_server(
+        port=args.mock_port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    host, port = mock.server_address
+    environment = dict(
+        os.environ,
+        OPENAI_BASE_URL=f"http://{host}:{port}/v1",
+        OPENAI_API_KEY="mock",
+    )
+    if args.guardrail_batching:
+        environment["GUARDRAIL_BATCHING"] = "1"
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    return subprocess.Popen(
+        [sys.executable, main],
+        env=environment,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--url", default="http://127.0.0.1:7860")
+    parser.add_argument(
+        "--concurrency",
+        default="1,2,4,8,16,32",
+        help="poziomy współbieżności (liczba klientów) oddzielone przecinkami",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="czas jednego poziomu [s]"
+    )
+    parser.add_argument(
+        "--slo-ms", type=float, default=0.0, help="limit p95 czasu tury [ms]"
+    )
+    parser.add_argument(
+        "--max-error-rate",
+        type=float,
+        default=0.01,
+        help="dopuszczalny odsetek błędów",
+    )
+    parser.add_argument(
+        "--min-gain",
+        type=float,
+        default=0.1,
+        help="minimalny wzrost przepustowości na kolejnym poziomie",
+    )
+    parser.add_argument("--output", help="zapis wyników do pliku JSON")
+    parser.add_argument(
+        "--launch",
+        action="store_true",
+        help="uruchom serwer mock API OpenAI i aplikację na czas testu",
+    )
+    parser.add_argument("--mock-port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--guardrail-batching",
+        action="store_true",
+        help="zbiorcza walidacja guardraila w uruchomionej aplikacji (z --launch)",
+    )
+    args = parser.parse_args()
+
+    app = launch_app(args) if args.launch else None
+    try:
+        wait_for_server(args.url, args.startup_timeout)
+        levels = []
+        for concurrency in map(int, args.concurrency.split(",")):
+            level = run_level(args.url, concurrency, args.duration)
+            levels.append(level)
+            print(
+                f"👥 {concurrency:>4} klientów: {level['turns_per_sec']} tur/s, "
+                f"p95 {level['turn_latency'].get('p95_ms', 0.0)} ms, "
+                f"błędy {level['error_rate']:.2%}",
+                file=sys.stderr,
+            )
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait()
+
+    result = {
+        "url": args.url,
+        "duration": args.duration,
+        "levels": levels,
+        "saturation": find_saturation(levels, args),
+    }
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
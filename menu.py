@@ -0,0 +1,263 @@
+import copy
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+from config import CFG, MENU_FIELDS, get_menu, menu_version
+from fast_path import OrderMatcher
+from guardrail import menu_words
+from menu_index import MenuIndex, display_name
+from pricing import PriceTable
+from prompts import PromptSet
+
+
+# Pola pliku menu, które mogą zostać pominięte (wartość domyślna)
+_OPTIONAL_FIELDS = {"DRINK_NAMES": {}}
+
+
+class MenuError(ValueError):
+    """Niepoprawny plik menu"""
+
+
+def _check_prices(prices: Dict, what: str):
+    for name, price in prices.items():
+        valid = isinstance(price, (int, float)) and not isinstance(price, bool)
+        if not valid or price < 0:
+            raise MenuError(f"niepoprawna cena {what} {name}: {price!r}")
+
+
+def validate_menu(data: SimpleNamespace):
+    """Sprawdza spójność menu - błędne menu nie może zastąpić działającego"""
+    sizes = set(data.SIZES)
+    if not sizes or set(data.SIZE_NAMES) != sizes:
+        raise MenuError("każdy rozmiar musi mieć nazwę w size_names")
+    for drink, prices in data.DRINK_PRICES.items():
+        if not prices or not set(prices) <= sizes:
+            raise MenuError(f"nieznany rozmiar w cenniku napoju {drink}")
+        _check_prices(prices, f"napoju {drink}")
+    _check_prices(data.ADDON_PRICES, "dodatku")
+
+    listed = {drink for drinks in data.AVAILABLE_DRINKS.values() for drink in drinks}
+    unpriced = sorted((listed | set(data.DRINK_NAMES)) - set(data.DRINK_PRICES))
+    if unpriced:
+        raise MenuError(f"napoje bez ceny: {', '.join(unpriced)}")
+    for substitution, original in data.SUBSTITUTIONS.items():
+        if original not in data.ADDON_PRICES:
+            raise MenuError(f"zamiennik {substitution} zastępuje nieznany dodatek")
+
+
+def default_menu() -> SimpleNamespace:
+    """Zwraca kopię menu zapisanego w CFG"""
+    return SimpleNamespace(
+        **{field: copy.deepcopy(getattr(CFG, field)) for field in MENU_FIELDS}
+    )
+
+
+def load_menu(path: str) -> SimpleNamespace:
+    """Wczytuje i sprawdza menu z pliku JSON (klucze jak pola CFG, małymi literami)"""
+    with open(path, encoding="utf-8") as menu_file:
+        raw = json.load(menu_file)
+    if not isinstance(raw, dict):
+        raise MenuError("plik menu musi zawierać obiekt JSON")
+
+    fields = {}
+    for field in MENU_FIELDS:
+        if field.lower() in raw:
+            fields[field] = raw[field.lower()]
+        elif field in _OPTIONAL_FIELDS:
+            fields[field] = copy.deepcopy(_OPTIONAL_FIELDS[field])
+        else:
+            raise MenuError(f"brak pola {field.lower()}")
+    data = SimpleNamespace(**fields)
+    try:
+        validate_menu(data)
+    except (AttributeError, TypeError) as error:
+        raise MenuError(f"niepoprawna struktura menu: {error}") from error
+    return data
+
+
+def export_menu(path: str, data: SimpleNamespace = None):
+    """Zapisuje menu (domyślnie z CFG) do pliku JSON - atomowo"""
+    data = data or default_menu()
+    payload = {field.lower(): getattr(data, field) for field in MENU_FIELDS}
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as menu_file:
+        json.dump(payload, menu_file, indent=2, ensure_ascii=False)
+        menu_file.write("\n")
+    os.replace(temporary, path)
+
+
+class Menu:
+    """Jedna wersja menu razem ze wszystkim, co z niej wynika.
+
+    Obiekt nie jest zmieniany po zbudowaniu - przeładowanie tworzy nowy.
+    """
+
+    def __init__(self, data: SimpleNamespace, number: int, source: str = None):
+        start = time.perf_counter()
+        self.data = data
+        self.number = number
+        self.source = source
+        self.digest = menu_version(data)
+        self.markdown = get_menu(data)
+        self.prompts = PromptSet(self.digest, data)
+        self.prices = PriceTable(self.digest, data)
+        self.index = MenuIndex(self.digest, data)
+        self.matcher = OrderMatcher(data)
+        self.guardrail_words = menu_words(data)
+        self.loaded = time.time()
+        self.build_seconds = time.perf_counter() - start
+
+    def display_name(self, drink: str) -> str:
+        """Zwraca pełną nazwę napoju z tej wersji menu"""
+        return display_name(drink, self.data)
+
+
+class MenuStore:
+    """Aktualne menu wczytywane z pliku i przeładowywane po zmianie pliku.
+
+    Nowa wersja jest budowana w całości obok bieżącej i podmieniana jednym
+    przypisaniem. Tura rozmowy trzyma referencję do menu, z którym się
+    zaczęła, więc kończy się na tej samej wersji.
+    """
+
+    def __init__(self, path: str = None, check_interval: float = None):
+        self.path = path if path is not None else CFG.menu_path
+        self.check_interval = (
+            check_interval if check_interval is not None else CFG.menu_check_interval
+        )
+        self._current: Optional[Menu] = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+
+    def current(self) -> Menu:
+        """Zwraca bieżącą wersję menu (wczytuje ją przy pierwszym użyciu)"""
+        menu = self._current
+        if menu is None:
+            self.reload()
+            menu = self._current
+        return menu
+
+    def _file_stamp(self):
+        """Zwraca (mtime, rozmiar) pliku menu lub None, gdy pliku nie ma"""
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force: bool = False) -> bool:
+        """Przeładowuje menu, jeśli plik się zmienił - zwraca True po podmianie"""
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._current is not None and stamp == self._stamp and not force:
+                return False
+            number = self._current.number + 1 if self._current else 1
+
+            try:
+                if stamp is None:
+                    menu = Menu(default_menu(), number)
+                else:
+                    menu = Menu(load_menu(self.path), number, self.path)
+            except (OSError, ValueError) as error:
+                # Błędny plik nie zastępuje działającego menu (ponowna próba
+                # dopiero po kolejnej zmianie pliku)
+                self._stamp = stamp
+                self.failures += 1
+                self.last_error = str(error)
+                if self._current is None:
+                    self._current = Menu(default_menu(), number)
+                return False
+
+            self._stamp = stamp
+            if self._current is not None and menu.digest == self._current.digest:
+                # Zmieniony plik z tym samym menu - bez nowej wersji
+                return False
+            if self._current is not None:
+                self.reloads += 1
+            self.last_error = None
+            self._current = menu
+            return True
+
+    def _watch_loop(self):
+        """Pętla wątku sprawdzającego zmiany pliku menu"""
+        while not self._stop.wait(self.check_interval):
+            self.reload()
+
+    def start_watching(self):
+        """Uruchamia sprawdzanie zmian pliku menu w wątku w tle"""
+        self.current()
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(
+                target=self._watch_loop, name="menu-watcher", daemon=True
+            )
+            self._watcher.start()
+
+    def stop_watching(self):
+        """Zatrzymuje sprawdzanie zmian pliku menu"""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def snapshot(self) -> Dict:
+        """Zwraca bieżącą wersję menu i statystyki przeładowań"""
+        menu = self.current()
+        return {
+            "number": menu.number,
+            "digest": menu.digest,
+            "source": menu.source,
+            "loaded": menu.loaded,
+            "build_ms": menu.build_seconds * 1e3,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+# Menu całego procesu
+MENU_STORE = MenuStore()
+
+
+def current_menu() -> Menu:
+    """Zwraca bieżącą wersję menu"""
+    return MENU_STORE.current()
+
+
+if __name__ == "__main__":
+    # Sprawdzenie pliku menu: python menu.py [ścieżka]
+    # Zapis menu z CFG do pliku: python menu.py --export [ścieżka]
+    arguments = sys.argv[1:]
+    export = bool(arguments) and arguments[0] == "--export"
+    if export:
+        arguments = arguments[1:]
+    path = arguments[0] if arguments else CFG.menu_path
+    if export:
+        export_menu(path)
+    menu = Menu(load_menu(path), 1, path)
+    print(
+        json.dumps(
+            {
+                "source": path,
+                "digest": menu.digest,
+                "drinks": len(menu.data.DRINK_PRICES),
+                "addons": len(menu.data.ADDON_PRICES),
+                "build_ms": round(menu.build_seconds * 1e3, 3),
+            },
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
@@ -0,0 +1,234 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import CFG
+from fast_path import (
+    ADDON,
+    DRINK,
+    SIZE,
+    SUBSTITUTION,
+    adjective_forms,
+    fold,
+    phrase_forms,
+)
+
+
+# Sposoby dopasowania nazwy do klucza menu
+EXACT = "exact"
+STEM = "stem"
+FUZZY = "fuzzy"
+MISS = "miss"
+
+# Końcówki fleksyjne (bez znaków diakrytycznych), najdłuższe najpierw
+_SUFFIXES = (
+    "owego", "owemu", "owych", "owym", "owej", "owa", "owe", "owy", "ami",
+    "ach", "ego", "emu", "iem", "ych", "ymi", "imi", "ej", "em", "om", "ym",
+    "im", "a", "e", "i", "o", "u", "y",
+)
+_MIN_STEM = 3
+
+# Słowa pomijane przy dopasowaniu ("z mlekiem", "kawa latte")
+_STOPWORDS = frozenset(("z", "ze", "w", "o", "i"))
+
+# Znacznik końca klucza w drzewie trie (znaki klucza są jednoliterowe)
+_END = ""
+
+
+def stem(word: str) -> str:
+    """Odcina polskie końcówki fleksyjne (słowo bez znaków diakrytycznych)"""
+    stripped = True
+    while stripped and len(word) > _MIN_STEM:
+        stripped = False
+        for suffix in _SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+                word = word[: -len(suffix)]
+                stripped = True
+                break
+    return word
+
+
+def display_name(drink: str, menu=None) -> str:
+    """Zwraca pełną nazwę napoju do podsumowania (np. "czarna herbata")"""
+    return (menu or CFG).DRINK_NAMES.get(drink, drink)
+
+
+class MenuIndex:
+    """Indeks nazw z menu zbudowany raz na wersję menu.
+
+    Nazwa jest szukana kolejno: dokładnie (znane formy odmiany, bez znaków
+    diakrytycznych), po rdzeniach słów (bez końcówek fleksyjnych) i z limitem
+    literówek w drzewie trie rdzeni.
+    """
+
+    def __init__(self, version: str, menu=None):
+        self.version = version
+        menu = menu or CFG
+        self._lock = threading.Lock()
+        self._cache = {}
+
+        # Nazwy kategorii ("kawa", "herbata") nie odróżniają napojów, ale
+        # zawężają je - rdzeń kategorii -> napoje tej kategorii
+        # ("napoje zimne" zawęża tylko słowo "zimne" - "napój" pasuje do każdego)
+        generic = stem("napoj")
+        self._category_drinks = {}
+        for category, drinks in menu.AVAILABLE_DRINKS.items():
+            for word in map(stem, fold(category).split()):
+                if word != generic:
+                    known = self._category_drinks.get(word, frozenset())
+                    self._category_drinks[word] = known | frozenset(drinks)
+        self._categories = frozenset(self._category_drinks) | {generic}
+
+        # Rodzaj -> forma nazwy -> klucz menu
+        names = {
+            DRINK: {drink: phrase_forms(drink) for drink in menu.DRINK_PRICES},
+            SIZE: {
+                size: [size] + adjective_forms(menu.SIZE_NAMES[size])
+                for size in menu.SIZES
+            },
+            ADDON: {addon: phrase_forms(addon) for addon in menu.ADDON_PRICES},
+            SUBSTITUTION: {
+                substitution: phrase_forms(substitution)
+                for substitution in menu.SUBSTITUTIONS
+            },
+        }
+        for drink, name in menu.DRINK_NAMES.items():
+            names[DRINK][drink] = names[DRINK][drink] + phrase_forms(name)
+
+        self.exact = {kind: {} for kind in names}
+        self.stems = {kind: {} for kind in names}
+        self.tries = {kind: {} for kind in names}
+        for kind, forms_by_key in names.items():
+            for key, forms in forms_by_key.items():
+                for form in forms:
+                    self.exact[kind].setdefault(" ".join(fold(form).split()), key)
+                    stem_key = self._stem_key(kind, fold(form))
+                    if stem_key:
+                        self.stems[kind].setdefault(stem_key, set()).add(key)
+                        self._insert(self.tries[kind], stem_key, key)
+
+    def _stem_key(self, kind: str, folded: str) -> str:
+        """Zwraca posortowane rdzenie słów nazwy (kolejność słów bez znaczenia)"""
+        stems = [stem(word) for word in folded.split() if word not in _STOPWORDS]
+        if kind == DRINK:
+            specific = [word for word in stems if word not in self._categories]
+            stems = specific or stems
+        return " ".join(sorted(stems))
+
+    @staticmethod
+    def _insert(trie: Dict, text: str, key: str):
+        node = trie
+        for char in text:
+            node = node.setdefault(char, {})
+        node.setdefault(_END, set()).add(key)
+
+    @staticmethod
+    def _search(trie: Dict, text: str, max_distance: int) -> Optional[str]:
+        """Szuka klucza w odległości edycyjnej max_distance (tylko jednoznacznie)"""
+        best, found = max_distance, set()
+        stack = [(trie, list(range(len(text) + 1)))]
+        while stack:
+            node, previous = stack.pop()
+            for char, child in node.items():
+                if char == _END:
+                    continue
+                # Kolejny wiersz macierzy odległości Levenshteina
+                row = [previous[0] + 1]
+                for column in range(1, len(text) + 1):
+                    cost = text[column - 1] != char
+                    row.append(
+                        min(
+                            row[-1] + 1,
+                            previous[column] + 1,
+                            previous[column - 1] + cost,
+                        )
+                    )
+                if _END in child and row[-1] <= best:
+                    if row[-1] < best:
+                        best, found = row[-1], set()
+                    found |= child[_END]
+                # Gałąź jest przeszukiwana, dopóki może dać wynik w limicie
+                if min(row) <= best:
+                    stack.append((child, row))
+        return next(iter(found)) if len(found) == 1 else None
+
+    def _matches_category(self, folded: str, drink: str) -> bool:
+        """Sprawdza czy kategoria w nazwie ("czarna kawa") zgadza się z napojem"""
+        return all(
+            drink in self._category_drinks.get(stem(word), (drink,))
+            for word in folded.split()
+        )
+
+    def _lookup(self, kind: str, text: str) -> Tuple[Optional[str], str]:
+        folded = " ".join(fold(text).split())
+        key, method = self._find(kind, folded)
+        # "czarna kawa" nie jest czarną herbatą - sprzeczna kategoria to MISS
+        if key is not None and kind == DRINK:
+            if not self._matches_category(folded, key):
+                return None, MISS
+        return key, method
+
+    def _find(self, kind: str, folded: str) -> Tuple[Optional[str], str]:
+        key = self.exact[kind].get(folded)
+        if key is not None:
+            return key, EXACT
+
+        stem_key = self._stem_key(kind, folded)
+        if not stem_key:
+            return None, MISS
+        keys = self.stems[kind].get(stem_key)
+        if keys:
+            return (next(iter(keys)), STEM) if len(keys) == 1 else (None, MISS)
+
+        # Krótkie nazwy bez literówek, dłuższe z limitem zależnym od długości
+        max_distance = min(CFG.menu_index_max_distance, len(stem_key) // 4)
+        if max_distance:
+            key = self._search(self.tries[kind], stem_key, max_distance)
+            if key is not None:
+                return key, FUZZY
+        return None, MISS
+
+    def resolve(self, kind: str, text) -> Optional[str]:
+        """Zwraca klucz menu dla nazwy (DRINK, SIZE, ADDON, SUBSTITUTION) lub None"""
+        if not isinstance(text, str) or not text.strip():
+            return None
+        start = time.perf_counter()
+        cached = self._cache.get((kind, text))
+        if cached is None:
+            cached = self._lookup(kind, text)
+            with self._lock:
+                if len(self._cache) >= CFG.menu_index_cache_size:
+                    self._cache.clear()
+                self._cache[(kind, text)] = cached
+        MENU_INDEX_STATS.record(cached[1], time.perf_counter() - start)
+        return cached[0]
+
+
+class MenuIndexStats:
+    """Statystyki dopasowania nazw do kluczy menu"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys((EXACT, STEM, FUZZY, MISS), 0)
+        self.total_seconds = 0.0
+
+    def record(self, method: str, seconds: float):
+        """Zapisuje sposób dopasowania i czas wyszukiwania"""
+        with self._lock:
+            self.counts[method] += 1
+            self.total_seconds += seconds
+
+    def snapshot(self) -> Dict:
+        """Zwraca bieżące statystyki"""
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "miss_rate": self.counts[MISS] / total if total else 0.0,
+                "avg_latency_us": (
+                    self.total_seconds / total * 1e6 if total else 0.0
+                ),
+            }
+
+
+MENU_INDEX_STATS = MenuIndexStats()
@@ -0,0 +1,163 @@
+import json
+import os
+import uuid
+import zlib
+from collections import deque
+from typing import Dict, List, Optional
+
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    messages_from_dict,
+    messages_to_dict,
+)
+
+from config import CFG
+
+
+class MessageWindow:
+    """Historia wiadomości z oknem ostatnich tur w pamięci.
+
+    Starsze tury trafiają do archiwum: skompresowanego w pamięci
+    lub do pliku JSONL. Pełna historia jest dostępna przez transcript().
+    """
+
+    def __init__(self, max_turns: int = None, archive_path: str = None):
+        self.max_turns = max_turns or CFG.message_window_turns
+        self.archive_path = archive_path
+        self._recent = deque()
+        self._turns = 0
+        self._archive = []
+        self.archived = 0
+        self.total = 0
+        # Liczba fragmentów archiwum w pamięci zapisanych już w checkpoincie
+        self.checkpointed_chunks = 0
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    def __iter__(self):
+        return iter(self._recent)
+
+    def __getitem__(self, index: int) -> BaseMessage:
+        return self._recent[index]
+
+    def append(self, message: BaseMessage):
+        """Dodaje wiadomość i archiwizuje tury wykraczające poza okno"""
+        self._recent.append(message)
+        self.total += 1
+        if isinstance(message, HumanMessage):
+            self._turns += 1
+            if self._turns > self.max_turns:
+                self._archive_oldest_turn()
+
+    def extend(self, messages: List[BaseMessage]):
+        """Dodaje wiele wiadomości"""
+        for message in messages:
+            self.append(message)
+
+    def _archive_oldest_turn(self):
+        """Przenosi najstarszą turę (wiadomość klienta i odpowiedzi) do archiwum"""
+        turn = [self._recent.popleft()]
+        while self._recent and not isinstance(self._recent[0], HumanMessage):
+            turn.append(self._recent.popleft())
+        self._turns -= 1
+        self.archived += len(turn)
+
+        records = messages_to_dict(turn)
+        if self.archive_path:
+            with open(self.archive_path, "a", encoding="utf-8") as archive:
+                for record in records:
+                    archive.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            payload = json.dumps(records, ensure_ascii=False).encode("utf-8")
+            self._archive.append(zlib.compress(payload))
+
+    def _archived_records(self) -> List[Dict]:
+        """Odczytuje zarchiwizowane wiadomości"""
+        if self.archive_path:
+            if not os.path.exists(self.archive_path):
+                return []
+            with open(self.archive_path, encoding="utf-8") as archive:
+                return [json.loads(line) for line in archive if line.strip()]
+        records = []
+        for chunk in self._archive:
+            records.extend(json.loads(zlib.decompress(chunk)))
+        return records
+
+    def mark(self) -> int:
+        """Zwraca liczbę wszystkich dodanych wiadomości"""
+        return self.total
+
+    def since(self, mark: int) -> List[BaseMessage]:
+        """Zwraca wiadomości dodane po danym znaczniku"""
+        start = self.total - len(self._recent)
+        return list(self._recent)[max(mark - start, 0) :]
+
+    def fork(self) -> "MessageWindow":
+        """Tworzy kopię okna (bez archiwum) do pracy spekulatywnej"""
+        forked = MessageWindow(self.max_turns)
+        forked._recent = deque(self._recent)
+        forked._turns = self._turns
+        forked.total = self.total
+        return forked
+
+    def export_window(self) -> Dict:
+        """Zwraca okno ostatnich tur i liczniki archiwum (bez treści archiwum)"""
+        return {
+            "recent": messages_to_dict(list(self._recent)),
+            "turns": self._turns,
+            "total": self.total,
+            "archived": self.archived,
+            "chunks": len(self._archive),
+        }
+
+    def new_archive_chunks(self) -> List[bytes]:
+        """Zwraca skompresowane fragmenty archiwum jeszcze niezapisane w checkpoincie"""
+        chunks = self._archive[self.checkpointed_chunks :]
+        self.checkpointed_chunks = len(self._archive)
+        return chunks
+
+    def restore_window(self, data: Dict, chunks: List[bytes] = ()):
+        """Odtwarza okno i archiwum w pamięci z checkpointu"""
+        self._recent = deque(messages_from_dict(data["recent"]))
+        self._turns = data["turns"]
+        self.total = data["total"]
+        self.archived = data["archived"]
+        if not self.archive_path:
+            self._archive = list(chunks)[: data["chunks"]]
+            self.checkpointed_chunks = len(self._archive)
+
+    def transcript(self) -> List[BaseMessage]:
+        """Zwraca pełną historię rozmowy (archiwum i okno)"""
+        return messages_from_dict(self._archived_records()) + list(self._recent)
+
+    def export(self) -> List[Dict]:
+        """Zwraca pełną historię rozmowy jako listę słowników"""
+        return self._archived_records() + messages_to_dict(list(self._recent))
+
+
+def create_message_window(
+    session_id: Optional[str] = None, reset: bool = False
+) -> MessageWindow:
+    """Tworzy historię wiadomości z archiwum w pamięci lub na dysku.
+
+    Archiwum sesji na dysku jest zachowywane (wznowienie sesji, ponowne
+    utworzenie agenta po usunięciu z rejestru) - reset=True je czyści.
+    """
+    archive_path = None
+    archived = 0
+    if CFG.message_archive_dir:
+        os.makedirs(CFG.message_archive_dir, exist_ok=True)
+        # Sesje bez identyfikatora nie mogą dzielić jednego archiwum
+        name = session_id or f"anonymous-{uuid.uuid4().hex}"
+        archive_path = os.path.join(CFG.message_archive_dir, f"{name}.jsonl")
+        if reset:
+            open(archive_path, "w").close()
+        elif os.path.exists(archive_path):
+            with open(archive_path, "rb") as archive:
+                archived = sum(1 for line in archive if line.strip())
+
+    window = MessageWindow(CFG.message_window_turns, archive_path)
+    window.archived = window.total = archived
+    return window
@@ -0,0 +1,387 @@
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Tuple
+
+from business_metrics import BUSINESS_METRICS
+from config import CFG
+from fast_path import FAST_PATH_STATS
+from guardrail import ALLOW, DENY, PREFILTER_STATS, UNCERTAIN
+from guardrail_batch import BATCH_STATS, REASONS
+from llm_output import DECODE_STATS
+from menu import MENU_STORE
+from menu_index import EXACT, FUZZY, MENU_INDEX_STATS, MISS, STEM
+from prompts import PROMPT_STATS
+from response_cache import RESPONSE_CACHE
+from usage import USAGE
+
+
+# Progi histogramów czasu [s] - od lokalnych kroków po wywołania LLM'a
+LATENCY_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Pomiary są zbierane tylko po włączeniu (np. przy starcie serwera /metrics)
+_enabled = False
+
+# Czas wywołań LLM'a w bieżącym węźle (odejmowany od czasu węzła)
+_llm_elapsed: ContextVar = ContextVar("llm_elapsed", default=None)
+
+_registry: List["Metric"] = []
+_collectors: List[Callable[[], List[Tuple]]] = []
+
+
+def enable(enabled: bool = True):
+    """Włącza lub wyłącza zbieranie pomiarów"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    """Sprawdza czy pomiary są zbierane"""
+    return _enabled
+
+
+def _format_labels(names: Tuple, values: Tuple, extra: str = "") -> str:
+    """Formatuje etykiety w składni Prometheusa"""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Metryka z etykietami przechowywana w pamięci procesu"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labels: Tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        """Zwraca linie w formacie tekstowym Prometheusa"""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+    def _render_value(self, label_values: Tuple, value) -> List[str]:
+        labels = _format_labels(self.labels, label_values)
+        return [f"{self.name}{labels} {value}"]
+
+
+class Counter(Metric):
+    """Licznik zdarzeń"""
+
+    kind = "counter"
+
+    def inc(self, *label_values, amount: float = 1):
+        """Zwiększa licznik dla podanych etykiet"""
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Histogram(Metric):
+    """Histogram wartości (np. czasu) z ustalonymi progami"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Tuple = (),
+        buckets: Tuple = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *label_values):
+        """Zapisuje pomiar dla podanych etykiet"""
+        if not _enabled:
+            return
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                # [liczniki przedziałów (z +Inf), suma, liczba pomiarów]
+                buckets = [0] * (len(self.buckets) + 1)
+                entry = self._values[label_values] = [buckets, 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Mierzy czas wykonania bloku"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def _render_value(self, label_values: Tuple, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket in zip(self.buckets + ("+Inf",), counts):
+            cumulative += bucket
+            labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labels, label_values)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# Metryki aplikacji
+NODE_SECONDS = Histogram(
+    "coffee_node_seconds", "Czas wykonania węzła grafu", ("node",)
+)
+NODE_LOCAL_SECONDS = Histogram(
+    "coffee_node_local_seconds", "Czas węzła bez oczekiwania na LLM'a", ("node",)
+)
+LLM_SECONDS = Histogram(
+    "coffee_llm_seconds", "Czas wywołania LLM'a z węzła", ("node",)
+)
+ROUTES = Counter(
+    "coffee_route_decisions_total",
+    "Decyzje warunkowych krawędzi grafu",
+    ("route", "decision"),
+)
+CHAT_SECONDS = Histogram(
+    "coffee_chat_seconds", "Czas obsługi wiadomości przez agenta", ("mode",)
+)
+GUI_SECONDS = Histogram(
+    "coffee_gui_seconds", "Czas obsługi zdarzenia interfejsu", ("handler",)
+)
+RENDER_SECONDS = Histogram(
+    "coffee_render_seconds", "Czas renderowania panelu interfejsu", ("panel",)
+)
+
+
+@contextmanager
+def llm_timer(node: str):
+    """Mierzy czas wywołania LLM'a w węźle"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        LLM_SECONDS.observe(elapsed, node)
+        spent = _llm_elapsed.get()
+        if spent is not None:
+            spent[0] += elapsed
+
+
+def _accepts_config(func: Callable) -> bool:
+    """Sprawdza czy węzeł przyjmuje konfigurację wywołania"""
+    return "config" in inspect.signature(func).parameters
+
+
+def _observe_node(node: str, start: float, spent: List[float]):
+    """Zapisuje czas węzła i jego część lokalną"""
+    elapsed = time.perf_counter() - start
+    NODE_SECONDS.observe(elapsed, node)
+    NODE_LOCAL_SECONDS.observe(max(elapsed - spent[0], 0.0), node)
+
+
+def timed_node(node: str, func: Callable) -> Callable:
+    """Opakowuje synchroniczny węzeł grafu pomiarem czasu"""
+    with_config = _accepts_config(func)
+
+    @wraps(func)
+    def wrapper(state, config=None):
+        spent = [0.0]
+        token = _llm_elapsed.set(spent)
+        start = time.perf_counter()
+        try:
+            return func(state, config) if with_config else func(state)
+        finally:
+            _observe_node(node, start, spent)
+            _llm_elapsed.reset(token)
+
+    return wrapper
+
+
+def atimed_node(node: str, func: Callable) -> Callable:
+    """Opakowuje asynchroniczny węzeł grafu pomiarem czasu"""
+    with_config = _accepts_config(func)
+
+    @wraps(func)
+    async def wrapper(state, config=None):
+        spent = [0.0]
+        token = _llm_elapsed.set(spent)
+        start = time.perf_counter()
+        try:
+            return await (func(state, config) if with_config else func(state))
+        finally:
+            _observe_node(node, start, spent)
+            _llm_elapsed.reset(token)
+
+    return wrapper
+
+
+def counted_route(route: str, func: Callable) -> Callable:
+    """Opakowuje funkcję routingu licznikiem decyzji"""
+
+    @wraps(func)
+    def wrapper(state):
+        decision = func(state)
+        ROUTES.inc(route, decision)
+        return decision
+
+    return wrapper
+
+
+def register_collector(collector: Callable[[], List[Tuple]]):
+    """Rejestruje funkcję zwracającą pomiary (nazwa, etykiety, wartość)"""
+    _collectors.append(collector)
+
+
+def _stats_collector() -> List[Tuple]:
+    """Zamienia statystyki modułów aplikacji na metryki (liczone przy odczycie)"""
+    samples = []
+    for node, stats in DECODE_STATS.snapshot().items():
+        for outcome in ("clean", "repaired", "fallback"):
+            labels = {"node": node, "outcome": outcome}
+            samples.append(("coffee_decode_total", labels, stats[outcome]))
+    for node, stats in PROMPT_STATS.snapshot().items():
+        labels = {"node": node}
+        samples.append(("coffee_prompt_tokens_total", labels, stats["prompt_tokens"]))
+        samples.append(
+            ("coffee_prompt_cached_tokens_total", labels, stats["cached_tokens"])
+        )
+
+    business = BUSINESS_METRICS.totals()
+    samples.append(("coffee_orders_total", {}, business["orders_completed"]))
+    samples.append(("coffee_revenue_pln_total", {}, business["total_revenue"]))
+    samples.append(("coffee_items_sold_total", {}, business["items_sold"]))
+
+    usage = USAGE.snapshot()
+    for node, counts in usage["nodes"].items():
+        for kind in ("input", "cached", "output"):
+            labels = {"node": node, "kind": kind}
+            value = counts[f"{kind}_tokens"]
+            samples.append(("coffee_llm_tokens_total", labels, value))
+        labels = {"node": node}
+        samples.append(("coffee_llm_cost_usd_total", labels, counts["cost_usd"]))
+
+    fast_path = FAST_PATH_STATS.snapshot()
+    samples.append(("coffee_fast_path_hits_total", {}, fast_path["hits"]))
+    samples.append(("coffee_fast_path_misses_total", {}, fast_path["misses"]))
+
+    menu = MENU_STORE.snapshot()
+    samples.append(("coffee_menu_version", {}, menu["number"]))
+    samples.append(("coffee_menu_reloads_total", {}, menu["reloads"]))
+    samples.append(("coffee_menu_reload_failures_total", {}, menu["failures"]))
+
+    menu_index = MENU_INDEX_STATS.snapshot()
+    for method in (EXACT, STEM, FUZZY, MISS):
+        labels = {"method": method}
+        samples.append(("coffee_menu_index_lookups_total", labels, menu_index[method]))
+
+    prefilter = PREFILTER_STATS.snapshot()
+    for verdict in (ALLOW, DENY, UNCERTAIN):
+        labels = {"verdict": verdict}
+        samples.append(("coffee_prefilter_total", labels, prefilter[verdict]))
+
+    batching = BATCH_STATS.snapshot()
+    samples.append(("coffee_guardrail_batches_total", {}, batching["batches"]))
+    samples.append(("coffee_guardrail_llm_requests_total", {}, batching["requests"]))
+    samples.append(
+        ("coffee_guardrail_requests_saved_total", {}, batching["requests_saved"])
+    )
+    tokens = batching["batch_prompt_tokens"]
+    samples.append(("coffee_guardrail_batch_prompt_tokens_total", {}, tokens))
+    for reason in REASONS:
+        labels = {"reason": reason}
+        value = batching["singles"][reason]
+        samples.append(("coffee_guardrail_single_requests_total", labels, value))
+
+    cache = RESPONSE_CACHE.snapshot()
+    for name in ("hits", "misses", "evictions", "expirations"):
+        samples.append((f"coffee_response_cache_{name}_total", {}, cache[name]))
+    samples.append(("coffee_response_cache_entries", {}, cache["entries"]))
+    samples.append(("coffee_response_cache_bytes", {}, cache["bytes"]))
+    return samples
+
+
+register_collector(_stats_collector)
+
+
+def render() -> str:
+    """Zwraca wszystkie metryki w formacie tekstowym Prometheusa"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, labels, value in collector():
+            label_text = _format_labels(tuple(labels), tuple(labels.values()))
+            lines.append(f"{name}{label_text} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Obsługa zapytań GET /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Odczyty metryk nie zaśmiecają logu aplikacji
+        pass
+
+
+def start_server(port: int = None, host: str = None) -> ThreadingHTTPServer:
+    """Włącza pomiary i uruchamia serwer /metrics w wątku w tle"""
+    port = port if port is not None else CFG.metrics_port
+    host = host or CFG.metrics_host
+    enable()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    )
+    thread.start()
+    return server
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Lokalny serwer zgodny z API OpenAI (chat completions) do testów obciążeniowych.
+
+Odpowiada regułami fałszywego modelu (fake_llm.py) z zadanym opóźnieniem,
+rozrzutem i odsetkiem błędów. Aplikacja korzysta z niego bez zmian w kodzie:
+
+    python mock_openai_server.py --port 8001 --latency 0.4 --jitter 0.2
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python main.py
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+# Dodaj katalog główny do ścieżki Pythona
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import convert_to_messages
+
+from config import CFG
+from fake_llm import FakeChatModel
+
+# Oznaczenie odpowiedzi serwera (np. w metadanych kaset LLM'a)
+FINGERPRINT = "mock_openai_server:fake_llm"
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """Serwer HTTP udający API OpenAI - każde zapytanie obsługuje osobny wątek"""
+
+    daemon_threads = True
+    # Domyślna kolejka połączeń (5) opóźnia odpowiedzi przy wielu klientach
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        address,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__(address, _MockHandler)
+        self.model = FakeChatModel(latency=latency, jitter=jitter, seed=seed)
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+
+    def should_fail(self) -> bool:
+        """Losuje, czy zapytanie ma zakończyć się błędem serwera"""
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+    def count_stream(self):
+        with self._lock:
+            self.streamed += 1
+
+    def snapshot(self) -> Dict:
+        """Zwraca liczniki zapytań"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "streamed": self.streamed,
+                "errors": self.errors,
+            }
+
+
+def _usage(message) -> Dict:
+    usage = message.usage_metadata or {}
+    return {
+        "prompt_tokens": usage.get("input_tokens", 0),
+        "completion_tokens": usage.get("output_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+    }
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Obsługa POST /v1/chat/completions i GET /v1/models"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            model = {"id": CFG.model, "object": "model", "owned_by": "mock"}
+            self._send_json(200, {"object": "list", "data": [model]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        if self.server.should_fail():
+            error = {"message": "mock server error", "type": "server_error"}
+            self._send_json(500, {"error": error})
+            return
+
+        messages = convert_to_messages(request.get("messages", []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", CFG.model)
+        if request.get("stream"):
+            self._stream(request, messages, completion_id, model)
+            return
+
+        message = self.server.model.invoke(messages)
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "system_fingerprint": FINGERPRINT,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": message.content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": _usage(message),
+            },
+        )
+
+    def _stream(self, request: Dict, messages, completion_id: str, model: str):
+        """Odpowiedź strumieniowa (server-sent events) fragment po fragmencie"""
+        self.server.count_stream()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # Strumień bez Content-Length kończy się zamknięciem połączenia
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(choices, **extra):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "system_fingerprint": FINGERPRINT,
+                "choices": choices,
+                **extra,
+            }
+            data = json.dumps(chunk, ensure_ascii=False)
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        usage = None
+        event([{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}])
+        for chunk in self.server.model.stream(messages):
+            if chunk.content:
+                delta = {"content": chunk.content}
+                event([{"index": 0, "delta": delta, "finish_reason": None}])
+            if chunk.usage_metadata:
+                usage = chunk
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if usage is not None and (request.get("stream_options") or {}).get(
+            "include_usage"
+        ):
+            event([], usage=_usage(usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # Zapytania obciążeniowe nie zaśmiecają konsoli
+        pass
+
+
+def start_mock_server(
+    port: int = 8001,
+    host: str = "127.0.0.1",
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: int = 0,
+) -> MockOpenAIServer:
+    """Uruchamia serwer w wątku w tle i zwraca go (adres: server.server_address)"""
+    server = MockOpenAIServer((host, port), latency, jitter, error_rate, seed)
+    thread = threading.Thread(
+        target=server.serve_forever, name="mock-openai", daemon=True
+    )
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--latency", type=float, default=0.4, help="opóźnienie odpowiedzi [s]"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.2, help="rozrzut opóźnienia [s]"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="odsetek odpowiedzi z błędem"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        (args.host, args.port), args.latency, args.jitter, args.error_rate, args.seed
+    )
+    print(f"🤖 Mock API OpenAI: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{json.dumps(server.snapshot())}")
+
+
+if __name__ == "__main__":
+    main()
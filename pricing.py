@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Tuple, Union
+
+from config import CFG
+
+
+# Pola pozycji, których może dotyczyć PricingError
+DRINK = "drink"
+SIZE = "size"
+ADDON = "addon"
+
+
+class PricingError(ValueError):
+    """Pozycja spoza menu (nieznany napój, rozmiar lub dodatek).
+
+    field i value wskazują wartość, której nie da się wycenić.
+    """
+
+    def __init__(self, message: str, field: str = None, value: str = None):
+        super().__init__(message)
+        self.field = field
+        self.value = value
+
+
+def to_grosze(amount: float) -> int:
+    """Zamienia kwotę w złotych na grosze"""
+    return round(amount * 100)
+
+
+def item_price(grosze: int) -> Union[int, float]:
+    """Cena pozycji w złotych (liczba całkowita dla pełnych złotych)"""
+    return grosze // 100 if grosze % 100 == 0 else grosze / 100
+
+
+def _key(name: str) -> str:
+    return name.strip().casefold()
+
+
+# Liczba bitów maski dodatków obsługiwana przez jedną podtablicę
+_CHUNK_BITS = 8
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+
+
+class PriceTable:
+    """Cennik skompilowany z menu do tablic indeksowanych w groszach.
+
+    Ceny napojów leżą w płaskiej tablicy napój × rozmiar, a dodatki
+    są bitami maski. Każdy bajt maski ma podtablicę cen 256 kombinacji,
+    więc cena zestawu dodatków to jeden odczyt na 8 dodatków menu.
+    """
+
+    def __init__(self, version: str, menu=None):
+        self.version = version
+        menu = menu or CFG
+        self.sizes = {_key(size): index for index, size in enumerate(menu.SIZES)}
+        self.drinks = {
+            _key(drink): index for index, drink in enumerate(menu.DRINK_PRICES)
+        }
+        self.addons = {
+            _key(addon): 1 << bit for bit, addon in enumerate(menu.ADDON_PRICES)
+        }
+
+        # Tablica cen napój × rozmiar (None - rozmiar niedostępny)
+        width = len(self.sizes)
+        self.base = [None] * (len(self.drinks) * width)
+        for drink, prices in menu.DRINK_PRICES.items():
+            for size, price in prices.items():
+                index = self.drinks[_key(drink)] * width + self.sizes[_key(size)]
+                self.base[index] = to_grosze(price)
+
+        # Podtablice kolejnych bajtów maski - rozmiar rośnie liniowo z liczbą
+        # dodatków. Cena kombinacji: cena bez najniższego bitu powiększona
+        # o cenę dodatku odpowiadającego temu bitowi
+        addon_prices = [to_grosze(price) for price in menu.ADDON_PRICES.values()]
+        self.chunks = []
+        for start in range(0, len(addon_prices), _CHUNK_BITS):
+            prices = addon_prices[start : start + _CHUNK_BITS]
+            chunk = [0] * (1 << len(prices))
+            for mask in range(1, len(chunk)):
+                lowest = (mask & -mask).bit_length() - 1
+                chunk[mask] = chunk[mask & (mask - 1)] + prices[lowest]
+            self.chunks.append(chunk)
+
+    def encode(
+        self, drink: str, size: str, customizations: Iterable[str] = ()
+    ) -> Tuple[int, int]:
+        """Zamienia pozycję na (indeks ceny bazowej, maska dodatków)"""
+        drink_index = self.drinks.get(_key(drink))
+        if drink_index is None:
+            raise PricingError(f"nieznany napój: {drink}", DRINK, drink)
+        size_index = self.sizes.get(_key(size))
+        if size_index is None:
+            raise PricingError(f"nieznany rozmiar: {size}", SIZE, size)
+        index = drink_index * len(self.sizes) + size_index
+        if self.base[index] is None:
+            raise PricingError(
+                f"{drink} nie występuje w rozmiarze {size}", SIZE, size
+            )
+
+        mask = 0
+        for addon in customizations:
+            bit = self.addons.get(_key(addon))
+            if bit is None:
+                raise PricingError(f"nieznany dodatek: {addon}", ADDON, addon)
+            mask |= bit
+        return index, mask
+
+    def addons_price(self, mask: int) -> int:
+        """Zwraca cenę zestawu dodatków zakodowanego maską w groszach"""
+        total = 0
+        for chunk in self.chunks:
+            if not mask:
+                break
+            total += chunk[mask & _CHUNK_MASK]
+            mask >>= _CHUNK_BITS
+        return total
+
+    def price(self, drink: str, size: str, customizations: Iterable[str] = ()) -> int:
+        """Zwraca cenę pozycji w groszach"""
+        index, mask = self.encode(drink, size, customizations)
+        return self.base[index] + self.addons_price(mask)
+
+    def price_items(self, items: Iterable[Dict]) -> List[int]:
+        """Zwraca ceny pozycji koszyka w groszach"""
+        return [
+            self.price(item["drink"], item["size"], item["customizations"])
+            for item in items
+        ]
+
+    def price_cart(self, items: Iterable[Dict]) -> int:
+        """Zwraca wartość koszyka w groszach"""
+        return sum(self.price_items(items))
+
+    def price_carts(self, carts: Iterable[Iterable[Dict]]) -> List[int]:
+        """Wycenia wiele koszyków w jednym przebiegu (np. ponowna wycena księgi)"""
+        base, addons_price, encode = self.base, self.addons_price, self.encode
+        totals = []
+        for items in carts:
+            total = 0
+            for item in items:
+                index, mask = encode(
+                    item["drink"], item["size"], item["customizations"]
+                )
+                total += base[index] + addons_price(mask)
+            totals.append(total)
+        return totals
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import CFG
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Normalizuje wiadomość: wielkość liter, postać Unicode i białe znaki.
+
+    Znaki diakrytyczne są zachowane, bo zmieniają znaczenie słów.
+    """
+    text = unicodedata.normalize("NFC", message).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def order_hash(current_order: Dict) -> str:
+    """Zwraca kanoniczny skrót aktualnego zamówienia"""
+    canonical = json.dumps(current_order, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def make_key(message: str, current_order: Dict, version: str) -> str:
+    """Tworzy klucz cache dla wiadomości, zamówienia i wersji menu (digest)"""
+    return f"{version}:{order_hash(current_order)}:{normalize_message(message)}"
+
+
+class ResponseCache:
+    """Cache odpowiedzi LLM'a z usuwaniem LRU, czasem życia i limitem rozmiaru"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        """Usuwa wpis i aktualizuje rozmiar cache"""
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: str) -> Optional[str]:
+        """Zwraca zapisaną odpowiedź lub None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str):
+        """Zapisuje odpowiedź i usuwa najdawniej używane wpisy ponad limit"""
+        size = len(key.encode("utf-8")) + len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Czyści cache"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> Dict:
+        """Zwraca statystyki cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+RESPONSE_CACHE = ResponseCache(
+    max_entries=CFG.response_cache_max_entries,
+    max_bytes=CFG.response_cache_max_bytes,
+    ttl=CFG.response_cache_ttl,
+)
@@ -0,0 +1,194 @@
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from typing import Callable, Dict
+
+from agent import Agent
+from config import CFG
+
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    """Szacuje rozmiar obiektu w pamięci razem z obiektami zagnieżdżonymi.
+
+    Obiekty z seen nie są liczone - pozwala to pominąć obiekty współdzielone.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, Mapping):
+        size += sum(
+            deep_sizeof(key, seen) + deep_sizeof(value, seen)
+            for key, value in obj.items()
+        )
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif not isinstance(obj, (str, bytes, bytearray, int, float, type)):
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(vars(obj), seen)
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if name != "__dict__" and hasattr(obj, name):
+                    size += deep_sizeof(getattr(obj, name), seen)
+    return size
+
+
+class SessionRegistry:
+    """Rejestr agentów dla sesji przeglądarki z usuwaniem LRU i wygasaniem"""
+
+    def __init__(
+        self,
+        factory: Callable[[str], Agent] = Agent,
+        max_sessions: int = None,
+        idle_timeout: float = None,
+        reap_interval: float = None,
+    ):
+        self.factory = factory
+        self.max_sessions = (
+            max_sessions if max_sessions is not None else CFG.max_sessions
+        )
+        self.idle_timeout = (
+            idle_timeout if idle_timeout is not None else CFG.session_idle_timeout
+        )
+        self.reap_interval = (
+            reap_interval if reap_interval is not None else CFG.session_reap_interval
+        )
+
+        # session_id -> [agent, czas ostatniego użycia]
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # session_id -> blokada tworzenia agenta (tylko w trakcie tworzenia)
+        self._creating = {}
+        self._stop = threading.Event()
+        self._reaper = None
+
+        self.created = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def get(self, session_id: str) -> Agent:
+        """Zwraca agenta sesji (tworzy go przy pierwszym użyciu)"""
+        with self._lock:
+            entry = self._touch(session_id)
+            if entry is not None:
+                return entry[0]
+            creating = self._creating.setdefault(session_id, threading.Lock())
+
+        # Budowa agenta (wczytanie checkpointu) poza blokadą rejestru - inne
+        # sesje nie czekają, a równoczesne żądania tej sesji tworzą go raz
+        with creating:
+            with self._lock:
+                entry = self._touch(session_id)
+                if entry is not None:
+                    return entry[0]
+            try:
+                agent = self.factory(session_id)
+            finally:
+                with self._lock:
+                    if self._creating.get(session_id) is creating:
+                        del self._creating[session_id]
+
+            with self._lock:
+                self._sessions[session_id] = [agent, time.monotonic()]
+                self.created += 1
+
+                # Usuń najdawniej używane sesje ponad limit
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            return agent
+
+    def _touch(self, session_id: str):
+        """Oznacza sesję jako używaną i zwraca jej wpis (wywoływane pod blokadą)"""
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            self._sessions.move_to_end(session_id)
+            entry[1] = time.monotonic()
+        return entry
+
+    def remove(self, session_id: str):
+        """Usuwa sesję (np. po zamknięciu karty przeglądarki)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def reap(self) -> int:
+        """Usuwa sesje bezczynne dłużej niż idle_timeout"""
+        deadline = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [
+                session_id
+                for session_id, (_, last_used) in self._sessions.items()
+                if last_used < deadline
+            ]
+            for session_id in idle:
+                del self._sessions[session_id]
+            self.expired += len(idle)
+        return len(idle)
+
+    def _reap_loop(self):
+        """Pętla wątku usuwającego bezczynne sesje"""
+        while not self._stop.wait(self.reap_interval):
+            self.reap()
+
+    def start_reaper(self):
+        """Uruchamia wątek w tle usuwający bezczynne sesje"""
+        if self._reaper is None:
+            self._reaper = threading.Thread(
+                target=self._reap_loop, name="session-reaper", daemon=True
+            )
+            self._reaper.start()
+
+    def stop_reaper(self):
+        """Zatrzymuje wątek usuwający sesje"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
+    def memory_usage(self) -> Dict:
+        """Zwraca szacowane zużycie pamięci przez stany sesji.
+
+        Migawki menu są współdzielone przez sesje - liczone są raz, osobno.
+        """
+        with self._lock:
+            agents = {
+                session_id: agent for session_id, (agent, _) in self._sessions.items()
+            }
+
+        shared_seen = set()
+        menus = {}
+        for agent in agents.values():
+            menu = agent.state.get("menu")
+            menus[id(menu)] = menu
+        shared = sum(
+            deep_sizeof(menu, shared_seen) for menu in menus.values() if menu is not None
+        )
+        sessions = {
+            session_id: deep_sizeof(agent.state, set(shared_seen))
+            for session_id, agent in agents.items()
+        }
+        total = sum(sessions.values())
+        return {
+            "total_bytes": total,
+            "avg_bytes": total / len(sessions) if sessions else 0,
+            "max_bytes": max(sessions.values(), default=0),
+            "shared_menu_bytes": shared,
+            "sessions": sessions,
+        }
+
+    def stats(self) -> Dict:
+        """Zwraca statystyki rejestru"""
+        with self._lock:
+            live = len(self._sessions)
+        return {
+            "live_sessions": live,
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+import agent
+from config import CFG
+from fake_llm import FakeChatModel
+
+VALID = json.dumps({"is_valid": True})
+
+
+def process_reply(**fields) -> str:
+    analysis = {
+        "intent": "order_drink",
+        "drink_type": None,
+        "size": None,
+        "customizations": [],
+        "substitutions": [],
+        "response": "OK",
+    }
+    analysis.update(fields)
+    return json.dumps(analysis, ensure_ascii=False)
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    """Agent, którego każda wiadomość trafia do LLM'a z podanym skryptem"""
+    monkeypatch.setattr(CFG, "guardrail_prefilter", False)
+    monkeypatch.setattr(CFG, "fast_path_parser", False)
+    monkeypatch.setattr(CFG, "response_cache", False)
+
+    def create(*replies):
+        model = FakeChatModel(script=list(replies))
+        agent.set_llm_factory(lambda: model)
+        return agent.Agent()
+
+    yield create
+    agent.set_llm_factory(None)
+
+
+def test_inflected_size_from_llm_is_canonicalized(scripted):
+    coffee_agent = scripted(VALID, process_reply(drink_type="latte", size="duże"))
+    coffee_agent.chat("Poproszę dużą latte")
+    assert coffee_agent.state["current_order"]["drink_type"] == "latte"
+    assert coffee_agent.state["current_order"]["size"] == "L"
+
+
+def test_unknown_addon_from_llm_is_skipped(scripted):
+    coffee_agent = scripted(
+        VALID,
+        process_reply(
+            intent="add_to_cart", drink_type="latte", size="L", customizations=["lód"]
+        ),
+    )
+    response = coffee_agent.chat("Dodaj latte z lodem")
+    assert "lód" in response
+    assert coffee_agent.get_cart_summary()["items"][0]["customizations"] == []
+
+
+def test_add_to_cart_recovers_after_unpriced_addon(scripted):
+    coffee_agent = scripted()
+    coffee_agent.state["current_order"].update(
+        drink_type="latte", size="L", customizations=["cukier", "lód"]
+    )
+    state = agent.add_to_cart(coffee_agent.state)
+    assert state["cart"]["items"] == []
+    assert state["current_order"]["customizations"] == ["cukier"]
+
+    state = agent.add_to_cart(state)
+    assert state["cart"]["items"][0]["customizations"] == ["cukier"]
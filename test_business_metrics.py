@@ -0,0 +1,27 @@
+import os
+
+from business_metrics import BusinessMetrics, merge_snapshots
+
+
+def test_revenue_is_summed_in_grosze():
+    metrics = BusinessMetrics()
+    for _ in range(10):
+        metrics.record_order(10, timestamp=0)
+    totals = metrics.totals()
+    assert totals["total_revenue"] == 1.0
+    assert totals["avg_order_value"] == 0.1
+    assert metrics.snapshot()["per_minute"][0]["revenue"] == 1.0
+
+
+def test_merged_snapshots_keep_exact_revenue(tmp_path):
+    for process, total_grosze in enumerate((10, 20)):
+        metrics = BusinessMetrics()
+        metrics.record_order(total_grosze, timestamp=0)
+        # Migawki kolejnych "procesów" pod osobnymi nazwami plików
+        path = metrics.write_snapshot(str(tmp_path))
+        (tmp_path / f"metrics-{process}.json").write_bytes(open(path, "rb").read())
+    os.remove(path)
+    merged = merge_snapshots(str(tmp_path))
+    assert merged["orders_completed"] == 2
+    assert merged["total_revenue"] == 0.3
+    assert merged["per_minute"][0]["revenue"] == 0.3
@@ -0,0 +1,68 @@
+import sqlite3
+import time
+
+import pytest
+
+import agent
+from checkpoints import SQLiteCheckpointer, restore_state
+from fake_llm import FakeChatModel
+
+
+@pytest.fixture
+def checkpointer(tmp_path):
+    agent.set_llm_factory(FakeChatModel)
+    checkpointer = SQLiteCheckpointer(str(tmp_path / "sesje.db"), flush_interval=0)
+    yield checkpointer
+    checkpointer.close()
+    agent.set_llm_factory(None)
+
+
+class FailingConnection:
+    """Połączenie, którego pierwsze zapisy kończą się błędem SQLite"""
+
+    def __init__(self, connection, failures: int):
+        self.connection = connection
+        self.failures = failures
+
+    def executemany(self, *args):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return self.connection.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_state_round_trip(checkpointer):
+    session = agent.Agent(session_id="s1")
+    session.chat("Dodaj do koszyka latte, duże")
+    checkpointer.save("s1", session.state)
+    checkpointer.flush()
+
+    restored = agent.initialize_state(session_id="s1")
+    restore_state(restored, checkpointer.load("s1"), checkpointer.load_archive("s1"))
+    assert restored["cart"]["total_grosze"] == session.state["cart"]["total_grosze"]
+    assert [message.content for message in restored["messages"]] == [
+        message.content for message in session.state["messages"]
+    ]
+
+
+def test_writer_survives_sqlite_errors(checkpointer, monkeypatch):
+    monkeypatch.setattr("config.CFG.checkpoint_retry_interval", 0.01)
+    checkpointer._connection = FailingConnection(checkpointer._connection, 2)
+    session = agent.Agent(session_id="s1")
+    checkpointer.save("s1", session.state)
+
+    wait_for(lambda: checkpointer.snapshot()["rows_written"] == 1)
+    snapshot = checkpointer.snapshot()
+    assert snapshot["failures"] == 2
+    assert snapshot["last_error"] is None
+    assert checkpointer.load("s1") is not None
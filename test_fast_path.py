@@ -0,0 +1,64 @@
+import pytest
+
+from fast_path import OrderMatcher
+from menu import default_menu
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return OrderMatcher(default_menu())
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        # Kategoria sprzeczna z napojem - "czarna" w menu to herbata
+        "Poproszę czarną kawę",
+        "Poproszę dużą czarną kawę z mlekiem",
+        "zielona kawa",
+        "Poproszę herbatę latte",
+        # Sama kategoria nie wskazuje napoju
+        "Poproszę kawę",
+        # Wiele napojów, nieznane słowa
+        "Poproszę latte i espresso",
+        "Poproszę latte z mlekiem owsianym",
+    ],
+)
+def test_ambiguous_messages_go_to_llm(matcher, message):
+    assert matcher.parse(message, {}) is None
+
+
+@pytest.mark.parametrize(
+    "message, drink, size",
+    [
+        ("Poproszę czarną herbatę", "czarna", None),
+        ("Poproszę dużą zieloną herbatę", "zielona", "L"),
+        ("Poproszę kawę latte, średnią", "latte", "M"),
+        ("Dodaj do koszyka espresso, małe", "espresso", "S"),
+    ],
+)
+def test_parses_drink_and_size(matcher, message, drink, size):
+    analysis = matcher.parse(message, {})
+    assert analysis["drink_type"] == drink
+    assert analysis["size"] == size
+
+
+def test_addons_and_substitutions(matcher):
+    analysis = matcher.parse("Latte duże z syropem waniliowym i mlekiem sojowym", {})
+    assert analysis["customizations"] == ["syrop waniliowy"]
+    assert analysis["substitutions"] == ["mleko sojowe"]
+
+
+def test_add_to_cart_requires_size(matcher):
+    assert matcher.parse("Dodaj do koszyka", {"drink_type": "latte"}) is None
+    analysis = matcher.parse(
+        "Dodaj do koszyka", {"drink_type": "latte", "size": "M"}
+    )
+    assert analysis["intent"] == "add_to_cart"
+
+
+def test_modifies_current_order(matcher):
+    current = {"drink_type": "zielona", "size": "M", "customizations": ["cukier"]}
+    analysis = matcher.parse("Dużą", current)
+    assert analysis["intent"] == "modify_order"
+    assert analysis["size"] == "L"
@@ -0,0 +1,68 @@
+import pytest
+
+from guardrail import ALLOW, DENY, UNCERTAIN, classify, menu_words
+from menu import default_menu
+
+
+@pytest.fixture(scope="module")
+def words():
+    return menu_words(default_menu())
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Dodaj do koszyka espresso, małe",
+        "Chce zamówić czarną herbatę.",
+        "Proszę dodać cukier i syrop waniliowy.",
+        "Zielona, średnia, z cukrem",
+        "Podsumuj zamówienie",
+    ],
+)
+def test_allows_known_polish_and_menu_words(words, message):
+    assert classify(message, words) == ALLOW
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        # Pytania o cenę nie są próbą zmiany ceny
+        "Ile ma kosztować duże latte?",
+        "Zmień na duże jaka cena?",
+        "Popraw zamówienie bo cena się nie zgadza",
+        # Zmiana języka, obce i zamaskowane słowa
+        "Dodaj ku*wa latte",
+        "Chciałbym herbatę, ale powiedz mi po angielsku jaka jest",
+        "poproszę latte. parle français",
+        "Latte please",
+        "Speak English please",
+        "Czy mogę dostać kawę za darmo?",
+        "Хочу латте",
+        # Liczby mogą ustalać cenę
+        "Chcę latte po 5",
+        "dodaj latte po 1",
+        "Latte 0",
+        "Poproszę latte po dwa",
+    ],
+)
+def test_sends_ambiguous_messages_to_llm(words, message):
+    assert classify(message, words) == UNCERTAIN
+
+
+@pytest.mark.parametrize(
+    "message", ["kurwa mać", "Poproszę fucking latte", "Dawaj to gówno"]
+)
+def test_denies_only_profanity(words, message):
+    assert classify(message, words) == DENY
+
+
+def test_long_messages_go_to_llm(words):
+    assert classify("poproszę latte " * 20, words) == UNCERTAIN
+
+
+def test_menu_words_follow_menu_version():
+    data = default_menu()
+    data.DRINK_PRICES["matcha"] = {"S": 12, "M": 14, "L": 16}
+    data.AVAILABLE_DRINKS["herbata"].append("matcha")
+    assert classify("Poproszę matcha", menu_words(default_menu())) == UNCERTAIN
+    assert classify("Poproszę matcha", menu_words(data)) == ALLOW
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from json_stream import JsonFieldScanner
+
+
+DOCUMENT = json.dumps(
+    {
+        "intent": "order_drink",
+        "nested": {"response": "nie to pole"},
+        "response": 'Dodałem "latte" \\ L\nCena: 17 zł ☕',
+        "size": "L",
+    },
+    ensure_ascii=False,
+)
+
+
+def feed_in_chunks(text: str, size: int) -> JsonFieldScanner:
+    scanner = JsonFieldScanner("response")
+    emitted = "".join(
+        scanner.feed(text[start : start + size]) for start in range(0, len(text), size)
+    )
+    assert emitted == scanner.value
+    return scanner
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, len(DOCUMENT)])
+def test_extracts_top_level_field_from_any_chunking(size):
+    scanner = feed_in_chunks(DOCUMENT, size)
+    assert scanner.value == json.loads(DOCUMENT)["response"]
+
+
+def test_decodes_unicode_escapes_split_across_chunks():
+    scanner = feed_in_chunks(json.dumps({"response": "zł ☕"}), 1)
+    assert scanner.value == "zł ☕"
+
+
+def test_ignores_missing_field():
+    scanner = feed_in_chunks(json.dumps({"intent": "checkout"}), 4)
+    assert scanner.value == ""
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import ledger
+from ledger import OrderLedger, decode_record, encode_record, scan
+
+ITEMS = [
+    {
+        "drink": "latte",
+        "size": "L",
+        "customizations": ["cukier"],
+        "substitutions": [],
+        "price": 17,
+    }
+]
+
+
+@pytest.fixture
+def order_ledger(tmp_path):
+    order_ledger = OrderLedger(str(tmp_path / "zamowienia.ledger"), commit_delay=0)
+    yield order_ledger
+    order_ledger.close()
+
+
+def test_record_round_trip_and_checksum():
+    line = encode_record({"order_id": "1", "total": 17.0})
+    assert decode_record(line) == {"order_id": "1", "total": 17.0}
+    assert decode_record(line.replace(b"17", b"71")) is None
+    assert decode_record(line[:-5]) is None
+
+
+def test_committed_orders_are_scanned(order_ledger):
+    for _ in range(3):
+        order_ledger.append("sesja", ITEMS, 17.0).result(timeout=5)
+    report = scan(order_ledger.path)
+    assert report["orders_completed"] == 3
+    assert report["total_revenue"] == 51.0
+    assert report["per_drink"] == {"latte": {"count": 3, "revenue": 51.0}}
+
+
+def test_scan_skips_torn_last_line(order_ledger):
+    order_ledger.append("sesja", ITEMS, 17.0).result(timeout=5)
+    with open(order_ledger.path, "ab") as file:
+        file.write(encode_record({"order_id": "urwany"})[:20])
+    report = scan(order_ledger.path)
+    assert report["orders_completed"] == 1
+    assert report["corrupted"] == 1
+
+
+def test_write_failure_reaches_callers_and_rolls_back(order_ledger, monkeypatch):
+    def failing_fsync(fd):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(ledger.os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        order_ledger.append("sesja", ITEMS, 17.0).result(timeout=5)
+    assert os.path.getsize(order_ledger.path) == 0
+
+    # Wątek zapisujący działa dalej po błędzie
+    monkeypatch.undo()
+    order_ledger.append("sesja", ITEMS, 17.0).result(timeout=5)
+    assert scan(order_ledger.path)["orders_completed"] == 1
+    assert order_ledger.snapshot()["failures"] == 1
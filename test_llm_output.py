@@ -0,0 +1,67 @@
+import pytest
+
+from llm_output import (
+    PROCESS_SCHEMA,
+    VALIDATION_SCHEMA,
+    DecodeError,
+    decode,
+    repair_json,
+    strip_fences,
+)
+
+
+def test_decodes_clean_json():
+    assert decode('{"is_valid": true}', VALIDATION_SCHEMA) == (
+        {"is_valid": True},
+        False,
+    )
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '```json\n{"is_valid": true}\n```',
+        'Oto odpowiedź: {"is_valid": true}.',
+        "{'is_valid': True}",
+        '{"is_valid": "tak",}',
+    ],
+)
+def test_repairs_common_mistakes(content):
+    assert decode(content, VALIDATION_SCHEMA) == ({"is_valid": True}, True)
+
+
+def test_fills_nullable_fields_and_normalizes_enum():
+    analysis, repaired = decode(
+        '{"intent": "Order_Drink", "drink_type": "latte", "size": "duże",'
+        ' "customizations": "cukier", "response": "OK"}',
+        PROCESS_SCHEMA,
+    )
+    assert not repaired
+    assert analysis["intent"] == "order_drink"
+    assert analysis["size"] == "duże"
+    assert analysis["customizations"] == ["cukier"]
+    assert analysis["substitutions"] == []
+
+
+def test_unknown_intent_becomes_question():
+    analysis, _ = decode('{"intent": "greeting", "response": "Witaj!"}', PROCESS_SCHEMA)
+    assert analysis["intent"] == "ask_question"
+    assert analysis["response"] == "Witaj!"
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "Nie rozumiem pytania",
+        '{"is_valid": "może"}',
+        '{"is_valid": true',
+    ],
+)
+def test_rejects_unrepairable_output(content):
+    with pytest.raises(DecodeError):
+        decode(content, VALIDATION_SCHEMA)
+
+
+def test_strip_fences_and_repair_keep_strings_intact():
+    text = strip_fences("```\n{'response': 'Mam \"latte\", None'}\n```")
+    assert repair_json(text) == '{"response": "Mam \\"latte\\", None"}'
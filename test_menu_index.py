@@ -0,0 +1,61 @@
+import pytest
+
+from fast_path import ADDON, DRINK, SIZE, SUBSTITUTION
+from menu import default_menu
+from menu_index import MenuIndex, stem
+
+
+@pytest.fixture(scope="module")
+def index():
+    return MenuIndex("test", default_menu())
+
+
+@pytest.mark.parametrize(
+    "text, drink",
+    [
+        ("latte", "latte"),
+        ("Kawa Latte", "latte"),
+        ("napój latte", "latte"),
+        ("Czarna herbata", "czarna"),
+        ("herbata czarna", "czarna"),
+        ("zielonej herbaty", "zielona"),
+        ("Earl Grey", "earl grey"),
+        ("cappucino", "cappuccino"),
+    ],
+)
+def test_resolves_drinks(index, text, drink):
+    assert index.resolve(DRINK, text) == drink
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # Kategoria sprzeczna z napojem - "czarna" w menu to herbata
+        "czarna kawa",
+        "czarną kawę",
+        "zielona kawa",
+        "herbatę latte",
+        "mocha",
+        "",
+        None,
+    ],
+)
+def test_misses_unknown_or_contradictory_drinks(index, text):
+    assert index.resolve(DRINK, text) is None
+
+
+@pytest.mark.parametrize(
+    "kind, text, key",
+    [
+        (SIZE, "duże", "L"),
+        (SIZE, "M", "M"),
+        (ADDON, "syropem waniliowym", "syrop waniliowy"),
+        (SUBSTITUTION, "mleko sojowe", "mleko sojowe"),
+    ],
+)
+def test_resolves_other_kinds(index, kind, text, key):
+    assert index.resolve(kind, text) == key
+
+
+def test_stem_strips_inflection():
+    assert stem("waniliowym") == stem("waniliowy")
@@ -0,0 +1,61 @@
+import pytest
+
+from config import CFG
+from pricing import PriceTable, PricingError, item_price, to_grosze
+
+
+class ManyAddonsMenu:
+    SIZES = CFG.SIZES
+    DRINK_PRICES = {"latte": {"S": 12, "M": 14.5, "L": 16}}
+    ADDON_PRICES = {f"dodatek {index}": 1 + index / 4 for index in range(40)}
+
+
+@pytest.fixture(scope="module")
+def table():
+    return PriceTable("test")
+
+
+def test_prices_drink_with_addons(table):
+    drink = CFG.DRINK_PRICES["latte"]["L"]
+    addons = sum(CFG.ADDON_PRICES.values())
+    assert table.price("latte", "L", list(CFG.ADDON_PRICES)) == to_grosze(
+        drink + addons
+    )
+
+
+def test_repeated_addon_is_priced_once(table):
+    assert table.price("latte", "M", ["mleko", "Mleko "]) == table.price(
+        "latte", "M", ["mleko"]
+    )
+
+
+@pytest.mark.parametrize(
+    "drink, size, customizations",
+    [("mocha", "M", []), ("latte", "XL", []), ("latte", "M", ["whisky"])],
+)
+def test_rejects_items_outside_menu(table, drink, size, customizations):
+    with pytest.raises(PricingError):
+        table.price(drink, size, customizations)
+
+
+def test_table_grows_linearly_with_addons():
+    table = PriceTable("test", ManyAddonsMenu)
+    assert sum(len(chunk) for chunk in table.chunks) == 5 * 256
+    addons = ["dodatek 0", "dodatek 9", "dodatek 39"]
+    assert table.price("latte", "M", addons) == 1450 + 100 + 325 + 1075
+
+
+def test_price_carts_matches_price_cart(table):
+    carts = [
+        [{"drink": "latte", "size": "S", "customizations": ["cukier"]}],
+        [
+            {"drink": "espresso", "size": "M", "customizations": []},
+            {"drink": "czarna", "size": "L", "customizations": ["cukier"]},
+        ],
+    ]
+    assert table.price_carts(carts) == [table.price_cart(cart) for cart in carts]
+
+
+def test_item_price_keeps_whole_zloty_as_int():
+    assert item_price(1200) == 12
+    assert item_price(1250) == 12.5
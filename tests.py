@@ -3,13 +3,16 @@
 Testy dla aplikacji Kawiarnia AI
 """
 
+import json
 import sys
 import os
+import time
 
 # Dodaj katalog główny do ścieżki Pythona
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from agent import Agent
+from cassette import use_cassette
 
 
 def run_tests():
@@ -116,12 +119,12 @@ def run_tests():
     agent.chat("Podsumuj zamówienie")
     agent.chat("Dodaj do koszyka espresso, małe")
     agent.chat("Podsumuj zamówienie")
-    conversation_log = agent.get_conversation_log()
+    metrics = json.loads(agent.get_conversation_log())["metrics"]
 
     assert (
-        "Orders completed: 3" in conversation_log
+        metrics["orders_completed"] == 3
     )  # 2 zamówienia z testu metryk oraz jedno z testu przepływu
-    assert "Total revenue: 28.0" in conversation_log
+    assert metrics["total_revenue"] == 28.0
     print("✅ Metryki przeszły test")
 
     print("\n🎉 Wszystkie testy przeszły pomyślnie!")
@@ -129,8 +132,14 @@ def run_tests():
 
 
 if __name__ == "__main__":
+    # LLM_CASSETTE=record nagrywa odpowiedzi, replay/strict uruchamia testy offline
+    cassette = use_cassette()
+    start = time.perf_counter()
     try:
         run_tests()
+        if cassette is not None:
+            print(f"📼 Kaseta: {cassette.snapshot()}")
+        print(f"⏱️ Czas testów: {time.perf_counter() - start:.3f} s")
     except Exception as e:
         print(f"❌ Testy nie przeszły: {e}")
         sys.exit(1)
@@ -0,0 +1,136 @@
+import threading
+from typing import Dict, Tuple
+
+from config import CFG
+
+
+# Rodzaje tokenów zliczane dla każdego węzła
+_FIELDS = ("calls", "input_tokens", "cached_tokens", "output_tokens")
+
+
+def response_usage(response) -> Dict:
+    """Wyciąga liczbę tokenów z odpowiedzi LLM'a (usage_metadata)"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    return {
+        "calls": 1,
+        "input_tokens": usage.get("input_tokens", 0) or 0,
+        "cached_tokens": details.get("cache_read", 0) or 0,
+        "output_tokens": usage.get("output_tokens", 0) or 0,
+    }
+
+
+def cost_usd(counts: Dict, model: str = None) -> float:
+    """Zwraca koszt tokenów w USD według cennika modelu"""
+    prices = CFG.token_prices.get(model or CFG.model)
+    if prices is None:
+        return 0.0
+    uncached = counts["input_tokens"] - counts["cached_tokens"]
+    return (
+        uncached * prices["input"]
+        + counts["cached_tokens"] * prices["cached_input"]
+        + counts["output_tokens"] * prices["output"]
+    ) / 1_000_000
+
+
+def _ratio(numerator: float, denominator: float) -> float:
+    return numerator / denominator if denominator else 0.0
+
+
+class UsageTracker:
+    """Zużycie tokenów per węzeł (dla sesji lub całego procesu)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.nodes = {}
+        self.turns = 0
+        self.last_turn = dict.fromkeys(_FIELDS, 0)
+        self.max_turn_tokens = 0
+
+    def record(self, node: str, response) -> Dict:
+        """Zapisuje zużycie tokenów odpowiedzi LLM'a dla węzła"""
+        usage = response_usage(response)
+        with self._lock:
+            counts = self.nodes.setdefault(node, dict.fromkeys(_FIELDS, 0))
+            for field in _FIELDS:
+                counts[field] += usage[field]
+        return usage
+
+    def _totals(self) -> Dict:
+        totals = dict.fromkeys(_FIELDS, 0)
+        for counts in self.nodes.values():
+            for field in _FIELDS:
+                totals[field] += counts[field]
+        return totals
+
+    def count_turn(self):
+        """Zlicza turę bez wyznaczania jej zużycia (statystyki całego procesu)"""
+        with self._lock:
+            self.turns += 1
+
+    def mark(self) -> Tuple:
+        """Zwraca bieżące sumy tokenów (początek tury)"""
+        with self._lock:
+            totals = self._totals()
+        return tuple(totals[field] for field in _FIELDS)
+
+    def end_turn(self, mark: Tuple) -> Dict:
+        """Zamyka turę i zapisuje zużycie tokenów od znacznika"""
+        with self._lock:
+            totals = self._totals()
+            self.turns += 1
+            self.last_turn = {
+                field: totals[field] - start for field, start in zip(_FIELDS, mark)
+            }
+            tokens = self.last_turn["input_tokens"] + self.last_turn["output_tokens"]
+            self.max_turn_tokens = max(self.max_turn_tokens, tokens)
+            return dict(self.last_turn)
+
+    def export(self) -> Dict:
+        """Zwraca liczniki do zapisu (checkpoint sesji)"""
+        with self._lock:
+            return {
+                "nodes": {node: dict(counts) for node, counts in self.nodes.items()},
+                "turns": self.turns,
+                "max_turn_tokens": self.max_turn_tokens,
+            }
+
+    def restore(self, data: Dict):
+        """Odtwarza liczniki zapisane przez export()"""
+        with self._lock:
+            self.nodes = {node: dict(counts) for node, counts in data["nodes"].items()}
+            self.turns = data["turns"]
+            self.max_turn_tokens = data["max_turn_tokens"]
+
+    def snapshot(self, orders: int = 0, revenue: float = 0.0) -> Dict:
+        """Zwraca zużycie, koszt i wskaźniki względem zamówień i przychodu"""
+        with self._lock:
+            nodes = {node: dict(counts) for node, counts in self.nodes.items()}
+            totals = self._totals()
+            turns = self.turns
+            last_turn = dict(self.last_turn)
+            max_turn_tokens = self.max_turn_tokens
+
+        for counts in nodes.values():
+            counts["cost_usd"] = cost_usd(counts)
+        tokens = totals["input_tokens"] + totals["output_tokens"]
+        cost = cost_usd(totals)
+        cost_pln = cost * CFG.usd_pln_rate
+        return {
+            "nodes": nodes,
+            "totals": {**totals, "tokens": tokens, "cost_usd": cost},
+            "turns": turns,
+            "last_turn": last_turn,
+            "max_turn_tokens": max_turn_tokens,
+            "orders_completed": orders,
+            "total_revenue": revenue,
+            "tokens_per_turn": _ratio(tokens, turns),
+            "tokens_per_order": _ratio(tokens, orders),
+            "cost_per_order_pln": _ratio(cost_pln, orders),
+            "cost_per_revenue_pln": _ratio(cost_pln, revenue),
+            "cached_ratio": _ratio(totals["cached_tokens"], totals["input_tokens"]),
+        }
+
+
+# Zużycie tokenów całego procesu (wszystkie sesje)
+USAGE = UsageTracker()